@@ -0,0 +1,209 @@
+'''
+Headless batch processing of many capture directories (dca_<date>_trx.._n..xp.._fps.._<name>) with ProcessingChain.
+
+Captures are fanned out across a process pool, progress is printed as jobs finish and the status of every job is kept
+in a json state file in the save directory. Re-running the same command skips jobs that already completed with the
+same processing parameters, so a batch that failed or was interrupted resumes where it stopped.
+
+Usage:
+    python batch_process.py "/data/micro_doppler_experiments/dca_*" --tasks range_doppler micro_doppler \
+        --window 3 --interp-factor 2 --jobs 4 --memory-limit 4096 --save-path /data/processing_results/
+    python batch_process.py "/data/micro_doppler_experiments/dca_*" --tasks micro_doppler --max-velocity 10 \
+        --doppler-backend czt --doppler-bins 256 --velocity-window 3
+'''
+
+import os, glob, json, time, errno, argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+matplotlib.use('Agg')   # headless: no display needed for the micro-doppler images
+from data_handling import DataHandling
+
+try:
+    import resource     # per-job memory limits (unix only)
+except ImportError:
+    resource = None
+
+TASKS = ('range_doppler', 'micro_doppler')
+# processing parameters that change the outputs of a job, with their defaults (batch_size only changes the memory use)
+OUTPUT_PARAMS = (('window', None), ('interp_factor', None), ('max_velocity', None), ('doppler_backend', 'fft'),
+                 ('doppler_bins', None), ('velocity_window', None), ('save_arrays', False))
+
+
+def find_captures(patterns):
+    '''
+    Expand glob patterns / directory names into the list of capture directories.
+        Inputs:
+            - patterns:     list of glob patterns or directory names
+        Outputs:
+            - captures:     sorted list of directories containing ADC raw data files
+    '''
+    captures = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.expanduser(pattern)):
+            if os.path.isdir(path) and glob.glob(os.path.join(path, 'datacard_record_hdr_0ADC*.bin')):
+                captures.add(os.path.normpath(path))
+    return sorted(captures)
+
+
+def job_key(dir_name, task, params):
+    '''
+    Key identifying a job in the state file: capture, task and the processing parameters that change its output.
+    '''
+    return '|'.join([dir_name, task] + ['{}={}'.format(name, params.get(name, default)) for name, default in OUTPUT_PARAMS])
+
+
+def _limit_memory(memory_limit):
+    '''
+    Process pool initializer: cap the data segment (heap and anonymous mappings, in MB) of each worker so a runaway job
+    fails with MemoryError. The address space (RLIMIT_AS) is not capped, as it also counts the shared libraries and the
+    memory-mapped ADC files, which are paged in from disk.
+    '''
+    if memory_limit and resource is not None:
+        limit = int(memory_limit) * 1024 ** 2
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+
+def _out_of_memory(error):
+    '''
+    Whether a job failed on the memory limit: numpy raises MemoryError, mmap and the OS raise OSError(ENOMEM).
+    '''
+    return isinstance(error, MemoryError) or (isinstance(error, OSError) and error.errno == errno.ENOMEM)
+
+
+def process_capture(dir_name, task, params):
+    '''
+    Run one processing task on one capture directory (executed in a worker process).
+        Inputs:
+            - dir_name:     full path of raw data directory
+            - task:         'range_doppler' or 'micro_doppler'
+            - params:       processing parameters (see main)
+        Outputs:
+            - elapsed:      processing time in seconds
+    '''
+    # imported in the worker to keep the parent process light
+    from processing_chain import ProcessingChain
+
+    start = time.time()
+    specs = DataHandling.parse_capture_name(dir_name)
+    processing_chain = ProcessingChain(num_samples=specs['num_samples'], num_chirps=specs['num_chirps'], num_tx=specs['num_tx'],
+                                       num_rx=specs['num_rx'], fps=specs['fps'], window=params['window'],
+                                       interp_factor=params['interp_factor'], batch_size=params['batch_size'],
+                                       doppler_backend=params.get('doppler_backend', 'fft'), doppler_bins=params.get('doppler_bins'))
+
+    save_path = os.path.join(params['save_path'], task, '')
+    os.makedirs(save_path, exist_ok=True)
+    out_file = save_path + os.path.basename(dir_name) + '.npy' if params['save_arrays'] else None
+
+    if task == 'range_doppler':
+        processing_chain.range_doppler_process(dir_name, save_path=save_path, out_file=out_file)
+    else:
+        processing_chain.micro_doppler_stft(dir_name, params['max_velocity'], save_path=save_path, out_file=out_file,
+                                            velocity_window=params.get('velocity_window'))
+
+    return time.time() - start
+
+
+def load_state(state_file):
+    if os.path.exists(state_file):
+        with open(state_file) as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state, state_file):
+    # write to a temporary file first so an interrupted run never leaves a corrupt state file
+    with open(state_file + '.tmp', 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(state_file + '.tmp', state_file)
+
+
+def batch_process(patterns, tasks=TASKS, jobs=None, memory_limit=None, retry_failed=True, **params):
+    '''
+    Process all captures matching the patterns across a process pool, resuming from the state file in save_path.
+        Inputs:
+            - patterns:         list of glob patterns or directory names
+            - tasks:            processing tasks to run on every capture
+            - jobs:             number of worker processes (default: number of cpus)
+            - memory_limit:     data segment limit of each worker process in MB (None: unlimited), memory-mapped
+                                capture files are not counted
+            - retry_failed:     re-run jobs that failed in a previous run
+            - params:           window, interp_factor, batch_size, max_velocity, save_path, save_arrays
+                                (optional: doppler_backend, doppler_bins, velocity_window)
+        Outputs:
+            - state:            dict job key -> status ('done' / 'failed'), elapsed time and error message
+    '''
+    # (1) list the jobs and drop the ones completed in a previous run
+    os.makedirs(params['save_path'], exist_ok=True)
+    state_file = os.path.join(params['save_path'], 'batch_state.json')
+    state = load_state(state_file)
+
+    captures = find_captures(patterns)
+    pending = []
+    for dir_name in captures:
+        for task in tasks:
+            key = job_key(dir_name, task, params)
+            status = state.get(key, {}).get('status')
+            if status == 'done' or (status == 'failed' and not retry_failed):
+                continue
+            pending.append((key, dir_name, task))
+
+    print('{} captures, {} jobs to run ({} already processed)'.format(len(captures), len(pending),
+                                                                       len(captures) * len(tasks) - len(pending)))
+    if not pending:
+        return state
+
+    # (2) fan the jobs out across the process pool and record every result as soon as it arrives
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_limit_memory, initargs=(memory_limit,)) as executor:
+        futures = {executor.submit(process_capture, dir_name, task, params): (key, dir_name, task)
+                   for key, dir_name, task in pending}
+
+        for count, future in enumerate(as_completed(futures), 1):
+            key, dir_name, task = futures[future]
+            try:
+                elapsed = future.result()
+                state[key] = {'status': 'done', 'elapsed': round(elapsed, 2)}
+                message = 'done in {:.1f} s'.format(elapsed)
+            except Exception as e:
+                if _out_of_memory(e):
+                    error = 'memory limit of {} MB per worker exceeded'.format(memory_limit)
+                else:
+                    error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+                state[key] = {'status': 'failed', 'error': error}
+                message = 'FAILED: ' + error
+
+            save_state(state, state_file)
+            print('[{}/{}] {} {}: {}'.format(count, len(pending), task, os.path.basename(dir_name), message))
+
+    # (3) summary
+    failed = [key for key, _, _ in pending if state[key]['status'] == 'failed']
+    print('\n{} jobs done, {} failed (re-run the same command to retry)\n'.format(len(pending) - len(failed), len(failed)))
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch range-doppler / micro-doppler processing of captured data directories.')
+    parser.add_argument('patterns', nargs='+', help='capture directories or glob patterns, e.g. "/data/dca_*"')
+    parser.add_argument('--tasks', nargs='+', choices=TASKS, default=list(TASKS), help='processing tasks to run')
+    parser.add_argument('--window', type=int, default=3, help='ProcessingChain window index (0: none ... 6: hann)')
+    parser.add_argument('--interp-factor', type=int, default=1, help='doppler fft interpolation factor')
+    parser.add_argument('--batch-size', type=int, default=None, help='frames per processed radarcube (default: per file)')
+    parser.add_argument('--max-velocity', type=float, default=5, help='max velocity of the micro-doppler plots (m/s)')
+    parser.add_argument('--doppler-backend', choices=('fft', 'czt'), default='fft', help='micro-doppler transform (czt: zoom on a velocity window)')
+    parser.add_argument('--doppler-bins', type=int, default=None, help='doppler bins of the czt backend (default: chirps x interp factor)')
+    parser.add_argument('--velocity-window', type=float, default=None, help='velocity (m/s) the czt backend zooms on (default: max velocity)')
+    parser.add_argument('--save-path', default='/mnt/c/work/mmw_pc/single_chip/processing_results/', help='output directory')
+    parser.add_argument('--save-arrays', action='store_true', help='also store the outputs as memory-mapped .npy files')
+    parser.add_argument('--jobs', type=int, default=None, help='number of worker processes (default: number of cpus)')
+    parser.add_argument('--memory-limit', type=int, default=None, help='memory limit of each worker process in MB (heap, memory-mapped files excluded)')
+    parser.add_argument('--no-retry', action='store_true', help='skip jobs that failed in a previous run')
+    args = parser.parse_args()
+
+    batch_process(args.patterns, tasks=args.tasks, jobs=args.jobs, memory_limit=args.memory_limit, retry_failed=not args.no_retry,
+                  window=args.window, interp_factor=args.interp_factor, batch_size=args.batch_size,
+                  max_velocity=args.max_velocity, save_path=args.save_path, save_arrays=args.save_arrays,
+                  doppler_backend=args.doppler_backend, doppler_bins=args.doppler_bins, velocity_window=args.velocity_window)
+
+
+if __name__ == "__main__":
+    main()
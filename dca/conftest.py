@@ -0,0 +1,2 @@
+# archived experiment scripts, not tests
+collect_ignore = ['archive']
@@ -1,6 +1,9 @@
 import numpy as np 
 import time
-import os, glob, shutil
+import os, re, glob, shutil
+
+# int16 I/Q pair as stored by the DCA1000 (usable as unpack dtype to keep samples in their raw 16-bit form)
+IQ_INT16 = np.dtype([('i', np.int16), ('q', np.int16)])
 
 class DataHandling:
 
@@ -9,7 +12,7 @@ class DataHandling:
 
     """
 
-    def __init__(self, num_samples=256, num_chirps=64, num_tx=1, num_rx=4, fps=10, header_size=32):
+    def __init__(self, num_samples=256, num_chirps=64, num_tx=1, num_rx=4, fps=10, header_size=32, dtype=np.complex64):
 
         """
         Args:
@@ -18,6 +21,7 @@ class DataHandling:
         - num_rx:           number of receivers
         - fps:              frame rate (per seconds)
         - header_size:      the actual header size (usually 32 bytes)
+        - dtype:            sample type of the radarcubes (np.complex64, np.complex128 or IQ_INT16)
         """
 
         self.num_samples = num_samples
@@ -26,6 +30,7 @@ class DataHandling:
         self.num_rx = num_rx
         self.fps = fps
         self.header_size = header_size
+        self.dtype = np.dtype(dtype)
 
     def organize_captured_data(self, experiment_name='test', src_dir='/mnt/c/work/mmw_pc/single_chip/datasets/'):
         """
@@ -65,6 +70,61 @@ x
         print('\n recorded data organized into ' + str(dst_dir) + ' successfully...\n')
         return 
         
+    @staticmethod
+    def parse_capture_name(dir_name):
+        '''
+        Parse the data specifications from a capture directory named by organize_captured_data, 
+        e.g. dca_apr19_2045_trx14_n122xp128_fps20_stand_and_drill.
+            Inputs:
+                - dir_name:     capture directory name or full path
+            Outputs:
+                - specs:        dict with num_samples, num_chirps, num_tx, num_rx, fps and experiment_name
+        '''
+        params = os.path.basename(os.path.normpath(dir_name)).split('_')
+
+        specs = {'num_samples': int(params[4].split('x')[0][1:]),
+                 'num_chirps': int(params[4].split('x')[1][1:]),
+                 'num_tx': int(params[3][3]),
+                 'num_rx': int(params[3][4]),
+                 'fps': int(params[5][3:]),
+                 'experiment_name': '_'.join(params[6:])}
+        return specs
+
+    def unpack_frames(self, frames, out=None, dtype=None):
+        '''
+        Deinterleave int16 ADC frames into a radarcube buffer, writing straight into the (optionally preallocated) output. 
+
+        The DCA1000 stores samples as interleaved I/Q int16 words, which is the memory layout of complex64/complex128 
+        (and IQ_INT16), so the payload of every chirp is cast into the output in a single pass without temporaries.
+
+        Args:
+            - frames:           int16 array (axes: frames, slow_time, chirp_data_size) with the HSI header in each row
+            - out:              optional output buffer (axes: frames, slow_time, channels, fast_time), reused if its shape 
+                                and dtype match 
+            - dtype:            np.complex64 (default), np.complex128 or IQ_INT16 
+
+        Outputs:
+            - out:              radarcube in C-type order (axes: frames, slow_time, channels, fast_time)
+        '''
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        shape = (frames.shape[0], self.num_chirps, self.num_rx, self.num_samples)
+        if out is None or out.shape != shape or out.dtype != dtype:
+            out = np.empty(shape, dtype=dtype)
+
+        # (1) payload of each chirp in I, Q, I, Q, ... order
+        payload = frames[:, :, self.header_size:]
+
+        # (2) view the output as interleaved pairs of its underlying real type and cast the payload into it
+        if dtype == IQ_INT16:
+            out_pairs = out.view(np.int16)
+        elif dtype.kind == 'c':
+            out_pairs = out.view(dtype.char.lower())
+        else:
+            raise ValueError("The specified dtype is not supported!!!")
+        out_pairs.reshape(payload.shape)[...] = payload
+
+        return out
+
     def raw_radarcube(self, raw_data):
         '''
         Obtain raw radarcube from captured binary data file.
@@ -82,88 +142,202 @@ x
 
         IQ = 2
         chirp_data_size = self.num_samples * self.num_rx * IQ + self.header_size  # across all receivers 
+        frame_size = chirp_data_size * self.num_chirps
 
         # (1) compute last unfinished frame data 
-        count_remove = np.size(raw_data) % (chirp_data_size * self.num_chirps)   
-        next_frame_data = raw_data[-count_remove:] # second return object
+        num_frames = np.size(raw_data) // frame_size
+        next_frame_data = raw_data[num_frames * frame_size:] # second return object
 
-        # (2) reshape complete frames to total_chirps x chirp_data_size format
+        # (2) reshape complete frames to frames x chirps x chirp_data_size format
         # the first 32 entries in each row belong to the HSI header data
-        num_frames = np.size(raw_data[:-count_remove]) // (chirp_data_size * self.num_chirps)
-        data_mat = np.reshape(raw_data[:-count_remove], (num_frames * self.num_chirps, chirp_data_size))
-        # print('number of samples removed: ' + str(count_remove))
-        # print('reshaped raw data size: ' + str(data_mat.shape))
+        data_mat = np.reshape(raw_data[:num_frames * frame_size], (num_frames, self.num_chirps, chirp_data_size))
 
         # (3) convert data to complex format 
-        data_mat_complex = np.zeros((num_frames * self.num_chirps, self.num_samples * self.num_rx), dtype=complex)
-        data_mat_complex = data_mat[:,self.header_size::2]   + data_mat[:,self.header_size+1::2]*1j  
-
         # (3.1) 18xx format (suggested by TI - but did not work, used above instead)
         #data_mat_complex[:,0::2] = data_mat[:,header_size::4] + data_mat[:,header_size+2::4]*1j
         #data_mat_complex[:,1::2] = data_mat[:,header_size+1::4] + data_mat[:,header_size+3::4]*1j
 
-        # (4) reshape to 4D datacube (particular axes due to C-type reshaping, transposed later)
-
-        # (4.1) the strange order of radarcube dimensions is due to order of reshaping in C-type order  
-        radarcube = np.zeros((num_frames, self.num_chirps, self.num_rx, self.num_samples), dtype=complex)
-        radarcube = np.reshape(data_mat_complex, (num_frames, self.num_chirps, self.num_rx, self.num_samples))
+        # (4) 4D datacube (the strange order of radarcube dimensions is due to order of reshaping in C-type order)
+        radarcube = self.unpack_frames(data_mat)
 
         # (4.2) radarcube output (axes: fast_time, slow_time, channels, frames)
         return np.transpose(radarcube,(3,1,2,0)), next_frame_data
 
     
-    def raw_data_cube(self, dir_name):
+    def adc_data_files(self, dir_name):
         '''
-        Generator function that yeilds raw_data_cube iterator for each ADC raw data file.
+        List the ADC raw data files of a capture directory in recording order.
             Inputs:
                 - dir_name:     full path of raw data directory
             Outputs:
-                - data_cube:    generator output for raw data cube. Usage: generator_name = DataHandling.raw_data_cube(dir_name); data_cube = next(generator_name) 
+                - data_files:   datacard_record_hdr_0ADC*.bin files sorted by their numeric index (glob order is arbitrary)
         '''
-        # (1) parameters
-
-        # (1.1) vary with every iteration
-        file_index = 0
-        prev_file_data = np.array([])
-        data_flag = 1
-        # (1.2) fixed parameters
-        packet_len = self.num_samples *  self.num_rx * 2 + self.header_size 
         data_files = glob.glob(dir_name + '/datacard_record_hdr_0ADC*.bin')
-        #print(data_files)
-        # (1.3) file reading status parameter
-
-        # (2) yield rawdatacube while data_flag active 
-        while data_flag:
-            # (2.1) read data from file in current iteration and append data left in previous iteration 
-            #print(file_index)
-            current_file = data_files[file_index]
-            raw_data = np.fromfile(current_file, dtype=np.int16)
-            raw_appended = np.insert(raw_data, 0, prev_file_data) #insert in the beginning
-
-            # (2.2) select HSI header as first 32 words of ADC0 file
-            if file_index == 0:
-                hsi_header = raw_data[0 : self.header_size]
-
-            # (2.2.1) sanity check for header locations and proper rcube size 
-            error1 = np.array_equal(raw_appended[0 : np.size(hsi_header)], hsi_header) == 0
-            error2 = np.array_equal(raw_appended[packet_len:packet_len+np.size(hsi_header)], hsi_header) == 0
-            if error1 or error2:
-                print("Warning: headers don't match... something wrong with data unwrapping")
-                print('hsi_header:                  ' + str(hsi_header))
-                print('1st hsi header in next file: ' + str(raw_appended[0 : np.size(hsi_header)]))
-                print('2nd hsi header in next file: ' + str(raw_appended[packet_len:packet_len+np.size(hsi_header)]))
-                assert 1==0, "HSI headers don't match..."
-
-            # (2.3) call raw_radarcube script to reshape the data into data_cube and incomplete next frame data
-            data_cube, next_frame_data = self.raw_radarcube(raw_appended)
-            #print('file index: ' + str(file_index) + ' | datacube shape' + str(data_cube.shape))  # for debug, print the shape
-        
-            # (2.4) change variable values for next iteration 
-            prev_file_data = next_frame_data     
-            file_index += 1  
-            data_flag = file_index < len(data_files) 
 
-            yield data_cube
+        def file_index(name):
+            match = re.search(r'_(\d+)\.bin$', name)
+            return int(match.group(1)) if match else -1
 
+        return sorted(data_files, key=file_index)
 
+    def num_frames(self, dir_name):
+        '''
+        Number of complete frames in a capture, computed from the ADC raw data file sizes without reading any data.
+            Inputs:
+                - dir_name:     full path of raw data directory
+            Outputs:
+                - num_frames:   total number of frames yielded by raw_frame_stream, raw_data_cube and raw_frames
+        '''
+        IQ = 2
+        frame_size = (self.num_samples * self.num_rx * IQ + self.header_size) * self.num_chirps 
+        num_words = sum(os.path.getsize(data_file) // 2 for data_file in self.adc_data_files(dir_name))
+
+        return num_words // frame_size
+
+    def raw_frame_stream(self, dir_name):
+        '''
+        Generator that treats all ADC raw data files of a capture as one continuous int16 stream backed by np.memmap. 
+
+        Frames are yielded as views into the memory-mapped files, so no file is read into memory as a whole. Only the 
+        single frame that straddles two files is assembled (copied) from the tail of one file and the head of the next. 
 
+            Inputs:
+                - dir_name:     full path of raw data directory
+            Outputs:
+                - file_index:   index of the file the frames are attributed to (a straddling frame belongs to the next file)
+                - frames:       int16 array (axes: frames, slow_time, chirp_data_size); each row starts with the HSI header
+        '''
+        # (1) fixed parameters 
+        IQ = 2
+        chirp_data_size = self.num_samples * self.num_rx * IQ + self.header_size 
+        frame_size = chirp_data_size * self.num_chirps 
+        data_files = self.adc_data_files(dir_name)
+
+        # (2) samples of the unfinished frame carried over to the next file 
+        carry = np.zeros(0, dtype=np.int16)
+
+        for file_index, current_file in enumerate(data_files):
+            if os.path.getsize(current_file) < 2:
+                continue
+            # explicit shape: a truncated capture with an odd number of bytes drops its last byte instead of failing
+            raw_data = np.memmap(current_file, dtype=np.int16, mode='r', shape=(os.path.getsize(current_file) // 2,))
+            start = 0
+
+            # (2.1) complete the frame left unfinished in the previous file (copy of a single frame only)
+            if carry.size:
+                need = frame_size - carry.size
+                if raw_data.size < need:
+                    carry = np.concatenate((carry, raw_data))
+                    continue
+                frame = np.concatenate((carry, raw_data[:need]))
+                yield file_index, frame.reshape(1, self.num_chirps, chirp_data_size)
+                start = need
+
+            # (2.2) complete frames within the file as strided views into the memmap
+            num_frames = (raw_data.size - start) // frame_size
+            stop = start + num_frames * frame_size
+            if num_frames:
+                yield file_index, raw_data[start:stop].reshape(num_frames, self.num_chirps, chirp_data_size)
+
+            # (2.3) keep the tail for the next file
+            carry = np.array(raw_data[stop:])
+
+    def _check_hsi_header(self, frame, hsi_header):
+        '''
+        Sanity check for header locations of the first two chirps of a frame (axes: slow_time, chirp_data_size).
+        '''
+        error1 = np.array_equal(frame[0, :self.header_size], hsi_header) == 0
+        error2 = self.num_chirps > 1 and np.array_equal(frame[1, :self.header_size], hsi_header) == 0
+        if error1 or error2:
+            print("Warning: headers don't match... something wrong with data unwrapping")
+            print('hsi_header:                  ' + str(hsi_header))
+            print('1st hsi header in next file: ' + str(frame[0, :self.header_size]))
+            print('2nd hsi header in next file: ' + str(frame[min(1, self.num_chirps - 1), :self.header_size]))
+            assert 1==0, "HSI headers don't match..."
+
+    def raw_data_cube(self, dir_name):
+        '''
+        Generator function that yeilds raw_data_cube iterator for each ADC raw data file.
+            Inputs:
+                - dir_name:     full path of raw data directory
+            Outputs:
+                - data_cube:    generator output for raw data cube. Usage: generator_name = DataHandling.raw_data_cube(dir_name); data_cube = next(generator_name) 
+        '''
+        # (1) parameters
+        hsi_header = None
+
+        # (2) group the memory-mapped frame blocks of the stream per file  
+        def file_blocks():
+            blocks, current_index = [], None
+            for file_index, frames in self.raw_frame_stream(dir_name):
+                if blocks and file_index != current_index:
+                    yield blocks
+                    blocks = []
+                blocks.append(frames)
+                current_index = file_index
+            if blocks:
+                yield blocks
+
+        # (3) yield rawdatacube for each file 
+        for blocks in file_blocks():
+
+            # (3.1) select HSI header as first 32 words of the stream
+            if hsi_header is None:
+                hsi_header = np.array(blocks[0][0, 0, :self.header_size])
+
+            # (3.2) sanity check for header locations of the first two chirps in the file
+            self._check_hsi_header(blocks[0][0], hsi_header)
+
+            # (3.3) unpack the frame views directly into the output radarcube 
+            num_frames = sum(frames.shape[0] for frames in blocks)
+            radarcube = np.empty((num_frames, self.num_chirps, self.num_rx, self.num_samples), dtype=self.dtype)
+            frame_index = 0
+            for frames in blocks:
+                self.unpack_frames(frames, out=radarcube[frame_index:frame_index + frames.shape[0]])
+                frame_index += frames.shape[0]
+
+            # (3.4) radarcube output (axes: fast_time, slow_time, channels, frames)
+            yield np.transpose(radarcube, (3,1,2,0))
+
+    def raw_frames(self, dir_name, batch_size=1):
+        '''
+        Generator function that yields the raw radarcube of a capture in batches of frames, independent of file splits.
+
+        Only one batch of batch_size frames is unpacked at a time, so memory use and latency depend on the batch size 
+        and not on the size of the ADC raw data files.
+            Inputs:
+                - dir_name:     full path of raw data directory
+                - batch_size:   number of frames per yielded radarcube (the last batch may hold fewer frames)
+            Outputs:
+                - data_cube:    raw data radarcube (axes: fast_time, slow_time, channels, frames). 
+                                Usage: for data_cube in DataHandling.raw_frames(dir_name, batch_size=8): ...
+        '''
+        assert batch_size >= 1, "batch_size must be at least one frame"
+
+        # (1) batch buffer and HSI header of the stream
+        shape = (batch_size, self.num_chirps, self.num_rx, self.num_samples)
+        batch = np.empty(shape, dtype=self.dtype)
+        filled = 0
+        hsi_header = None
+
+        # (2) fill the batch from the memory-mapped frame stream and yield it once complete 
+        for _, frames in self.raw_frame_stream(dir_name):
+            if hsi_header is None:
+                hsi_header = np.array(frames[0, 0, :self.header_size])
+            self._check_hsi_header(frames[0], hsi_header)
+
+            frame_index = 0
+            while frame_index < frames.shape[0]:
+                count = min(batch_size - filled, frames.shape[0] - frame_index)
+                self.unpack_frames(frames[frame_index:frame_index + count], out=batch[filled:filled + count])
+                frame_index += count
+                filled += count
+
+                if filled == batch_size:
+                    yield np.transpose(batch, (3,1,2,0))
+                    batch = np.empty(shape, dtype=self.dtype)
+                    filled = 0
+
+        # (3) remaining frames of the capture
+        if filled:
+            yield np.transpose(batch[:filled], (3,1,2,0))
@@ -11,4 +11,5 @@
 # ==============================================================================
 
 from .adc import *
-from .file_parse import *	
\ No newline at end of file
+from .file_parse import *
+from .reassembly import *	
\ No newline at end of file
@@ -11,12 +11,16 @@
 # ==============================================================================
 
 import codecs
+import queue
 import socket
 import struct
+import threading
 from enum import Enum
 
 import numpy as np
 
+from .reassembly import reassemble_packets
+
 
 class CMD(Enum):
     RESET_FPGA_CMD_CODE = '0100'
@@ -59,6 +63,8 @@ PACKETS_IN_FRAME = BYTES_IN_FRAME / BYTES_IN_PACKET
 PACKETS_IN_FRAME_CLIPPED = BYTES_IN_FRAME // BYTES_IN_PACKET
 UINT16_IN_PACKET = BYTES_IN_PACKET // 2
 UINT16_IN_FRAME = BYTES_IN_FRAME // 2
+# PACKET HEADER: 4 byte sequence number + 6 byte count of bytes sent before the packet
+PACKET_HEADER_SIZE = 10
 
 
 class DCA1000:
@@ -83,6 +89,11 @@ class DCA1000:
         >>> adc_data = dca.read(timeout=.1)
         >>> frame = dca.organize(adc_data, 128, 4, 256)
 
+        Real-time capture on a receiver thread:
+        >>> dca.start_receiver()
+        >>> adc_data = dca.read_frame(timeout=.1)
+        >>> print(dca.stream_stats['lost_packets'], dca.stream_stats['reordered_packets'])
+
     """
 
     def __init__(self, static_ip='192.168.33.30', adc_ip='192.168.33.180',
@@ -122,6 +133,17 @@ class DCA1000:
         self.last_frame = None
 
         self.lost_packets = None
+        self.frame_valid = None
+        self.frame_num = None
+        self._pending_packets = []
+        self._packet_buffer = None
+
+        # Real-time receiver (see start_receiver)
+        self._receiver = None
+        self._receiver_stop = threading.Event()
+        self._frame_queue = queue.Queue()
+        self.ring_buffer = None
+        self.stream_stats = {}
 
     def configure(self):
         """Initializes and connects to the FPGA
@@ -153,50 +175,292 @@ class DCA1000:
             None
 
         """
+        self.stop_receiver()
         self.data_socket.close()
         self.config_socket.close()
 
     def read(self, timeout=1):
-        """ Read in a single packet via UDP
+        """ Read in a single frame via UDP
+
+        Packets are placed in the frame by their sequence number (see reassembly.reassemble_packets). Missing packets
+        are zero filled, their number is stored in lost_packets and frame_valid tells whether the frame is complete.
 
         Args:
             timeout (float): Time to wait for packet before moving on
 
         Returns:
-            Full frame as array if successful, else None
+            Full frame as uint16 array (raises socket.timeout if no packet arrives within timeout)
 
         """
         # Configure
         self.data_socket.settimeout(timeout)
 
-        # Frame buffer
-        ret_frame = np.zeros(UINT16_IN_FRAME, dtype=np.uint16)
+        # Packets of the next frame already read with the previous one are used first
+        pending_packets, self._pending_packets = self._pending_packets, []
+
+        def next_packet():
+            return pending_packets.pop(0) if pending_packets else self._read_data_packet()
 
-        # Wait for start of next frame
+        # Wait for the packet holding the start of the next frame
         while True:
-            packet_num, byte_count, packet_data = self._read_data_packet()
-            if byte_count % BYTES_IN_FRAME_CLIPPED == 0:
-                packets_read = 1
-                ret_frame[0:UINT16_IN_PACKET] = packet_data
+            packet_num, byte_count, packet_data = next_packet()
+            frame_start = -(-byte_count // BYTES_IN_FRAME) * BYTES_IN_FRAME
+            if frame_start < byte_count + packet_data.nbytes:
                 break
 
-        # Read in the rest of the frame            
+        # Packets overlapping the frame
+        first_packet = packet_num
+        num_packets = (frame_start + BYTES_IN_FRAME - 1) // BYTES_IN_PACKET - byte_count // BYTES_IN_PACKET + 1
+        frame_offset = frame_start - byte_count
+        if self._packet_buffer is None or self._packet_buffer.shape[0] < num_packets:
+            self._packet_buffer = np.zeros((num_packets, BYTES_IN_PACKET), dtype=np.uint8)
+        packet_nums = np.zeros(num_packets, dtype=np.int64)
+        placed = np.zeros(num_packets, dtype=bool)
+
+        # Read in the rest of the frame until a packet of the next frame arrives (duplicated packets are dropped)
+        last_packet = first_packet + num_packets - 1
+        packets_read = 0
         while True:
-            packet_num, byte_count, packet_data = self._read_data_packet()
-            packets_read += 1
+            if first_packet <= packet_num <= last_packet and not placed[packet_num - first_packet]:
+                placed[packet_num - first_packet] = True
+                packet_nums[packets_read] = packet_num
+                self._packet_buffer[packets_read, :packet_data.nbytes] = packet_data.view(np.uint8)
+                packets_read += 1
+                # the last packet of the frame also holds the start of the next one
+                if packet_num == last_packet and byte_count + packet_data.nbytes > frame_start + BYTES_IN_FRAME:
+                    self._pending_packets.append((packet_num, byte_count, packet_data))
+            elif packet_num > last_packet:
+                self._pending_packets.append((packet_num, byte_count, packet_data))
+                break
+            if packets_read == num_packets:
+                break
+            packet_num, byte_count, packet_data = next_packet()
+        self._pending_packets.extend(pending_packets)
+
+        # Place the packets by sequence number (missing packets are zero filled)
+        stream, received = reassemble_packets(packet_nums[:packets_read], self._packet_buffer[:packets_read],
+                                              first_packet=first_packet, num_packets=num_packets)
+        self.lost_packets = int(num_packets - received.sum())
+        self.frame_valid = self.lost_packets == 0
+
+        return stream[frame_offset:frame_offset + BYTES_IN_FRAME].view(np.uint16)
+
+    def start_receiver(self, num_slots=32, reorder_frames=2, rcvbuf_size=2 ** 25, bytes_in_frame=BYTES_IN_FRAME):
+        """Start receiving the ADC stream on a dedicated thread into a preallocated frame ring buffer
+
+        Every packet is read with recv_into into a fixed packet buffer and its payload is copied straight to its place
+        in the ring buffer, given by the byte count in the packet header (packets that straddle two frames are split).
+        A frame is published to the frame queue once all its bytes arrived, or as incomplete (missing bytes are zero)
+        once packets more than reorder_frames frames ahead arrive. Duplicated packets are counted and dropped. Use
+        read_frame to fetch the published frames.
+
+        Args:
+            num_slots (int): Number of frames in the ring buffer, i.e. how far the reader may lag behind
+            reorder_frames (int): Number of frames a packet may arrive late before its frame is published incomplete
+            rcvbuf_size (int): Requested kernel receive buffer size (SO_RCVBUF) in bytes
+            bytes_in_frame (int): Number of bytes in a frame
+
+        Returns:
+            None
+
+        """
+        assert num_slots > reorder_frames, "the ring buffer must hold more frames than the reorder window"
+        if self._receiver is not None:
+            self.stop_receiver()
+
+        self.data_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf_size)
+        self.data_socket.settimeout(0.1)
+
+        self.bytes_in_frame = bytes_in_frame
+        self.ring_buffer = np.zeros((num_slots, bytes_in_frame), dtype=np.uint8)
+        self._slot_frame = np.full(num_slots, -1, dtype=np.int64)
+        self._slot_bytes = np.zeros(num_slots, dtype=np.int64)
+        self._slot_offsets = [set() for _ in range(num_slots)]    # frame offsets of the payloads received per slot
+        self._frame_queue = queue.Queue()
+        self.stream_stats = {'packets': 0, 'lost_packets': 0, 'reordered_packets': 0, 'duplicate_packets': 0,
+                             'late_packets': 0, 'frames': 0, 'incomplete_frames': 0, 'overrun_frames': 0}
+
+        self._receiver_stop.clear()
+        self._receiver = threading.Thread(target=self._receive_loop, args=(reorder_frames,), daemon=True)
+        self._receiver.start()
+
+    def stop_receiver(self):
+        """Stops the receiver thread started by start_receiver
 
-            if byte_count % BYTES_IN_FRAME_CLIPPED == 0:
-                self.lost_packets = PACKETS_IN_FRAME_CLIPPED - packets_read
-                return ret_frame
+        Returns:
+            None
+
+        """
+        if self._receiver is not None:
+            self._receiver_stop.set()
+            self._receiver.join()
+            self._receiver = None
+
+    def read_frame(self, out=None, timeout=None):
+        """Fetch the next frame published by the receiver thread (non-blocking by default)
+
+        Args:
+            out (ndarray): Optional (UINT16_IN_FRAME,) uint16 buffer the frame is copied into, reused between calls
+            timeout (float): Time to wait for a frame, None returns immediately
 
-            curr_idx = ((packet_num - 1) % PACKETS_IN_FRAME_CLIPPED)
+        Returns:
+            Full frame as uint16 array (missing packets zero filled) if a frame is available, else None. The frame
+            number in the stream is stored in frame_num and the number of packets missing in the frame in lost_packets.
+
+        """
+        while True:
+            try:
+                if timeout is None:
+                    frame_num, slot = self._frame_queue.get_nowait()
+                else:
+                    frame_num, slot = self._frame_queue.get(timeout=timeout)
+            except queue.Empty:
+                return None
+
+            # The reader lagged a full ring behind and the slot was reused before or while copying. The receiver marks
+            # a reused slot with its new frame before touching its data, so the frame is checked on both sides of the
+            # copy (seqlock)
+            if self._slot_frame[slot] != frame_num:
+                self.stream_stats['overrun_frames'] += 1
+                continue
+            if out is None:
+                out = np.empty(self.bytes_in_frame // 2, dtype=np.uint16)
+            out.view(np.uint8)[:] = self.ring_buffer[slot]
+            missing_bytes = self.bytes_in_frame - self._slot_bytes[slot]
+            if self._slot_frame[slot] != frame_num:
+                self.stream_stats['overrun_frames'] += 1
+                continue
+
+            self.frame_num = frame_num
+            self.lost_packets = int(-(-missing_bytes // BYTES_IN_PACKET))
+            return out
+
+    def _receive_loop(self, reorder_frames):
+        """Receiver thread: reads packets into the ring buffer and publishes frames until stop_receiver is called
+
+        Args:
+            reorder_frames (int): Number of frames a packet may arrive late before its frame is published incomplete
+
+        Returns:
+            None
+
+        """
+        packet = np.zeros(MAX_PACKET_SIZE, dtype=np.uint8)
+        packet_view = memoryview(packet)
+        num_slots, frame_bytes = self.ring_buffer.shape
+        stats = self.stream_stats
+        expected_packet = None
+        missing_packets = set()     # sequence numbers of the gaps that may still be filled by reordered packets
+        max_missing = (reorder_frames + 1) * (frame_bytes // BYTES_IN_PACKET + 2)
+        next_frame = None           # oldest frame not yet published
+        newest_frame = None
+
+        while not self._receiver_stop.is_set():
             try:
-                ret_frame[curr_idx * UINT16_IN_PACKET:(curr_idx + 1) * UINT16_IN_PACKET] = packet_data
-            except:
-                pass
+                packet_len = self.data_socket.recv_into(packet_view)
+            except socket.timeout:
+                continue
+            if packet_len <= PACKET_HEADER_SIZE:
+                continue
+
+            packet_num = int.from_bytes(packet_view[:4], 'little')
+            byte_count = int.from_bytes(packet_view[4:PACKET_HEADER_SIZE], 'little')
+            stats['packets'] += 1
+
+            # Sequence bookkeeping (a reordered packet was counted as lost when the gap was seen, any other old packet
+            # is a duplicate)
+            if expected_packet is None or packet_num == expected_packet:
+                expected_packet = packet_num + 1
+            elif packet_num > expected_packet:
+                stats['lost_packets'] += packet_num - expected_packet
+                missing_packets.update(range(max(expected_packet, packet_num - max_missing), packet_num))
+                expected_packet = packet_num + 1
+                if len(missing_packets) > 2 * max_missing:
+                    missing_packets = {num for num in missing_packets if num >= expected_packet - max_missing}
+            elif packet_num in missing_packets:
+                missing_packets.discard(packet_num)
+                stats['reordered_packets'] += 1
+                stats['lost_packets'] -= 1
+            else:
+                stats['duplicate_packets'] += 1
+                continue
+
+            # Start with the first frame whose beginning is received
+            if next_frame is None:
+                next_frame = -(-byte_count // frame_bytes)
+                newest_frame = next_frame
+
+            # Copy the payload to its place in the ring, splitting it at frame boundaries
+            pos, end = byte_count, byte_count + packet_len - PACKET_HEADER_SIZE
+            src = PACKET_HEADER_SIZE
+            while pos < end:
+                frame_num, offset = divmod(pos, frame_bytes)
+                size = min(end - pos, frame_bytes - offset)
+
+                if frame_num < next_frame:
+                    stats['late_packets'] += 1
+                else:
+                    # Publish frames that fell out of the reorder window
+                    newest_frame = max(newest_frame, frame_num)
+                    while newest_frame - next_frame >= reorder_frames:
+                        self._publish_frame(next_frame, num_slots)
+                        next_frame += 1
+
+                    slot = frame_num % num_slots
+                    if self._slot_frame[slot] != frame_num:
+                        self._reset_slot(slot, frame_num)
+                    if offset not in self._slot_offsets[slot]:
+                        self._slot_offsets[slot].add(offset)
+                        self.ring_buffer[slot, offset:offset + size] = packet[src:src + size]
+                        self._slot_bytes[slot] += size
+
+                pos += size
+                src += size
+
+            # Publish completed frames in order
+            while self._slot_frame[next_frame % num_slots] == next_frame and \
+                    self._slot_bytes[next_frame % num_slots] == frame_bytes:
+                self._publish_frame(next_frame, num_slots)
+                next_frame += 1
+
+    def _publish_frame(self, frame_num, num_slots):
+        """Helper function to hand a frame of the ring buffer over to the frame queue
+
+        Args:
+            frame_num (int): Number of the frame in the stream
+            num_slots (int): Number of frames in the ring buffer
 
-            if packets_read > PACKETS_IN_FRAME_CLIPPED:
-                packets_read = 0
+        Returns:
+            None
+
+        """
+        slot = frame_num % num_slots
+        if self._slot_frame[slot] != frame_num:
+            # No packet of this frame arrived at all
+            self._reset_slot(slot, frame_num)
+        if self._slot_bytes[slot] < self.ring_buffer.shape[1]:
+            self.stream_stats['incomplete_frames'] += 1
+        self.stream_stats['frames'] += 1
+        self._frame_queue.put_nowait((frame_num, slot))
+
+    def _reset_slot(self, slot, frame_num):
+        """Helper function to reuse a slot of the ring buffer for a new frame
+
+        The slot is marked with its new frame before its data is cleared, so a concurrent read_frame of the previous
+        frame sees the change (see read_frame).
+
+        Args:
+            slot (int): Slot of the ring buffer
+            frame_num (int): Number of the frame in the stream
+
+        Returns:
+            None
+
+        """
+        self._slot_frame[slot] = frame_num
+        self.ring_buffer[slot].fill(0)
+        self._slot_bytes[slot] = 0
+        self._slot_offsets[slot].clear()
 
     def _send_command(self, cmd, length='0000', body='', timeout=1):
         """Helper function to send a single commmand to the FPGA
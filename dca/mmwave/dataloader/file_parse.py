@@ -10,11 +10,15 @@
 # limitations under the License.
 # ==============================================================================
 
+import os
 import numpy as np
-import struct
+from . import reassembly
 
+# Header of a packet in a raw DCA1000 dump, followed by packet_length bytes of adc data
+PACKET_HEADER = np.dtype([('packet_num', '<i4'), ('packet_length', '<i4'), ('byte_count', 'u1', 6)])
 
-def parse_raw_adc(source_fp, dest_fp):
+
+def parse_raw_adc(source_fp, dest_fp, bytes_in_frame=None):
     """Reads a binary data file containing raw adc data from a DCA1000, cleans it and saves it for manual processing.
 
     Note:
@@ -22,68 +26,88 @@ def parse_raw_adc(source_fp, dest_fp):
         meta data and is merged with actual pure adc data. Part of the purpose of this function is to remove this
         meta data.
 
+        Missing packets are zero filled and reordered packets are put in place by their sequence number.
+
+        The source is memory mapped and its packet headers are read through a structured dtype (see scan_packets), so
+        the payloads are copied straight from the source to the memory mapped destination in one bulk gather.
+
     Args:
         source_fp (str): Path to raw binary adc data.
         dest_fp (str): Path to output cleaned binary adc data.
+        bytes_in_frame (int): (Optional) Number of bytes in a frame, enables the per-frame validity mask.
 
     Returns:
-        None
+        tuple [ndarray, dict]:
+            valid (ndarray): (num_frames,) Boolean mask of the frames without missing packets (None if bytes_in_frame
+                is not given).
+            stats (dict): Packet loss statistics, see reassembly.packet_loss_stats.
 
     """
-    buff = np.fromfile(source_fp, dtype=np.uint8)
-    packets_recv = 0
-    buff_pos = 0
-    adc_data = []
-    while buff_pos < len(buff):
-        packets_recv += 1
-
-        # Index binary data
-        sequence_info = buff[buff_pos:buff_pos + 4]
-        length_info = buff[buff_pos + 4:buff_pos + 8]
-        # bytes_info = buff[buff_pos + 8:buff_pos + 14]
-        buff_pos += 14
-
-        # Unpack binary data
-        packet_num = struct.unpack('<1l', sequence_info)[0]
-        packet_length = struct.unpack('<l', length_info.tobytes())[0]
-        # curr_bytes_read = struct.unpack('<Q', np.pad(bytes_info, (0, 2), mode='constant').tobytes())[0]
-
-        # Build data
-        if packets_recv == packet_num:
-            adc_data.append(buff[buff_pos:buff_pos + packet_length])
-            buff_pos += packet_length
-
-        # Zero fill array
-        elif packets_recv < packet_num:
-            while packets_recv < packet_num:
-                adc_data.append(np.zeros(packet_length))
-                packets_recv += 1
-            adc_data.append(buff[buff_pos:buff_pos + packet_length])
-            buff_pos += packet_length
-
-        # Place packet in correct place
-        else:
-            adc_data[packet_num-1] = buff[buff_pos:buff_pos + packet_length]
-            buff_pos += packet_length
-
-    adc_data = np.concatenate(adc_data)
-
-    # Write data to destination
-    fp = open(dest_fp, 'wb')
-
-    if adc_data.itemsize == 0:
-        buffer_size = 0
+    buff = np.memmap(source_fp, dtype=np.uint8, mode='r') if os.path.getsize(source_fp) else np.zeros(0, np.uint8)
+    segments = scan_packets(buff)
+
+    packet_nums = np.concatenate([np.zeros(0, np.int64)] + [nums.astype(np.int64) for nums, _ in segments])
+    packet_size = max([payloads.shape[1] for _, payloads in segments], default=0)
+
+    # (1) size of the stream: the end of the packet reaching furthest (missing packets are zero filled)
+    num_bytes = max([int((nums.astype(np.int64).max() - 1) * packet_size + payloads.shape[1])
+                     for nums, payloads in segments], default=0)
+    num_packets = -(-num_bytes // packet_size) if packet_size else 0
+
+    # (2) zero initialized memory mapped destination and one bulk gather of the payloads by sequence number per run
+    received = np.zeros(num_packets, dtype=bool)
+    if num_bytes:
+        adc_data = np.memmap(dest_fp, dtype=np.uint8, mode='w+', shape=(num_bytes,))
+        for nums, payloads in segments:
+            received |= reassembly.reassemble_packets(nums, payloads, num_packets=num_packets, out=adc_data,
+                                                      packet_size=packet_size)[1]
+        adc_data.flush()
     else:
-        # Set buffer size to 16 MiB to hide the Python loop overhead.
-        buffer_size = max(16 * 1024 ** 2 // adc_data.itemsize, 1)
-
-    if adc_data.flags.f_contiguous and not adc_data.flags.c_contiguous:
-        for chunk in np.nditer(
-                adc_data, flags=['external_loop', 'buffered', 'zerosize_ok'],
-                buffersize=buffer_size, order='F'):
-            fp.write(chunk.tobytes('C'))
-    else:
-        for chunk in np.nditer(
-                adc_data, flags=['external_loop', 'buffered', 'zerosize_ok'],
-                buffersize=buffer_size, order='C'):
-            fp.write(chunk.tobytes('C'))
+        np.zeros(0, dtype=np.uint8).tofile(dest_fp)
+
+    return reassembly.packet_loss_stats(packet_nums, received, bytes_in_frame, packet_size, num_bytes)
+
+
+def scan_packets(buff):
+    """Locate the packets of a raw DCA1000 dump without a per packet loop.
+
+    All packets of a dump have the same length, except for the last one. Starting from the first header the buff is
+    viewed as records of (header, payload) of that length, so the sequence numbers and payloads of all packets are
+    strided views of the buff. A new run of records starts after a packet of a different length.
+
+    Args:
+        buff (ndarray): uint8 contents of the raw dump (typically a memmap).
+
+    Returns:
+        segments (list): (packet_nums, payloads) per run of equal length packets, with packet_nums (num_packets,) int32
+            sequence numbers and payloads (num_packets, packet_length) uint8 views of the buff.
+
+    """
+    segments = []
+    buff_pos = 0
+    while buff_pos + PACKET_HEADER.itemsize <= buff.size:
+        packet_length = int(buff[buff_pos + 4:buff_pos + 8].view('<i4')[0])
+        if packet_length < 0:
+            raise ValueError('Corrupt packet header at byte {}'.format(buff_pos))
+        record_size = PACKET_HEADER.itemsize + packet_length
+        num_records = (buff.size - buff_pos) // record_size
+
+        # (1) truncated last packet
+        if num_records == 0:
+            header = buff[buff_pos:buff_pos + PACKET_HEADER.itemsize].view(PACKET_HEADER)
+            segments.append((header['packet_num'], buff[buff_pos + PACKET_HEADER.itemsize:][None, :]))
+            break
+
+        # (2) view the rest of the buff as records of this length and keep the ones up to the first other length
+        record = np.dtype({'names': ['packet_num', 'packet_length', 'payload'],
+                           'formats': ['<i4', '<i4', ('u1', packet_length)],
+                           'offsets': [0, 4, PACKET_HEADER.itemsize], 'itemsize': record_size})
+        records = buff[buff_pos:buff_pos + num_records * record_size].view(record)
+        other_length = np.flatnonzero(records['packet_length'] != packet_length)
+        if other_length.size:
+            num_records = other_length[0]
+
+        segments.append((records['packet_num'][:num_records], records['payload'][:num_records]))
+        buff_pos += num_records * record_size
+
+    return segments
@@ -0,0 +1,155 @@
+# Copyright 2019 The OpenRadar Authors. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+
+
+def reassemble_packets(packet_nums, payloads, lengths=None, first_packet=1, num_packets=None, out=None,
+                       packet_size=None):
+    """Place DCA1000 packets in the byte stream by their sequence number, zero filling missing packets in one shot.
+
+    Packet n (1-based) holds stream bytes [(n - 1) * packet_size, n * packet_size), so all packets are scattered to
+    their place with a single fancy-indexed assignment. Duplicated packets overwrite each other (the last one wins).
+    DCA1000.read and parse_raw_adc both place their packets with this function.
+
+    Args:
+        packet_nums (ndarray): (num_recv,) Sequence numbers of the received packets, in any order.
+        payloads (ndarray): (num_recv, packet_size) uint8 payloads of the received packets (may be a strided view).
+        lengths (ndarray): (Optional) (num_recv,) Payload lengths if some packets are shorter than packet_size. Only the
+            last packet of a stream is expected to be short.
+        first_packet (int): Sequence number of the first packet of the reassembled stream.
+        num_packets (int): (Optional) Number of packets of the stream. Defaults to the highest received packet.
+        out (ndarray): (Optional) Zero initialized uint8 buffer holding the stream (the short last packet may be cut
+            off). Packets already placed in it are kept, so the runs of packets of one stream can be placed by several
+            calls.
+        packet_size (int): (Optional) Payload size of a full packet. Defaults to the width of payloads, narrower
+            payloads are short packets.
+
+    Returns:
+        tuple [ndarray, ndarray]:
+            stream (ndarray): uint8 byte stream with missing packets zero filled.
+            received (ndarray): (num_packets,) Boolean mask of the packets that were received.
+
+    """
+    packet_nums = np.asarray(packet_nums, dtype=np.int64)
+    payloads = np.asarray(payloads)
+    packet_size = payloads.shape[1] if packet_size is None else packet_size
+
+    # (1) keep the packets that belong to the requested stream
+    index = packet_nums - first_packet
+    if num_packets is None:
+        num_packets = int(index.max()) + 1 if index.size else 0
+    keep = (index >= 0) & (index < num_packets)
+    if not np.all(keep):
+        index, payloads = index[keep], payloads[keep]
+        lengths = None if lengths is None else np.asarray(lengths)[keep]
+
+    # (2) zero filled stream and one-shot scatter of all payloads
+    if out is None:
+        stream = np.zeros(num_packets * packet_size, dtype=np.uint8)
+    else:
+        stream = out.reshape(-1)[:num_packets * packet_size]
+    if payloads.shape[1] == packet_size:
+        stream[:stream.size // packet_size * packet_size].reshape(-1, packet_size)[index] = payloads
+    else:
+        # short packets (end of the stream)
+        for packet_index, payload in zip(index, payloads):
+            stream[packet_index * packet_size:packet_index * packet_size + payload.size] = payload
+
+    received = np.zeros(num_packets, dtype=bool)
+    received[index] = True
+
+    # (3) a short packet ends the stream
+    if lengths is not None and index.size:
+        lengths = np.asarray(lengths)
+        short = lengths < packet_size
+        if np.any(short):
+            last = np.argmax(np.where(short, index, -1))
+            stream = stream[:index[last] * packet_size + int(lengths[last])]
+
+    return stream, received
+
+
+def lost_packets_per_frame(received, bytes_in_frame, num_frames, packet_size, frame_offset=0):
+    """Count the missing packets overlapping each frame of the stream.
+
+    Args:
+        received (ndarray): (num_packets,) Boolean mask of the received packets (see reassemble_packets).
+        bytes_in_frame (int): Number of bytes in a frame.
+        num_frames (int): Number of frames in the stream.
+        packet_size (int): Payload size of a full packet.
+        frame_offset (int): Stream byte at which the first frame starts.
+
+    Returns:
+        lost (ndarray): (num_frames,) Number of missing packets in each frame. Packets beyond the mask count as missing.
+
+    """
+    starts = frame_offset + np.arange(num_frames, dtype=np.int64) * bytes_in_frame
+    first = starts // packet_size
+    last = (starts + bytes_in_frame - 1) // packet_size
+
+    # cumulative count of missing packets, extended with missing packets beyond the received mask
+    missing = np.concatenate(([0], np.cumsum(~received)))
+    beyond = np.maximum(last + 1 - received.size, 0) - np.maximum(first - received.size, 0)
+    lost = missing[np.minimum(last + 1, received.size)] - missing[np.minimum(first, received.size)] + beyond
+
+    return lost
+
+
+def gap_histogram(received):
+    """Histogram of the lengths of the runs of consecutive missing packets.
+
+    Args:
+        received (ndarray): (num_packets,) Boolean mask of the received packets.
+
+    Returns:
+        histogram (ndarray): histogram[n] is the number of gaps of n consecutive missing packets.
+
+    """
+    edges = np.diff(np.concatenate(([0], (~np.asarray(received)).astype(np.int8), [0])))
+    gap_lengths = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+    return np.bincount(gap_lengths, minlength=1)
+
+
+def packet_loss_stats(packet_nums, received, bytes_in_frame=None, packet_size=None, num_bytes=None):
+    """Packet loss statistics of a reassembled stream and, if the frame size is given, the per-frame validity mask.
+
+    Args:
+        packet_nums (ndarray): (num_recv,) Sequence numbers of the received packets.
+        received (ndarray): (num_packets,) Boolean mask of the received packets (see reassemble_packets).
+        bytes_in_frame (int): (Optional) Number of bytes in a frame.
+        packet_size (int): (Optional) Payload size of a full packet, required with bytes_in_frame.
+        num_bytes (int): (Optional) Size of the reassembled stream if it ends with a short packet.
+
+    Returns:
+        tuple [ndarray, dict]:
+            valid (ndarray): (num_frames,) Boolean mask of the complete frames without missing packets (None if
+                bytes_in_frame is not given).
+            stats (dict): 'gap_histogram' (see gap_histogram), 'received_packets', 'missing_packets' and
+                'duplicate_packets' totals, plus 'lost_packets' per frame if bytes_in_frame is given.
+
+    """
+    stats = {'gap_histogram': gap_histogram(received),
+             'received_packets': int(received.sum()),
+             'missing_packets': int(received.size - received.sum()),
+             'duplicate_packets': int(np.size(packet_nums) - np.unique(packet_nums).size)}
+
+    valid = None
+    if bytes_in_frame:
+        num_bytes = received.size * packet_size if num_bytes is None else num_bytes
+        num_frames = num_bytes // bytes_in_frame
+        stats['lost_packets'] = lost_packets_per_frame(received, bytes_in_frame, num_frames, packet_size)
+        valid = stats['lost_packets'] == 0
+
+    return valid, stats
+
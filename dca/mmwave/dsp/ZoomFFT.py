@@ -149,7 +149,6 @@ class ZoomFFT:
 
             if self.length % bw_of_interest != 0:
                 logging.warning("length of signal should be divisible by bw_of_interest. Zoom FFT Spectrum may distort!")
-                input("Press Enter to continue...")
 
             fc = (self.low_freq + self.high_freq) / 2
             bw_factor = np.floor(self.fs / bw_of_interest).astype(np.uint8)
@@ -164,9 +163,8 @@ class ZoomFFT:
 
             if resample_range != self.original_sample_range:
                 logging.warning("resample resolution != original sample resolution. Zoom FFT Spectrum may distort!")
-                input("Press Enter to continue...")
 
-            xd = signal.resample(y, np.int(resample_number))
+            xd = signal.resample(y, int(resample_number))
 
             fftlen = len(xd)
             Xd = fft(xd)
@@ -15,6 +15,7 @@ from .cfar import *
 from .compensation import *
 from .doppler_processing import *
 from .range_processing import *
+from .range_doppler import *
 from .utils import *
 from .noise_removal import *
 from .music import *
\ No newline at end of file
@@ -10,134 +10,118 @@
 # limitations under the License.
 # ==============================================================================
 
+import os
+import hashlib
+import tempfile
+import functools
 import numpy as np
 from .utils import *
 from . import compensation
+from .doppler_processing import separate_tx
 from scipy.signal import find_peaks
 import warnings
 
-def azimuth_processing(radar_cube, det_obj_2d, config, window_type_2d=None):
+# TI xWR1843 virtual antenna map in half wavelengths (azimuth, elevation)
+# Row 1               8  9  10 11
+# Row 2         0  1  2  3  4  5  6  7
+AWR1843_VIRTUAL_ARRAY = tuple((x, 0) for x in range(8)) + tuple((x, 1) for x in range(2, 6))
+
+
+def azimuth_processing(radar_cube,
+                       det_obj_2d,
+                       num_tx_antennas,
+                       num_angle_bins=64,
+                       fft2d_out=None,
+                       window_type_2d=None,
+                       clutter_removal_enabled=False,
+                       num_virtual_ant_azim=None,
+                       rx_channel_comp=None,
+                       range_resolution=1.0):
     """Calculate the X/Y coordinates for all detected objects.
     
-    The following procedures will be performed in this function:
+    The following procedures will be performed in this function for all detected objects at once:
 
-    1. Filter radarCube based on the range indices from detObj2D and optional clutter removal.
-    2. Re-do windowing and 2D FFT, select associated doppler indices to form the azimuth input.
-    3. Doppler compensation on the virtual antennas related to tx2. Save optional copy for near field compensation and\
-      velocity disambiguation.
+    1. Gather the azimuth input of every detection from the 2D FFT output if it is given, otherwise compute a
+       single-point DFT at the doppler bin of every detection on its range bin (optional clutter removal and windowing).
+    2. Doppler compensation on the virtual antennas related to tx2 (and tx3).
+    3. Optional rx channel phase bias compensation.
     4. Perform azimuth FFT.
-    #. Optional near field correction and velocity disambiguation. Currently mutual exclusive.
     #. Magnitude squared.
     #. Calculate X/Y coordinates.
+
+    The cost per frame is proportional to the number of detections instead of the size of the radar cube.
     
     Args:
-        radar_cube: (numChirpsPerFrame, numRxAntennas, numRangeBins). Because of the space limitation, TI Demo starts again
-            from the 1D FFT, recalculate the 2D FFT on the selected range bins and pick the associated doppler bins for the 
-            azimuth FFT. 
-        det_obj_2d: (numDetObj, 3)
-        config: [TBD]
-        window_type_2d: windowing function for the 2D FFT. Default is None.
+        radar_cube (ndarray): (numChirpsPerFrame, numRxAntennas, numRangeBins) output of the 1D FFT. Only the range bins
+            of the detections are read, and only if fft2d_out is not given.
+        det_obj_2d (ndarray): (numDetObj, 3) rangeIdx, dopplerIdx (signed or unsigned, in the order of the unshifted
+            doppler FFT) and peakVal of the detected objects.
+        num_tx_antennas (int): Number of transmitter antennas (TDM interleaved chirps).
+        num_angle_bins (int): Size of the zero-padded azimuth FFT.
+        fft2d_out (ndarray): (Optional) (numRangeBins, numVirtualAntennas, num_doppler_bins) 2D FFT output already
+            computed for the frame, e.g. aoa_input of doppler_processing. It is reused instead of redoing the 2D FFT.
+        window_type_2d (mmwave.dsp.utils.Window): Optional windowing type before the single-point DFT.
+        clutter_removal_enabled (boolean): Flag to enable naive clutter removal before the single-point DFT.
+        num_virtual_ant_azim (int): Number of virtual antennas of the azimuth array (first antennas of the virtual
+            array). Defaults to the antennas of the first 2 Tx.
+        rx_channel_comp (ndarray): (Optional) (numVirtualAntennas,) complex rx channel compensation coefficients.
+        range_resolution (float): Range resolution in meters per range bin for the X/Y coordinates.
     
     Returns:
-        azimuthOut: (numDetObj, 5). Copy of detObj2D but with populated X/Y coordinates.
+        azimuthOut: (numDetObj, 5). Copy of detObj2D with signed doppler index and populated X/Y coordinates.
     """
-    # detObj2D: [numDetObj, 3], where the columns are rangeIdx, dopplerIdx and peakVal
-    # 1. Filter 1D-FFT output along range direction and perform optional static clutter removal.
-    # fft2d_azimuth_in: [numChirpsPerFrame, numRxAntennas, numDetObj]
-    num_det_obj = det_obj_2d.shape[0]
-    fft2d_azimuth_in = radar_cube[..., det_obj_2d[:, RANGEIDX].astype(np.uint32)]
-
-    # Clutter Removal
-    if config.clutterRemovalEnabled:
-        fft2d_azimuth_in = compensation.clutterRemoval(fft2d_azimuth_in)
-
-    # Rearrange just like what is done for 1st 2D FFT calculation
-    # BE CAREFUL OF THE NAMING!
-    fft2d_azimuth_in = np.concatenate((fft2d_azimuth_in[0::2, ...], fft2d_azimuth_in[1::2, ...]), axis=1)
-    # transpose to (numDetObj, numVirtualAntennas, numDopplerBins)
-    fft2d_azimuth_in = np.transpose(fft2d_azimuth_in, axes=(2, 1, 0))
-
-    # 2. Perform windowing, filter along doppler direction and then full-FFT or single-point DFT.
-    # Windowing 32x32
-    fft2d_window_type = None
-    if fft2d_window_type:
-        fft2d_azimuth_in = windowing(fft2d_azimuth_in, fft2d_window_type, axis=2)
+    det_obj_2d = np.asarray(det_obj_2d)
+    range_idx = det_obj_2d[:, RANGEIDX].astype(np.int64)
+    doppler_idx = det_obj_2d[:, DOPPLERIDX].astype(np.int64)
+
+    # 1. Azimuth input of every detection: (numDetObj, numVirtualAntennas)
+    if fft2d_out is not None:
+        num_doppler_bins = fft2d_out.shape[2]
+        azimuth_in = fft2d_out[range_idx, :, doppler_idx % num_doppler_bins]
     else:
-        fft2d_azimuth_in = fft2d_azimuth_in
-    # FFT 32x32
-    # Will worry about single-point DFT later.
-    fft2d_azimuth_out = np.fft.fft(fft2d_azimuth_in)
-    fft2d_azimuth_out = np.fft.fftshift(fft2d_azimuth_out, axes=2)
-    # Filter fft2d_azimuth_out with the DopplerIdx from CFAR and PG
-    # azimuth_in(numDetObj, numVirtualAntennas)
-    azimuth_in = np.zeros((num_det_obj, config.numAngleBins), dtype=np.complex_)
-    azimuth_in[:, :config.numVirtualAntAzim] = np.array([fft2d_azimuth_out[i, :, dopplerIdx] for i, dopplerIdx in
-                                                         enumerate(
-                                                             det_obj_2d[:, DOPPLERIDX].astype(np.uint32))]).squeeze()
-
-    assert azimuth_in.shape == (num_det_obj, config.numAngleBins), \
-        "azimuth FFT input dimension is wrong, it should be {} instead of {}." \
-            .format((num_det_obj, config.numAngleBins), azimuth_in.shape)
-
-    # 3. Doppler compensation.
-    # Only the 2nd half of the 2D FFT output needs to be compensated. That is 
-    # the reason for azimuth_in[:, numRxAntennas, :].
-    compensation.addDopplerCompensation(det_obj_2d[:, DOPPLERIDX],
-                                        compensation.azimuthModCoefs,
-                                        compensation.azimuthModCoefsHalfBin,
-                                        azimuth_in[:, config.numRxAntennas:],
-                                        config.numRxAntennas * (config.numTxAntennas - 1))
-
-    # If receiver channel biases are provided, activate the following function
-    # to compensate for it.
-    if config.rxChannelComp is not None:
-        compensation.rxChanPhaseBiasCompensation(config.rxChannelComp,
-                                                 azimuth_in,
-                                                 config.numVirtualAntennas)
-
-    # The near field correction is currently in exclusion with velocity 
-    # disambiguation because of implementation complexities and also because it 
-    # is unlikely to have objects at high velocities in the near field.
-
-    # Save a copy for flipped version of azimuth_in for velocity disambiguation.
-    azimuth_in_copy = np.zeros_like(azimuth_in)
-    if config.extendedMaxVelocityEnabled and config.nearFieldCorrectionCfg.enabled:
-        assert False, "Extended maximum velocity and near field correction are not supported simultaneously."
-
-    if config.extendedMaxVelocityEnabled:
-        azimuth_in_copy[:, :config.numVirtualAntAzim] = azimuth_in[:, :config.numVirtualAntAzim]
-
-    # Save a copy of RX antennas corresponding to Tx2 antenna.
-    if config.nearFieldCorrectionCfg.enabled:
-        idx_temp = ((det_obj_2d[:, RANGEIDX] >= config.nearFieldCorrectionCfg.startRangeIdx) &
-                    (det_obj_2d[:, RANGEIDX] <= config.nearFieldCorrectionCfg.endRangeIdx))
-        azimuth_in_copy[idx_temp, :config.numRxAntennas] = \
-            azimuth_in_copy[idx_temp, config.numRxAntennas:config.numRxAntennas * 2]
-        azimuth_in[idx_temp, config.numRxAntennas:config.numRxAntennas * 2] = 0
-
-    # 4. 3rd FFT.
-    azimuth_out = np.fft.fft(azimuth_in)
-
-    # 5.1. Optional near field correction.
-    if config.nearFieldCorrectionCfg.enabled:
-        azimuth_out_copy = np.fft.fft(azimuth_in_copy)
-        compensation.nearFieldCorrection(det_obj_2d,
-                                         config.nearFieldCorrectionCfg.startRangeIdx,
-                                         config.nearFieldCorrectionCfg.endRangeIdx,
-                                         azimuth_in, azimuth_in_copy,
-                                         azimuth_out, azimuth_out_copy)
-
-    # 5.2. Optional velocity disambiguation.
-    if config.extendedMaxVelocityEnabled:
-        azimuth_in = azimuth_in_copy
-        azimuth_in[:, config.numRxAntennas:config.numVirtualAntAzim] *= -1
-
-    # 6. Magnitude squared.
+        # (numChirpsPerFrame, numRxAntennas, numDetObj) -> (num_doppler_bins, numVirtualAntennas, numDetObj)
+        fft2d_in = separate_tx(np.take(radar_cube, range_idx, axis=2), num_tx_antennas, vx_axis=1, axis=0)
+        num_doppler_bins = fft2d_in.shape[0]
+        if clutter_removal_enabled:
+            fft2d_in = fft2d_in - fft2d_in.mean(axis=0, keepdims=True)
+        if window_type_2d:
+            fft2d_in = fft2d_in * get_window(window_type_2d, num_doppler_bins, axis=0, ndim=3)
+
+        # Single-point DFT at the doppler bin of every detection
+        dft = np.exp(-2j * np.pi * np.outer(np.arange(num_doppler_bins), doppler_idx % num_doppler_bins) / num_doppler_bins)
+        azimuth_in = np.einsum('nvd,nd->dv', fft2d_in, dft)
+
+    # 2. Doppler compensation.
+    azimuth_in = compensation.add_doppler_compensation(azimuth_in.astype(np.complex128), num_tx_antennas,
+                                                       doppler_indices=doppler_idx, num_doppler_bins=num_doppler_bins)
+
+    # 3. Rx channel phase bias compensation.
+    if rx_channel_comp is not None:
+        azimuth_in *= rx_channel_comp
+
+    # 4. 3rd FFT (zero padded to num_angle_bins).
+    if num_virtual_ant_azim is None:
+        num_virtual_ant_azim = azimuth_in.shape[1] // num_tx_antennas * min(num_tx_antennas, 2)
+    azimuth_out = np.fft.fft(azimuth_in[:, :num_virtual_ant_azim], n=num_angle_bins, axis=1)
+
+    # 5. Magnitude squared.
     azimuth_mag_sqr = np.abs(azimuth_out) ** 2
 
-    # 7. Azimuth, X/Y calculation and populate detObj2D. Convert doppler index to 
-    det_obj2d_azimuth = compensation.XYestimation(azimuth_mag_sqr, config.numAngleBins, det_obj_2d)
-    det_obj2d_azimuth[:, DOPPLERIDX] = DOPPLER_IDX_TO_SIGNED(det_obj2d_azimuth[:, DOPPLERIDX], config.numDopplerBins)
+    # 6. Azimuth, X/Y calculation and populate detObj2D.
+    max_idx = np.argmax(azimuth_mag_sqr, axis=1)
+    max_idx[max_idx > (num_angle_bins // 2 - 1)] -= num_angle_bins
+    wx = 2 * max_idx / num_angle_bins
+    range_in_meter = range_idx * range_resolution
+    x = range_in_meter * wx
+    y = np.sqrt(np.maximum(range_in_meter ** 2 - x ** 2, 0))
+
+    det_obj2d_azimuth = np.zeros((det_obj_2d.shape[0], 5))
+    det_obj2d_azimuth[:, :3] = det_obj_2d[:, :3]
+    doppler_idx = doppler_idx % num_doppler_bins
+    det_obj2d_azimuth[:, DOPPLERIDX] = np.where(doppler_idx < num_doppler_bins // 2, doppler_idx,
+                                                doppler_idx - num_doppler_bins)
+    det_obj2d_azimuth[:, 3] = x
+    det_obj2d_azimuth[:, 4] = y
 
     return det_obj2d_azimuth
 
@@ -251,6 +235,91 @@ def aoa_capon(x, steering_vector, magnitude=False):
         return den, weights
 
 
+def aoa_bartlett_batch(steering_vec, sig_in):
+    """Perform AOA estimation using Bartlett Beamforming on a batch of detections at once.
+
+    The power spectrum of every detection is the Bartlett power averaged over its snapshots:
+
+    .. math::
+        P_{ba} (\\theta) = a^{H}(\\theta) R_{xx} a(\\theta)
+
+    Args:
+        steering_vec (ndarray): A 2D-array of size (numTheta, num_ant) generated from gen_steering_vec
+        sig_in (ndarray): (num_detections, num_ant) snapshots or (num_detections, num_ant, num_chirps) snapshot tensors
+
+    Returns:
+        doa_spectrum (ndarray): A 2D-array of size (num_detections, numTheta)
+
+    Example:
+        >>> _, steering_vec = gen_steering_vec(90, 1, 8)
+        >>> doa_spectrum = aoa_bartlett_batch(steering_vec, azimuth_input[:, :8])
+    """
+    sig_in = _batch_snapshots(sig_in, steering_vec)
+    y = np.einsum('pv,dvt->dpt', steering_vec.conj(), sig_in)
+    doa_spectrum = np.mean(np.abs(y) ** 2, axis=2)
+    return doa_spectrum
+
+
+def aoa_capon_batch(x, steering_vector, magnitude=False, diag_load=1e-3):
+    """Perform AOA estimation using Capon (MVDR) Beamforming on a batch of detections at once
+
+    The covariance matrices of all detections are stacked, forward backward averaged and diagonally loaded, and
+    R_{xx}^{-1} a(\\theta) is solved for all detections and thetas with a single batched np.linalg.solve.
+
+    .. math::
+        P_{ca} (\\theta) = \\frac{1}{a^{H}(\\theta) R_{xx}^{-1} a(\\theta)}
+
+        w_{ca} (\\theta) = \\frac{R_{xx}^{-1} a(\\theta)}{a^{H}(\\theta) R_{xx}^{-1} a(\\theta)}
+
+    Args:
+        x (ndarray): (num_detections, num_ant) snapshots or (num_detections, num_ant, num_chirps) snapshot tensors
+        steering_vector (ndarray): A 2D-array of size (numTheta, num_ant) generated from gen_steering_vec
+        magnitude (bool): Azimuth theta bins should return complex data (False) or magnitude data (True). Default=False
+        diag_load (float): Diagonal loading relative to the average antenna power, keeps the covariance of few
+            snapshots (e.g. a single one) invertible
+
+    Raises:
+        ValueError: steering_vector and or x are not the correct shape
+
+    Returns:
+        den (ndarray): A 2D-Array of size (num_detections, numTheta) containing the Capon spectra
+        weights (ndarray): A 3D-Array of size (num_detections, num_ant, numTheta) containing the Capon weights
+
+    Example:
+        >>> _, steering_vec = gen_steering_vec(90, 1, 8)
+        >>> doa_spectrum, _ = aoa_capon_batch(azimuth_input[:, :8], steering_vec, magnitude=True)
+    """
+    x = _batch_snapshots(x, steering_vector)
+    num_ant = x.shape[1]
+
+    # Stacked covariance matrices (num_detections, num_ant, num_ant)
+    Rxx = np.einsum('dvt,dwt->dvw', x, x.conj()) / x.shape[2]
+    Rxx = forward_backward_avg(Rxx)
+    load = diag_load * np.trace(Rxx, axis1=1, axis2=2).real / num_ant
+    Rxx[:, np.arange(num_ant), np.arange(num_ant)] += load[:, None]
+
+    # R^-1 a(theta) for all detections and thetas
+    first = np.linalg.solve(Rxx, np.broadcast_to(steering_vector.T, (x.shape[0],) + steering_vector.T.shape))
+    den = np.reciprocal(np.einsum('pv,dvp->dp', steering_vector.conj(), first))
+    weights = first * den[:, None, :]
+
+    if magnitude:
+        return np.abs(den), weights
+    else:
+        return den, weights
+
+
+def _batch_snapshots(x, steering_vec):
+    """Helper function to check the batched snapshots and give them a (num_detections, num_ant, num_chirps) shape."""
+    x = np.asarray(x)
+    if x.ndim == 2:
+        x = x[:, :, None]
+    if x.ndim != 3 or x.shape[1] != steering_vec.shape[1]:
+        raise ValueError("'steering_vector' with shape (%d,%d) cannot matrix multiply snapshots with shape %s"
+                         % (steering_vec.shape[0], steering_vec.shape[1], x.shape))
+    return x
+
+
 # ------------------------------- HELPER FUNCTIONS -------------------------------
 
 def cov_matrix(x):
@@ -282,25 +351,18 @@ def forward_backward_avg(Rxx):
     """ Performs forward backward averaging on the given input square matrix
 
     Args:
-        Rxx (ndarray): A 2D-Array square matrix containing the covariance matrix for the given input data
+        Rxx (ndarray): A 2D-Array square matrix containing the covariance matrix for the given input data, or a stack
+            (..., M, M) of covariance matrices
 
     Returns:
         R_fb (ndarray): The 2D-Array square matrix containing the forward backward averaged covariance matrix
     """
-    assert np.size(Rxx, 0) == np.size(Rxx, 1)
+    assert np.size(Rxx, -2) == np.size(Rxx, -1)
 
-    # --> Calculation
-    M = np.size(Rxx, 0)  # Find number of antenna elements
-    Rxx = np.matrix(Rxx)  # Cast np.ndarray as a np.matrix
+    # J * conj(Rxx) * J with the exchange matrix J flips both axes
+    R_fb = 0.5 * (Rxx + np.conjugate(Rxx[..., ::-1, ::-1]))
 
-    # Create exchange matrix
-    J = np.eye(M)  # Generates an identity matrix with row/col size M
-    J = np.fliplr(J)  # Flips the identity matrix left right
-    J = np.matrix(J)  # Cast np.ndarray as a np.matrix
-
-    R_fb = 0.5 * (Rxx + J * np.conjugate(Rxx) * J)
-
-    return np.array(R_fb)
+    return R_fb
 
 
 def peak_search(doa_spectrum, peak_threshold_weight=0.251188643150958):
@@ -326,8 +388,7 @@ def peak_search(doa_spectrum, peak_threshold_weight=0.251188643150958):
 
 
 def peak_search_full(doa_spectrum, gamma=1.2, peak_threshold_weight=0.251188643150958):
-    """ Perform TI prescribed peak search algorithm
-    Tested Runtime: 147 µs ± 4.27 µs per loop (mean ± std. dev. of 7 runs, 10000 loops each)
+    """ Perform TI prescribed peak search algorithm (see peak_search_batch)
 
     Args:
         doa_spectrum (ndarray): A 1D-Array of size (numTheta, 1) containing the theta spectrum at a given range bin
@@ -339,63 +400,17 @@ def peak_search_full(doa_spectrum, gamma=1.2, peak_threshold_weight=0.2511886431
         ang_est (list): List of indexes where the peaks are located
 
     """
-
-    ang_est = np.zeros(4, dtype='int')
-    # Prevent thinking a sidelobe is a peak
-    peak_threshold = max(doa_spectrum) * peak_threshold_weight
-    # Perform Multiple Peak Search
-    steering_vec_size = len(doa_spectrum)
-    running_idx = 0
-    num_max = 0
-    extend_loc = 0
-    init_stage = True
-    max_val = 0
-    min_val = np.inf
-    max_loc = 0
-    locate_max = False
-
-    while running_idx < (steering_vec_size + extend_loc):
-        if running_idx >= steering_vec_size:
-            local_index = running_idx - steering_vec_size
-        else:
-            local_index = running_idx
-
-        current_val = doa_spectrum[local_index]
-
-        # Record local maximum value and its location
-        if current_val > max_val:
-            max_val = current_val
-            max_loc = local_index
-
-        # Record local minimum value and its location
-        if current_val < min_val:
-            min_val = current_val
-
-        if locate_max:
-            # Perform peak search
-            if current_val < max_val / gamma:
-                # Curve has begun dipping. Prev max val is a Local max. Check if it is a sidelobe
-                if max_val >= peak_threshold:
-                    # Curve has dipped and it is not a sidelobe. Target found.
-                    ang_est[num_max] = max_loc
-                    num_max += 1
-                min_val = current_val
-                locate_max = False
-        else:
-            if current_val > min_val * gamma:
-                locate_max = True
-                max_val = current_val
-                if init_stage:
-                    extend_loc = running_idx
-                    init_stage = False
-        running_idx += 1
+    peaks = peak_search_batch(np.reshape(doa_spectrum, (1, -1)), gamma=gamma, sidelobe_level=peak_threshold_weight)
+    num_max = peaks.shape[0]
+    ang_est = np.zeros(max(4, num_max), dtype='int')
+    ang_est[:num_max] = peaks['peakLoc']
 
     return num_max, ang_est
 
 
 def peak_search_full_variance(doa_spectrum, steering_vec_size, sidelobe_level=0.251188643150958, gamma=1.2):
     """ Performs peak search (TI's full search) will retaining details about each peak including
-    each peak's width, location, and value.
+    each peak's width, location, and value (see peak_search_batch).
 
     Args:
         doa_spectrum (ndarray): a 1D numpy array containing the power spectrum generated via some aoa method (naive,
@@ -409,64 +424,106 @@ def peak_search_full_variance(doa_spectrum, steering_vec_size, sidelobe_level=0.
         Each detected peak is organized as [peak_location, peak_value, peak_width]
         total_power (float): The total power of the spectrum. Used for variance calculations
     """
-    peak_threshold = max(doa_spectrum) * sidelobe_level
+    # Only the first steering_vec_size bins are searched, but the sidelobe threshold is relative to the whole spectrum
+    peak_threshold = np.max(doa_spectrum) * sidelobe_level
+    peaks = peak_search_batch(np.reshape(doa_spectrum[:steering_vec_size], (1, -1)), gamma=gamma,
+                              peak_threshold=[peak_threshold], strict_threshold=True)
+    total_power = peaks['peakVal'].sum()
 
-    # Multiple Peak Search
-    running_index = 0
-    num_max = 0
-    extend_loc = 0
-    init_stage = True
-    max_val = 0
-    total_power = 0
-    max_loc = 0
-    max_loc_r = 0
-    min_val = np.inf
-    locate_max = False
+    return peaks[['peakLoc', 'peakVal', 'peakWid']], total_power
 
-    peak_data = []
 
-    while running_index < (steering_vec_size + extend_loc):
-        if running_index >= steering_vec_size:
-            local_index = running_index - steering_vec_size
-        else:
-            local_index = running_index
+def peak_search_batch(doa_spectrum, gamma=1.2, sidelobe_level=0.251188643150958, est_resolution=1,
+                      width_adjust_3d_b=2.5, input_snr=10000, peak_threshold=None, strict_threshold=False):
+    """ Performs TI's full multi-peak search on the spectra of all detections at once
 
-        # Pull local_index values
-        current_val = doa_spectrum[local_index]
-        # Record Min & Max locations
-        if current_val > max_val:
-            max_val = current_val
-            max_loc = local_index
-            max_loc_r = running_index
+    The search walks along the theta bins of every spectrum with gamma hysteresis: the curve must rise above gamma
+    times the last minimum to start looking for a maximum, and a maximum is declared once the curve dips below
+    1 / gamma of it. Maxima below sidelobe_level times the spectrum maximum are sidelobes and dropped (maxima equal to
+    the threshold are kept as in peak_search_full, or dropped as in peak_search_full_variance with strict_threshold).
+    The walk wraps around the end of the spectrum up to the bin where the first maximum search started. The state of
+    all spectra is updated together, so the number of steps depends on the number of theta bins only. The variance of
+    every peak is estimated as in variance_estimation.
 
-        if current_val < min_val:
-            min_val = current_val
+    Args:
+        doa_spectrum (ndarray): (num_detections, numTheta) power spectra, or a single (numTheta,) spectrum
+        gamma (float): Weight to determine when a peak will pass as a true peak
+        sidelobe_level (float): A low value threshold used to avoid sidelobe detections as peaks
+        est_resolution (float): The theta resolution of the spectra
+        width_adjust_3d_b (float): Constant to adjust the gamma bandwidth to 3dB level
+        input_snr (int): the linear snr for the input signal samples
+        peak_threshold (ndarray): (Optional) (num_detections,) sidelobe thresholds, replacing sidelobe_level times the
+            maximum of each spectrum
+        strict_threshold (bool): Declare only the maxima above the sidelobe threshold, not the ones equal to it
 
-        if locate_max:
-            if current_val < max_val / gamma:
-                if max_val > peak_threshold:
-                    bandwidth = running_index - max_loc_r
-                    obj = dict.fromkeys(['peakLoc', 'peakVal', 'peakWid'])
-                    obj['peakLoc'] = max_loc
-                    obj['peakVal'] = max_val
-                    obj['peakWid'] = bandwidth
-                    peak_data.append(obj)
-                    total_power += max_val
-                    num_max += 1
-                min_val = current_val
-                locate_max = False
-        else:
-            if current_val > min_val * gamma:
-                locate_max = True
-                max_val = current_val
-                if init_stage:
-                    extend_loc = running_index
-                    init_stage = False
+    Returns:
+        peaks (ndarray): (num_peaks,) structured array with fields detIdx, peakLoc, peakVal, peakWid and peakVar,
+        ordered by detection and then by the order the peaks were found in.
 
-        running_index += 1
+    Example:
+        >>> peaks = peak_search_batch(doa_spectrum, sidelobe_level=0.9)
+        >>> detection_of_peak, theta_bin = peaks['detIdx'], peaks['peakLoc']
+    """
+    doa_spectrum = np.atleast_2d(doa_spectrum)
+    num_det, num_theta = doa_spectrum.shape
+    if peak_threshold is None:
+        peak_threshold = np.max(doa_spectrum, axis=1) * sidelobe_level
+    peak_threshold = np.asarray(peak_threshold)
+
+    # Search state of every spectrum
+    max_val = np.zeros(num_det)
+    min_val = np.full(num_det, np.inf)
+    max_loc = np.zeros(num_det, dtype=int)
+    max_loc_r = np.zeros(num_det, dtype=int)
+    locate_max = np.zeros(num_det, dtype=bool)
+    init_stage = np.ones(num_det, dtype=bool)
+    extend_loc = np.zeros(num_det, dtype=int)
+
+    found = []
+    for running_index in range(2 * num_theta):
+        active = running_index < num_theta + extend_loc
+        if not active.any():
+            break
+        local_index = running_index % num_theta
+        current_val = doa_spectrum[:, local_index]
 
-    peak_data = np.array(peak_data)
-    return peak_data, total_power
+        # Record Min & Max locations
+        new_max = active & (current_val > max_val)
+        max_val[new_max] = current_val[new_max]
+        max_loc[new_max] = local_index
+        max_loc_r[new_max] = running_index
+        new_min = active & (current_val < min_val)
+        min_val[new_min] = current_val[new_min]
+
+        # Curve has dipped after a maximum: declare it if it is not a sidelobe
+        dipped = active & locate_max & (current_val < max_val / gamma)
+        above = (max_val > peak_threshold) if strict_threshold else (max_val >= peak_threshold)
+        peak = np.flatnonzero(dipped & above)
+        if peak.size:
+            found.append((peak, max_loc[peak], max_val[peak], running_index - max_loc_r[peak]))
+
+        # Curve has risen after a minimum: start looking for a maximum
+        risen = active & ~locate_max & (current_val > min_val * gamma)
+        max_val[risen] = current_val[risen]
+        extend_loc[risen & init_stage] = running_index
+        init_stage[risen] = False
+
+        min_val[dipped] = current_val[dipped]
+        locate_max = (locate_max & ~dipped) | risen
+
+    peaks = np.zeros(sum(f[0].size for f in found), dtype=[('detIdx', int), ('peakLoc', int), ('peakVal', float),
+                                                           ('peakWid', int), ('peakVar', float)])
+    for i, name in enumerate(['detIdx', 'peakLoc', 'peakVal', 'peakWid']):
+        peaks[name] = np.concatenate([f[i] for f in found]) if found else []
+    peaks = peaks[np.argsort(peaks['detIdx'], kind='stable')]
+
+    # Variance Estimation (see variance_estimation) with the total power of the peaks of each detection
+    total_power = np.bincount(peaks['detIdx'], weights=peaks['peakVal'], minlength=num_det)
+    peak_width = 2 * est_resolution * peaks['peakWid'] * width_adjust_3d_b
+    snr = 2 * input_snr * peaks['peakVal'] / total_power[peaks['detIdx']]
+    peaks['peakVar'] = peak_width * np.sqrt(np.reciprocal(snr))
+
+    return peaks
 
 
 def variance_estimation(num_max, est_resolution, peak_data, total_power, width_adjust_3d_b=2.5, input_snr=10000):
@@ -495,17 +552,28 @@ def variance_estimation(num_max, est_resolution, peak_data, total_power, width_a
     return est_var
 
 
-def gen_steering_vec(ang_est_range, ang_est_resolution, num_ant):
+def gen_steering_vec(ang_est_range, ang_est_resolution, num_ant, ant_positions=None, dtype=np.complex64,
+                     elevation=0, cache_dir=None):
     """Generate a steering vector for AOA estimation given the theta range, theta resolution, and number of antennas
 
     Defines a method for generating steering vector data input --Python optimized Matrix format
     The generated steering vector will span from -angEstRange to angEstRange with increments of ang_est_resolution
     The generated steering vector should be used for all further AOA estimations (bartlett/capon)
 
+    Steering matrices are built vectorized once per (angle range, resolution, num_ant, array geometry, dtype, elevation)
+    and cached afterwards; every call returns its own copy. With cache_dir they are also stored on disk and loaded from
+    there by later processes.
+
     Args:
         ang_est_range (int): The desired span of thetas for the angle spectrum.
         ang_est_resolution (float): The desired resolution in terms of theta
         num_ant (int): The number of Vrx antenna signals captured in the RDC
+        ant_positions (array-like): (Optional) Virtual antenna positions in half wavelengths, either (num_ant,) positions
+            along the azimuth axis or (num_ant, 2) (azimuth, elevation) positions, e.g. AWR1843_VIRTUAL_ARRAY. Defaults
+            to a uniform linear array.
+        dtype (np.dtype): Complex dtype of the steering vectors.
+        elevation (float): Elevation in degrees at which the azimuth is scanned (2D arrays only).
+        cache_dir (str): (Optional) Directory the steering matrices are persisted to.
 
     Returns:
         num_vec (int): Number of vectors generated (integer divide angEstRange/ang_est_resolution)
@@ -515,20 +583,59 @@ def gen_steering_vec(ang_est_range, ang_est_resolution, num_ant):
         >>> #This will generate a numpy array containing the steering vector with 
         >>> #angular span from -90 to 90 in increments of 1 degree for a 4 Vrx platform
         >>> _, steering_vec = gen_steering_vec(90,1,4)
+        >>> #Steering vector of the 12 virtual antennas of the xWR1843
+        >>> _, steering_vec = gen_steering_vec(90, 1, 12, ant_positions=AWR1843_VIRTUAL_ARRAY)
 
     """
-    num_vec = (2 * ang_est_range / ang_est_resolution + 1)
-    num_vec = int(round(num_vec))
-    steering_vectors = np.zeros((num_vec, num_ant), dtype='complex64')
-    for kk in range(num_vec):
-        for jj in range(num_ant):
-            mag = -1 * np.pi * jj * np.sin((-ang_est_range + kk * ang_est_resolution) * np.pi / 180)
-            real = np.cos(mag)
-            imag = np.sin(mag)
-
-            steering_vectors[kk, jj] = np.complex(real, imag)
-
-    return [num_vec, steering_vectors]
+    if ant_positions is None:
+        ant_positions = np.arange(num_ant)
+    ant_positions = np.asarray(ant_positions, dtype=np.float64)
+    if ant_positions.ndim == 1:
+        ant_positions = np.stack((ant_positions, np.zeros_like(ant_positions)), axis=1)
+    if ant_positions.shape != (num_ant, 2):
+        raise ValueError("ant_positions with shape {} does not match {} antennas".format(ant_positions.shape, num_ant))
+
+    geometry = tuple(map(tuple, ant_positions.tolist()))
+    steering_vectors = _steering_matrix(float(ang_est_range), float(ang_est_resolution), geometry,
+                                        np.dtype(dtype).str, float(elevation), cache_dir)
+
+    return [steering_vectors.shape[0], steering_vectors.copy()]
+
+
+@functools.lru_cache(maxsize=64)
+def _steering_matrix(ang_est_range, ang_est_resolution, geometry, dtype, elevation, cache_dir):
+    """Helper function to build (or load) the read-only steering matrix of gen_steering_vec once per configuration."""
+    cache_file = None
+    if cache_dir is not None:
+        key = repr((ang_est_range, ang_est_resolution, geometry, dtype, elevation)).encode()
+        cache_file = os.path.join(cache_dir, 'steering_vec_{}.npy'.format(hashlib.sha1(key).hexdigest()))
+        if os.path.exists(cache_file):
+            steering_vectors = np.load(cache_file)
+            steering_vectors.flags.writeable = False
+            return steering_vectors
+
+    num_vec = int(round(2 * ang_est_range / ang_est_resolution + 1))
+    theta = (-ang_est_range + np.arange(num_vec) * ang_est_resolution) * np.pi / 180
+    phi = elevation * np.pi / 180
+    positions = np.array(geometry)
+
+    # Phase of every (theta, antenna) pair: -pi * (x * sin(theta) * cos(phi) + z * sin(phi))
+    mag = -1 * np.pi * (np.outer(np.sin(theta) * np.cos(phi), positions[:, 0]) + np.sin(phi) * positions[:, 1])
+    steering_vectors = np.exp(1j * mag).astype(dtype)
+
+    if cache_file is not None:
+        # Write to a temporary file first so concurrent processes never load a partially written matrix
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(suffix='.npy', dir=cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, steering_vectors)
+            os.replace(tmp_file, cache_file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+    steering_vectors.flags.writeable = False
+    return steering_vectors
 
 
 # ------------------------------- TI BEAMFORMING FUNCTIONS -------------------------------
@@ -921,76 +1028,47 @@ def beamforming_naive_mixed_xyz(azimuth_input, input_ranges, range_resolution, m
             should be in meters
 
     """
-    if method not in ('Capon', 'Bartlett'):
-        raise ValueError("Method argument must be 'Capon' or 'Bartlett'")
-
     if azimuth_input.shape[1] != num_vrx:
         raise ValueError("azimuthInput is the wrong shape. Change num_vrx if not using TI 1843 platform")
 
     doa_var_thr = 10
-    num_vec, steering_vec = gen_steering_vec(est_range, est_resolution, 8)
-
-    output_e_angles = []
-    output_a_angles = []
-    output_ranges = []
-
-    for i, inputSignal in enumerate(azimuth_input):
-        if method == 'Capon':
-            doa_spectrum, _ = aoa_capon(np.reshape(inputSignal[:8], (8, 1)).T, steering_vec)
-            doa_spectrum = np.abs(doa_spectrum)
-        elif method == 'Bartlett':
-            doa_spectrum = aoa_bartlett(steering_vec, np.reshape(inputSignal[:8], (8, 1)), axis=0)
-            doa_spectrum = np.abs(doa_spectrum).squeeze()
-        else:
-            doa_spectrum = None
-
-        # Find Max Values and Max Indices
-
-        #    num_out, max_theta, total_power = peak_search(doa_spectrum)
-        obj_dict, total_power = peak_search_full_variance(doa_spectrum, steering_vec.shape[0], sidelobe_level=0.9)
-        num_out = len(obj_dict)
-        max_theta = [obj['peakLoc'] for obj in obj_dict]
-
-        estimated_variance = variance_estimation(num_out, est_resolution, obj_dict, total_power)
-
-        higher_rung = inputSignal[8:12]
-        lower_rung = inputSignal[2:6]
-        for j in range(num_out):
-            ele_out = aoa_estimation_bf_one_point(4, higher_rung, steering_vec[max_theta[j]])
-            azi_out = aoa_estimation_bf_one_point(4, lower_rung, steering_vec[max_theta[j]])
-            num = azi_out * np.conj(ele_out)
-            wz = np.arctan2(num.imag, num.real) / np.pi
-
-            temp_angle = -est_range + max_theta[
-                j] * est_resolution  # Converts to degrees, centered at boresight (0 degrees)
-            # Make sure the temp angle generated is within bounds
-            if np.abs(temp_angle) <= est_range and estimated_variance[j] < doa_var_thr:
-                e_angle = np.arcsin(wz)
-                a_angle = -1 * (np.pi / 180) * temp_angle  # Degrees to radians
-                output_e_angles.append((180 / np.pi) * e_angle)  # Convert radians to degrees
-
-                # print(e_angle)
-                # if (np.sin(a_angle)/np.cos(e_angle)) > 1 or (np.sin(a_angle)/np.cos(e_angle)) < -1:
-                # print("Found you", (np.sin(a_angle)/np.cos(e_angle)))
-                # assert np.cos(e_angle) == np.nan, "Found you"
-
-                # TODO: Not sure how to deal with arg of arcsin >1 or <-1
-#                if np.sin(a_angle)/np.cos(e_angle) > 1:
-#                    output_a_angles.append((180 / np.pi) * np.arcsin(1))
-#                    print("Found a pesky nan")
-#                elif np.sin(a_angle)/np.cos(e_angle) < -1:
-#                    output_a_angles.append((180 / np.pi) * np.arcsin(-1))
-#                    print("Found a pesky nan")
-#                else:
-#                    output_a_angles.append((180 / np.pi) * np.arcsin(np.sin(a_angle)/np.cos(e_angle))) # Why
-
-                output_a_angles.append((180 / np.pi) * np.arcsin(np.sin(a_angle) * np.cos(e_angle)))  # Why
-
-                output_ranges.append(input_ranges[i])
-
-    phi = np.array(output_e_angles)
-    theta = np.array(output_a_angles)
-    ranges = np.array(output_ranges)
+    _, steering_vec = gen_steering_vec(est_range, est_resolution, 8)
+    azimuth_input = np.asarray(azimuth_input)
+
+    # Spatial spectra of all detections at once
+    if method == 'Capon':
+        doa_spectrum, _ = aoa_capon_batch(azimuth_input[:, :8], steering_vec, magnitude=True)
+    elif method == 'Bartlett':
+        doa_spectrum = aoa_bartlett_batch(steering_vec, azimuth_input[:, :8])
+    else:
+        raise ValueError("Method argument must be 'Capon' or 'Bartlett'")
+
+    # Find Max Values and Max Indices of every detection, flattened to (detection, peak) pairs
+    peaks = peak_search_batch(doa_spectrum, sidelobe_level=0.9, est_resolution=est_resolution, strict_threshold=True)
+    det_idx = peaks['detIdx']
+    max_theta = peaks['peakLoc']
+    estimated_variance = peaks['peakVar']
+
+    # Make sure the angle is within bounds and the variance low enough
+    temp_angle = -est_range + max_theta * est_resolution  # Converts to degrees, centered at boresight (0 degrees)
+    valid = (np.abs(temp_angle) <= est_range) & (estimated_variance < doa_var_thr)
+    det_idx, max_theta, temp_angle = det_idx[valid], max_theta[valid], temp_angle[valid]
+
+    # Naive elevation from the phase difference of the upper and lower rungs at the azimuth of every peak
+    higher_rung = azimuth_input[det_idx, 8:12]
+    lower_rung = azimuth_input[det_idx, 2:6]
+    ele_out = np.einsum('kv,kv->k', steering_vec[max_theta, :4], higher_rung)
+    azi_out = np.einsum('kv,kv->k', steering_vec[max_theta, :4], lower_rung)
+    num = azi_out * np.conj(ele_out)
+    wz = np.arctan2(num.imag, num.real) / np.pi
+
+    e_angle = np.arcsin(wz)
+    a_angle = -1 * (np.pi / 180) * temp_angle  # Degrees to radians
+
+    # TODO: Not sure how to deal with arg of arcsin >1 or <-1
+    phi = (180 / np.pi) * e_angle  # Convert radians to degrees
+    theta = (180 / np.pi) * np.arcsin(np.sin(a_angle) * np.cos(e_angle))
+    ranges = np.asarray(input_ranges)[det_idx]
 
     # points could be calculated by trigonometry,
     x = np.sin(np.pi / 180 * theta) * ranges * range_resolution     # x = np.sin(azi) * range
@@ -11,7 +11,9 @@
 # ==============================================================================
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy.ndimage import convolve1d
+from .utils import RANGEIDX, DOPPLERIDX, PEAKVAL
 
 """ Various cfar algorithm types
 
@@ -327,15 +329,20 @@ def os(x, *argv, **kwargs):
     return ret
 
 
-def os_(x, guard_len=0, noise_len=8, k=12, scale=1.0):
+def os_(x, guard_len=0, noise_len=8, k=12, scale=1.0, axis=-1):
     """Performs Ordered-Statistic CFAR (OS-CFAR) detection on the input array.
 
+    The training cells of all CUTs are gathered at once from sliding windows over the wrapped signal and their k-th
+    order statistic is selected with a single batched partition, so a whole range-doppler map is processed along one
+    axis in one call.
+
     Args:
         x (~numpy.ndarray): Noisy array to perform cfar on with log values
         guard_len (int): Number of samples adjacent to the CUT that are ignored.
         noise_len (int): Number of samples adjacent to the guard padding that are factored into the calculation.
         k (int): Ordered statistic rank to sample from.
         scale (float): Scaling factor.
+        axis (int): Axis of x along which the cfar is performed.
 
     Returns:
         Tuple [ndarray, ndarray]
@@ -353,30 +360,86 @@ def os_(x, guard_len=0, noise_len=8, k=12, scale=1.0):
     """
     if isinstance(x, list):
         x = np.array(x, dtype=np.uint32)
+    x = np.moveaxis(x, axis, -1)
+
+    # Training cells of every CUT: both ends of the sliding window over the wrapped signal
+    edge_cells = guard_len + noise_len
+    pad_width = [(0, 0)] * (x.ndim - 1) + [(edge_cells, edge_cells)]
+    windows = sliding_window_view(np.pad(x, pad_width, mode='wrap'), 2 * edge_cells + 1, axis=-1)
+    train_idx = np.r_[:noise_len, 2 * edge_cells + 1 - noise_len:2 * edge_cells + 1]
+
+    noise_floor = np.partition(windows[..., train_idx], k, axis=-1)[..., k].astype(np.float64)
+    threshold = (noise_floor * scale).astype(np.float32)
+
+    return np.moveaxis(threshold, -1, axis), np.moveaxis(noise_floor, -1, axis)
+
+
+def os_2d(x, *argv, **kwargs):
+    """Detects peaks in range-doppler maps using 2D Ordered-Statistic CFAR (OS-CFAR).
+
+    Args:
+        x (~numpy.ndarray): (num_range_bins, num_doppler_bins) map or (num_frames, num_range_bins, num_doppler_bins)
+            stack of maps.
+        *argv: See mmwave.dsp.cfar.os_2d\_
+        **kwargs: See mmwave.dsp.cfar.os_2d\_
+
+    Returns:
+        ~numpy.ndarray: Boolean array of detected peaks in x.
+
+    """
+    x = np.asarray(x)
+    threshold, _ = os_2d_(x, *argv, **kwargs)
+    ret = (x > threshold)
+    return ret
 
-    n = len(x)
-    noise_floor = np.zeros(n)
-    threshold = np.zeros(n, dtype=np.float32)
-    cut_idx = -1
 
-    # Initial CUT
-    left_idx = list(np.arange(n - noise_len - guard_len - 1, n - guard_len - 1))
-    right_idx = list(np.arange(guard_len, guard_len + noise_len))
+def os_2d_(x, guard_len=(2, 2), noise_len=(4, 4), k=None, scale=1.0, mode='wrap'):
+    """Performs 2D Ordered-Statistic CFAR (OS-CFAR) on range-doppler maps.
 
-    # All other CUTs
-    while cut_idx < (n - 1):
-        cut_idx += 1
+    The training cells of a CUT are the (2 * (guard_len + noise_len) + 1) rectangle around it minus the
+    (2 * guard_len + 1) guard rectangle (see ca_2d\_). They are gathered for all cells of a map from sliding windows and
+    their k-th order statistic is selected with a single batched partition per map.
 
-        left_idx.pop(0)
-        left_idx.append((cut_idx - 1) % n)
+    Args:
+        x (~numpy.ndarray): (num_range_bins, num_doppler_bins) map or (num_frames, num_range_bins, num_doppler_bins)
+            stack of maps.
+        guard_len (int or tuple): Number of cells adjacent to the CUT that are ignored, per (range, doppler) axis.
+        noise_len (int or tuple): Number of cells adjacent to the guard cells that are factored into the calculation,
+            per (range, doppler) axis.
+        k (int): Ordered statistic rank to sample from. Defaults to 3/4 of the number of training cells.
+        scale (float): Scaling factor.
+        mode (str or tuple): How to deal with edge cells, 'wrap' or 'constant' (zero), per (range, doppler) axis.
 
-        right_idx.pop(0)
-        right_idx.append((cut_idx + guard_len + noise_len) % n)
+    Returns:
+        Tuple [ndarray, ndarray]
+            1. (ndarray): Upper bound of noise threshold.
+            #. (ndarray): Raw noise strength.
 
-        window = np.concatenate((x[left_idx], x[right_idx]))
-        window.partition(k)
-        noise_floor[cut_idx] = window[k]
-        threshold[cut_idx] = noise_floor[cut_idx] * scale
+    """
+    x = np.asarray(x)
+    guard_len, noise_len, mode = _cfar_2d_params(guard_len, noise_len, mode)
+
+    # Positions of the training cells in the window
+    edge_cells = [g + n for g, n in zip(guard_len, noise_len)]
+    train = np.ones([2 * e + 1 for e in edge_cells], dtype=bool)
+    train[noise_len[0]:noise_len[0] + 2 * guard_len[0] + 1, noise_len[1]:noise_len[1] + 2 * guard_len[1] + 1] = False
+    train_range, train_doppler = np.nonzero(train)
+    if train_range.size == 0:
+        raise ValueError('The 2D CFAR window has no training cells')
+    if k is None:
+        k = 3 * train_range.size // 4
+
+    maps = x.reshape((-1,) + x.shape[-2:])
+    noise_floor = np.empty(maps.shape, dtype=np.float64)
+    for frame_idx, rd_map in enumerate(maps):
+        # One map at a time bounds the size of the gathered training cells
+        padded = np.pad(rd_map, [(edge_cells[0], edge_cells[0]), (0, 0)], mode=mode[0])
+        padded = np.pad(padded, [(0, 0), (edge_cells[1], edge_cells[1])], mode=mode[1])
+        windows = sliding_window_view(padded, train.shape)
+        noise_floor[frame_idx] = np.partition(windows[:, :, train_range, train_doppler], k, axis=-1)[..., k]
+
+    noise_floor = noise_floor.reshape(x.shape)
+    threshold = noise_floor * scale
 
     return threshold, noise_floor
 
@@ -397,8 +460,158 @@ def _cfar_windows(x, guard_len, noise_len, mode):
     return l_window, r_window
 
 
-WRAP_UP_LIST_IDX = lambda x, total: x if x >= 0 else x + total
-WRAP_DN_LIST_IDX = lambda x, total: x if x < total else x - total
+def ca_2d(x, *argv, **kwargs):
+    """Detects peaks in range-doppler maps using 2D Cell-Averaging CFAR (CA-CFAR).
+
+    Args:
+        x (~numpy.ndarray): (num_range_bins, num_doppler_bins) map or (num_frames, num_range_bins, num_doppler_bins)
+            stack of maps.
+        *argv: See mmwave.dsp.cfar.ca_2d\_
+        **kwargs: See mmwave.dsp.cfar.ca_2d\_
+
+    Returns:
+        ~numpy.ndarray: Boolean array of detected peaks in x.
+
+    """
+    x = np.asarray(x)
+    threshold, _ = ca_2d_(x, *argv, **kwargs)
+    ret = (x > threshold)
+    return ret
+
+
+def ca_2d_(x, guard_len=(2, 2), noise_len=(4, 4), mode='wrap', l_bound=4000):
+    """Uses 2D Cell-Averaging CFAR (CA-CFAR) to calculate the threshold of every cell of range-doppler maps at once.
+
+    The training cells of a cell under test (CUT) are the (2 * (guard_len + noise_len) + 1) rectangle around it minus
+    the (2 * guard_len + 1) guard rectangle. Both rectangle sums are separable box sums computed with cumulative sums,
+    so the cost per cell does not depend on the window sizes. With guard_len and noise_len 0 along the range axis this
+    is the 1D ca\_ along doppler.
+
+    Args:
+        x (~numpy.ndarray): (num_range_bins, num_doppler_bins) map or (num_frames, num_range_bins, num_doppler_bins)
+            stack of maps.
+        guard_len (int or tuple): Number of cells adjacent to the CUT that are ignored, per (range, doppler) axis.
+        noise_len (int or tuple): Number of cells adjacent to the guard cells that are factored into the calculation,
+            per (range, doppler) axis.
+        mode (str or tuple): How to deal with edge cells, 'wrap' or 'constant' (zero), per (range, doppler) axis.
+        l_bound (float or int): Additive lower bound while calculating peak threshold.
+
+    Returns:
+        Tuple [ndarray, ndarray]
+            1. (ndarray): Upper bound of noise threshold.
+            #. (ndarray): Raw noise strength.
+
+    Examples:
+        >>> rd_maps = np.random.randint(100, size=(10, 64, 32))
+        >>> threshold, noise_floor = mm.dsp.ca_2d_(rd_maps, guard_len=(1, 2), noise_len=(2, 4), mode=('constant', 'wrap'))
+
+    """
+    x = np.asarray(x)
+    guard_len, noise_len, mode = _cfar_2d_params(guard_len, noise_len, mode)
+
+    num_train = np.prod([2 * (g + n) + 1 for g, n in zip(guard_len, noise_len)]) - np.prod([2 * g + 1 for g in guard_len])
+    if num_train <= 0:
+        raise ValueError('The 2D CFAR window has no training cells')
+
+    # Sum of the outer rectangle minus sum of the guard rectangle
+    outer = x
+    guard = x
+    for axis, g, n, m in zip((-2, -1), guard_len, noise_len, mode):
+        outer = _box_sum(outer, g + n, axis, m)
+        guard = _box_sum(guard, g, axis, m)
+
+    noise_floor = (outer - guard) / num_train
+    threshold = noise_floor + l_bound
+
+    return threshold, noise_floor
+
+
+def cfar_2d(x, cfar_type='ca', **kwargs):
+    """Runs a 2D CFAR over range-doppler maps and returns the list of detections.
+
+    Args:
+        x (~numpy.ndarray): (num_range_bins, num_doppler_bins) map or (num_frames, num_range_bins, num_doppler_bins)
+            stack of maps.
+        cfar_type (str): 'ca' or 'os' (see mmwave.dsp.cfar.ca_2d\_ and mmwave.dsp.cfar.os_2d\_).
+        **kwargs: Window and threshold parameters of the CFAR type.
+
+    Returns:
+        ~numpy.ndarray: Structured array of detections, see mmwave.dsp.cfar.detection_list.
+
+    Examples:
+        >>> rd_maps = np.random.randint(100, size=(10, 64, 32))
+        >>> det = mm.dsp.cfar_2d(rd_maps, guard_len=(1, 2), noise_len=(2, 4), l_bound=20)
+        >>> det['frame_idx'], det['range_idx'], det['doppler_idx'], det['peakVal'], det['snr']
+
+    """
+    x = np.asarray(x)
+    if cfar_type == 'ca':
+        threshold, noise_floor = ca_2d_(x, **kwargs)
+    elif cfar_type == 'os':
+        threshold, noise_floor = os_2d_(x, **kwargs)
+    else:
+        raise ValueError(f'CFAR type {cfar_type} is not a supported 2D CFAR type')
+
+    return detection_list(x, threshold, noise_floor)
+
+
+def detection_list(x, threshold, noise_floor):
+    """Sparse list of the cells of range-doppler maps exceeding their CFAR threshold.
+
+    Args:
+        x (~numpy.ndarray): (num_range_bins, num_doppler_bins) map or (num_frames, num_range_bins, num_doppler_bins)
+            stack of maps.
+        threshold (~numpy.ndarray): Threshold of every cell of x.
+        noise_floor (~numpy.ndarray): Noise strength of every cell of x.
+
+    Returns:
+        ~numpy.ndarray: (num_detections,) Structured array with fields frame_idx (0 for a single map), range_idx,
+        doppler_idx, peakVal and snr (peakVal - noise floor, the log ratio for log-magnitude maps), sorted by frame,
+        range and doppler.
+
+    """
+    x = np.asarray(x)
+    x3d = x.reshape((-1,) + x.shape[-2:])
+    frame_idx, range_idx, doppler_idx = np.nonzero((x > threshold).reshape(x3d.shape))
+
+    det = np.empty(frame_idx.size, dtype=[('frame_idx', np.int32), ('range_idx', np.int32), ('doppler_idx', np.int32),
+                                          ('peakVal', x.dtype), ('snr', np.float32)])
+    det['frame_idx'] = frame_idx
+    det['range_idx'] = range_idx
+    det['doppler_idx'] = doppler_idx
+    det['peakVal'] = x3d[frame_idx, range_idx, doppler_idx]
+    det['snr'] = det['peakVal'] - np.broadcast_to(noise_floor, x.shape).reshape(x3d.shape)[frame_idx, range_idx,
+                                                                                           doppler_idx]
+    return det
+
+
+def _cfar_2d_params(guard_len, noise_len, mode):
+    """Expands scalar 2D CFAR parameters to (range, doppler) tuples."""
+    guard_len = tuple(np.broadcast_to(guard_len, 2).astype(int))
+    noise_len = tuple(np.broadcast_to(noise_len, 2).astype(int))
+    mode = (mode, mode) if isinstance(mode, str) else tuple(mode)
+    for m in mode:
+        if m not in ('wrap', 'constant'):
+            raise ValueError(f'Mode {m} is not a supported mode')
+
+    return guard_len, noise_len, mode
+
+
+def _box_sum(x, half_len, axis, mode):
+    """Sum over the 2 * half_len + 1 cells centered on every cell along an axis, using a cumulative sum."""
+    if half_len == 0:
+        return x
+
+    # One extra leading cell so every window sum is the difference of two cumulative sums
+    pad_width = [(0, 0)] * x.ndim
+    pad_width[axis] = (half_len + 1, half_len)
+    csum = np.cumsum(np.pad(x, pad_width, mode=mode), axis=axis, dtype=np.float64)
+
+    n = x.shape[axis]
+    return np.take(csum, np.arange(2 * half_len + 1, 2 * half_len + 1 + n), axis=axis) - \
+        np.take(csum, np.arange(n), axis=axis)
+
+
 WRAP_DOPPLER_IDX = lambda x, num_doppler_bins: np.bitwise_and(x, num_doppler_bins - 1)
 DOPPLER_IDX_TO_SIGNED = lambda idx, fft_size: idx if idx < fft_size // 2 else idx - fft_size
 
@@ -415,11 +628,9 @@ def peak_grouping(obj_raw,
     The function groups neighboring peaks into one. The grouping is done according to two input flags:
     group_in_doppler_direction and group_in_doppler_direction. For each detected peak the function checks if the peak is
     greater than its neighbors. If this is true, the peak is copied to the output list of detected objects. The
-    neighboring peaks that are used for checking are taken from the detection matrix and copied into 3x3 kernel
-    regardless of whether they are CFAR detected or not. Note: Function always reads 9 samples per detected object
-    from L3 memory into local array tempBuff, but it only needs to read according to input flags. For example if only
-    the group_in_doppler_direction flag is set, it only needs to read middle row of the kernel, i.e. 3 samples per
-    target from detection matrix.
+    neighboring peaks that are used for checking are taken from the detection matrix regardless of whether they are CFAR
+    detected or not. The neighbors of all objects are read at once with fancy indexing (doppler wraps around, range
+    rows outside [min_range_idx, max_range_idx] count as 0), see _peak_grouping_flags.
 
     Args:
         obj_raw (np.ndarray): (num_detected_objects, 3). detected objects from CFAR.
@@ -431,98 +642,26 @@ def peak_grouping(obj_raw,
         group_in_range_direction (int): flag to perform grouping along range direction.
 
     Returns:
-        obj_out (np.ndarray):  detected object after grouping.
+        Tuple [int, ndarray]
+            1. (int): number of detected objects after grouping.
+            #. (ndarray): (num_obj_out, 3) detected objects after grouping, with signed doppler index.
 
     """
+    obj_raw = np.asarray(obj_raw)
+    det_matrix = np.asarray(det_matrix).reshape(-1, num_doppler_bins)
+    range_idx = obj_raw[:, RANGEIDX].astype(np.int64)
+    doppler_idx = np.bitwise_and(obj_raw[:, DOPPLERIDX].astype(np.int64), num_doppler_bins - 1)
 
-    num_detected_objects = obj_raw.shape[0]
-
-    num_obj_out = 0
-    kernel = np.empty([9])
-
-    if (group_in_doppler_direction == 1) and (group_in_range_direction == 1):
-        # Grouping both in Range and Doppler direction
-        start_ind = 0
-        step_ind = 1
-        end_ind = 8
-    elif (group_in_doppler_direction == 0) and (group_in_range_direction == 1):
-        # Grouping only in Range direction
-        start_ind = 1
-        step_ind = 3
-        end_ind = 7
-    elif (group_in_doppler_direction == 1) and (group_in_range_direction == 0):
-        # Grouping only in Doppler direction */
-        start_ind = 3
-        step_ind = 1
-        end_ind = 5
-    else:
-        # No grouping, copy all detected objects to the output matrix within specified min max range
-        # num_detected_objects = min(num_detected_objects, MAX_OBJ_OUT)
-        obj_out = obj_raw[obj_raw[:, RANGEIDX] <= max_range_idx and obj_raw[:, RANGEIDX] > min_range_idx]
-        obj_out[:, DOPPLERIDX] = np.bitwise_and(obj_out[:, DOPPLERIDX], num_doppler_bins - 1)
-
-        return obj_out
-
-    # Start checking
-    obj_out = np.zeros((num_obj_out, 3))
-    for i in range(num_detected_objects):
-        detected_obj_flag = 0
-        range_idx = obj_raw[i, 0]
-        doppler_idx = obj_raw[i, 1]
-        peak_val = obj_raw[i, 2]
-
-        if (range_idx <= max_range_idx) and (range_idx >= min_range_idx):
-            detected_obj_flag = 1
-
-            # Fill local 3x3 kernel from detection matrix in L3
-            start_idx = (range_idx - 1) * num_doppler_bins
-            temp_ptr = det_matrix[start_idx:]
-            row_start = 0
-            row_end = 2
-
-            if range_idx == min_range_idx:
-                start_idx = range_idx * num_doppler_bins
-                temp_ptr = det_matrix[start_idx:]
-                row_start = 1
-                kernel[0] = 0
-                kernel[1] = 0
-                kernel[2] = 0
-            elif range_idx == max_range_idx:
-                row_end = 1
-                kernel[6] = 0
-                kernel[7] = 0
-                kernel[8] = 0
-
-            for j in range(row_start, row_end + 1):
-                for k in range(3):
-
-                    temp_idx = doppler_idx + (k - 1)
-
-                    if temp_idx < 0:
-                        temp_idx += num_doppler_bins
-                    elif temp_idx >= num_doppler_bins:
-                        temp_idx -= num_doppler_bins
-
-                    kernel[j * 3 + k] = temp_ptr[temp_idx]
-
-                temp_ptr = temp_ptr[num_doppler_bins:]
-
-            # Compare the detected object to its neighbors
-            # Detected object is at index 4
-            for k in range(start_ind, end_ind + 1, step_ind):
-                if kernel[k] > kernel[4]:
-                    detected_obj_flag = 0
-
-        if detected_obj_flag == 1:
-            obj_out[num_obj_out, 0] = range_idx
-            obj_out[num_obj_out, 1] = DOPPLER_IDX_TO_SIGNED(doppler_idx, num_doppler_bins)
-            obj_out[num_obj_out, 2] = peak_val
-            num_obj_out += 1
-
-        if num_obj_out >= MAX_OBJ_OUT:
-            break
-
-    return num_obj_out, obj_out
+    detected_obj_flag = _peak_grouping_flags(range_idx, doppler_idx, det_matrix, max_range_idx, min_range_idx,
+                                             group_in_doppler_direction, group_in_range_direction)
+
+    obj_out = np.zeros((np.count_nonzero(detected_obj_flag), 3))
+    obj_out[:, RANGEIDX] = range_idx[detected_obj_flag]
+    doppler_idx = doppler_idx[detected_obj_flag]
+    obj_out[:, DOPPLERIDX] = np.where(doppler_idx < num_doppler_bins // 2, doppler_idx, doppler_idx - num_doppler_bins)
+    obj_out[:, PEAKVAL] = obj_raw[detected_obj_flag, PEAKVAL]
+
+    return obj_out.shape[0], obj_out
 
 
 def peak_grouping_qualified(obj_raw,
@@ -537,12 +676,13 @@ def peak_grouping_qualified(obj_raw,
     group_in_doppler_direction and group_in_doppler_direction. For each detected peak the function checks if the peak is
     greater than its neighbors. If this is true, the peak is copied to the output list of detected objects. The
     neighboring peaks that are used for checking are taken from the list of CFAR detected objects, (not from the
-    detection matrix), and copied into 3x3 kernel that has been initialized to zero for each peak under test. If the
-    neighboring cell has not been detected by CFAR, its peak value is not copied into the kernel. Note: Function always
-    search for 8 peaks in the list, but it only needs to search according to input flags.
+    detection matrix). If the neighboring cell has not been detected by CFAR, its peak value is 0. The detections are
+    scattered into a sparse range/doppler matrix per frame, so the same vectorized neighbor check as peak_grouping is
+    used and detections of different frames are never grouped.
 
     Args:
-        obj_raw (np.ndarray): (num_detected_objects, 3). detected objects from CFAR.
+        obj_raw (np.ndarray): (num_detected_objects,) structured array of detected objects from CFAR with fields
+            range_idx, doppler_idx, peakVal and optionally frame_idx (see detection_list).
         num_doppler_bins (int): number of doppler bins.
         max_range_idx (int): max range of detected objects.
         min_range_idx (int): min range of detected objects
@@ -553,105 +693,73 @@ def peak_grouping_qualified(obj_raw,
         obj_out (np.ndarray):  detected object after grouping.
 
     """
-
-    num_detected_objects = obj_raw.shape[0]
-
-    if (group_in_doppler_direction == 1) and (group_in_range_direction == 1):
-        # Grouping both in Range and Doppler direction
-        start_ind = 0
-        step_ind = 1
-        end_ind = 8
-    elif (group_in_doppler_direction == 0) and (group_in_range_direction == 1):
-        # Grouping only in Range direction
-        start_ind = 1
-        step_ind = 3
-        end_ind = 7
-    elif (group_in_doppler_direction == 1) and (group_in_range_direction == 0):
-        # Grouping only in Doppler direction */
-        start_ind = 3
-        step_ind = 1
-        end_ind = 5
+    range_idx = obj_raw['range_idx'].astype(np.int64)
+    doppler_idx = np.bitwise_and(obj_raw['doppler_idx'].astype(np.int64), num_doppler_bins - 1)
+    if 'frame_idx' in obj_raw.dtype.names:
+        # Frames numbered by their rank, so the matrix only holds the frames with detections
+        _, frame_idx = np.unique(obj_raw['frame_idx'], return_inverse=True)
+        frame_idx = frame_idx.reshape(-1)
     else:
-        # No grouping, copy all detected objects to the output matrix within specified min max range
-        num_detected_objects = min(num_detected_objects, MAX_OBJ_OUT)
-        obj_out = obj_raw[(obj_raw['range_idx'][:num_detected_objects] <= max_range_idx) &
-                          (obj_raw['range_idx'][:num_detected_objects] > min_range_idx)]
-
-        return obj_out
-
-    # Start checking
-    idx_obj_in_range = np.argwhere((obj_raw['range_idx'] <= max_range_idx) &
-                                   (obj_raw['range_idx'] >= min_range_idx))[:, 0]
-
-    obj_in_range = obj_raw[idx_obj_in_range]
-    kernels = np.zeros((obj_in_range.shape[0], 9))
-    detected_obj_flag = np.ones(obj_in_range.shape[0])
-
-    # Populate the middle column.
-    # Populate the 4th element.
-    kernels[:, 4] = obj_in_range['peakVal']
-
-    # Populate the 1st element.
-    obj_in_range_previous = obj_raw[idx_obj_in_range - 1]
-    assert obj_in_range_previous.shape == obj_in_range.shape, "obj_in_range_previous indexing is wrong"
-    idx_temp = ((obj_in_range_previous['range_idx']) == (obj_in_range['range_idx'] - 1)) & \
-               ((obj_in_range_previous['doppler_idx']) == (obj_in_range['doppler_idx']))
-    kernels[idx_temp, 1] = obj_in_range_previous['peakVal'][idx_temp]
-    # 0th detected object has no left neighbor.
-    kernels[idx_obj_in_range[idx_obj_in_range[:] == 0], 1] = 0
-
-    # Populate the 7th element.
-    obj_in_range_next = obj_raw[(idx_obj_in_range + 1) % num_detected_objects]
-    assert obj_in_range_next.shape == obj_in_range.shape, "obj_in_range_next indexing is wrong"
-    idx_temp = ((obj_in_range_next['range_idx']) == (obj_in_range['range_idx'] + 1)) & \
-               ((obj_in_range_next['doppler_idx']) == (obj_in_range['doppler_idx']))
-    kernels[idx_temp, 7] = obj_in_range_next['peakVal'][idx_temp]
-    # last detected object, i.e. num_detected_objects-th has no left neighbor.
-    kernels[idx_obj_in_range[idx_obj_in_range[:] == num_detected_objects], 7] = 0
-
-    for i, idxDeteced in enumerate(idx_obj_in_range):
-        doppler_idx = obj_in_range['doppler_idx'][i]
-        range_idx = obj_in_range['range_idx'][i]
-        # Fill the left column
-        k_left = WRAP_UP_LIST_IDX(idxDeteced - 1, num_detected_objects)
-        k_right = WRAP_DN_LIST_IDX(idxDeteced + 1, num_detected_objects)
-        for _ in range(num_detected_objects):
-            k_left_doppler_idx = obj_raw['doppler_idx'][k_left]
-            k_left_range_idx = obj_raw['range_idx'][k_left]
-            k_left_peak_val = obj_raw['peakVal'][k_left]
-            if k_left_doppler_idx == WRAP_DOPPLER_IDX(doppler_idx - 2, num_doppler_bins):
-                break
-            if k_left_range_idx == range_idx + 1 and k_left_doppler_idx == WRAP_DOPPLER_IDX(doppler_idx - 1,
-                                                                                            num_doppler_bins):
-                kernels[i, 6] = k_left_peak_val
-            elif k_left_range_idx == range_idx and k_left_doppler_idx == WRAP_DOPPLER_IDX(doppler_idx - 1,
-                                                                                          num_doppler_bins):
-                kernels[i, 3] = k_left_peak_val
-            elif k_left_range_idx == range_idx - 1 and k_left_doppler_idx == WRAP_DOPPLER_IDX(doppler_idx - 1,
-                                                                                              num_doppler_bins):
-                kernels[i, 0] = k_left_peak_val
-            k_left = WRAP_UP_LIST_IDX(k_left - 1, num_detected_objects)
-
-            k_right_doppler_idx = obj_raw['doppler_idx'][k_right]
-            k_right_range_idx = obj_raw['range_idx'][k_right]
-            k_right_peak_val = obj_raw['peakVal'][k_right]
-            if k_right_doppler_idx == WRAP_DOPPLER_IDX(doppler_idx - 2, num_doppler_bins):
-                break
-            if k_right_range_idx == range_idx + 1 and k_right_doppler_idx == WRAP_DOPPLER_IDX(doppler_idx + 1,
-                                                                                              num_doppler_bins):
-                kernels[i, 8] = k_right_peak_val
-            elif k_right_range_idx == range_idx and k_right_doppler_idx == WRAP_DOPPLER_IDX(doppler_idx + 1,
-                                                                                            num_doppler_bins):
-                kernels[i, 5] = k_right_peak_val
-            elif k_right_range_idx == range_idx - 1 and k_right_doppler_idx == WRAP_DOPPLER_IDX(doppler_idx + 1,
-                                                                                                num_doppler_bins):
-                kernels[i, 2] = k_right_peak_val
-            k_right = WRAP_DN_LIST_IDX(k_right + 1, num_detected_objects)
-
-    detected_obj_flag[np.argwhere(np.max(kernels[:, start_ind:end_ind:step_ind]) != kernels[:, 4])] = 0
-    obj_out = obj_in_range[detected_obj_flag[:] == 1]
-
-    if obj_out.shape[0] > MAX_OBJ_OUT:
-        obj_out = obj_out[:MAX_OBJ_OUT, ...]
-
-    return obj_out
+        frame_idx = np.zeros_like(range_idx)
+
+    # Matrix of the detected peaks per frame, 0 where nothing was detected
+    num_frames = int(frame_idx.max(initial=0)) + 1
+    num_range_bins = max(max_range_idx, int(range_idx.max(initial=0))) + 1
+    det_matrix = np.zeros((num_frames, num_range_bins, num_doppler_bins),
+                          dtype=np.result_type(obj_raw['peakVal'], np.float32))
+    det_matrix[frame_idx, range_idx, doppler_idx] = obj_raw['peakVal']
+
+    detected_obj_flag = _peak_grouping_flags(range_idx, doppler_idx, det_matrix, max_range_idx, min_range_idx,
+                                             group_in_doppler_direction, group_in_range_direction, frame_idx)
+
+    return obj_raw[detected_obj_flag]
+
+
+def _peak_grouping_flags(range_idx,
+                         doppler_idx,
+                         det_matrix,
+                         max_range_idx,
+                         min_range_idx,
+                         group_in_doppler_direction,
+                         group_in_range_direction,
+                         frame_idx=None):
+    """Helper function to flag the detections within range that are not smaller than any neighbor of their kernel.
+
+    Args:
+        range_idx (np.ndarray): (num_detected_objects,) range index of the detections.
+        doppler_idx (np.ndarray): (num_detected_objects,) doppler index of the detections in [0, num_doppler_bins).
+        det_matrix (np.ndarray): (num_range_bins, num_doppler_bins) range-doppler profile, or
+            (num_frames, num_range_bins, num_doppler_bins) profiles with frame_idx.
+        max_range_idx (int): max range of detected objects.
+        min_range_idx (int): min range of detected objects
+        group_in_doppler_direction (int): flag to perform grouping along doppler direction.
+        group_in_range_direction (int): flag to perform grouping along range direction.
+        frame_idx (np.ndarray): (Optional) (num_detected_objects,) profile of each detection, 0 by default.
+
+    Returns:
+        detected_obj_flag (np.ndarray): (num_detected_objects,) boolean mask of the detections kept.
+
+    """
+    num_range_bins, num_doppler_bins = det_matrix.shape[-2:]
+    det_matrix = det_matrix.reshape(-1, num_range_bins, num_doppler_bins)
+    frame_idx = np.zeros_like(range_idx) if frame_idx is None else frame_idx
+    detected_obj_flag = (range_idx <= max_range_idx) & (range_idx >= min_range_idx)
+    if not (group_in_doppler_direction or group_in_range_direction):
+        # No grouping, keep all detected objects within specified min max range
+        return detected_obj_flag
+
+    # Offsets of the neighbors in the 3x3 kernel (middle column or row only when grouping in one direction)
+    range_offsets = np.array([-1, 0, 1] if group_in_range_direction else [0])
+    doppler_offsets = np.array([-1, 0, 1] if group_in_doppler_direction else [0])
+    range_offsets, doppler_offsets = [o.ravel() for o in np.meshgrid(range_offsets, doppler_offsets, indexing='ij')]
+
+    # (num_detected_objects, kernel_size) neighbors, doppler wraps around, range rows outside the limits are 0
+    kernel_range = range_idx[:, None] + range_offsets
+    kernel_doppler = (doppler_idx[:, None] + doppler_offsets) % num_doppler_bins
+    kernel = det_matrix[frame_idx[:, None], np.clip(kernel_range, 0, num_range_bins - 1), kernel_doppler]
+    kernel[(kernel_range < min_range_idx) | (kernel_range > max_range_idx)] = 0
+
+    center = det_matrix[frame_idx, np.clip(range_idx, 0, num_range_bins - 1), doppler_idx]
+    detected_obj_flag &= np.all(kernel <= center[:, None], axis=1)
+
+    return detected_obj_flag
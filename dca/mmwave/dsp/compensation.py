@@ -14,29 +14,6 @@ import math
 from .utils import *
 
 
-def _generate_dft_sin_cos_table(dft_length):
-    """Generate SIN/COS table for doppler compensation reference.
-
-    Generate SIN/COS table. Also generates Sine/Cosine at half, one thrid and two thirds the bin value. This is a helper
-    function only called by add_doppler_compensation().
-
-    Args:
-        dft_len: (int) dft_len Length of the DFT. It is used as numDopperBins, which is numCHirpsPerFrame/numTxAntenns.
-
-    Returns:
-        dft_sin_cos_table (np.ndarray): ndarray in complex format with generated sine (image) cosine (real) table.
-        bins (np.ndarray): Sin/Cos at half, one thrid and two thirds the bin.
-    """
-    dft_sin_cos_table = np.arange(dft_length, dtype=np.float32)
-    dft_sin_cos_table = np.cos(2 * np.pi * dft_sin_cos_table / dft_length) + \
-                        1j * -np.sin(2 * np.pi * dft_sin_cos_table / dft_length)
-
-    # 1/2, 1/3 and 2/3 bins
-    bins = np.array([0.5, 1.0/3, 2.0/3])
-    bins = np.cos(2 * np.pi * bins / dft_length) - 1j * np.sin(2 * np.pi * bins / dft_length)
-
-    return dft_sin_cos_table, bins
-
 def add_doppler_compensation(input_data,
                              num_tx_antennas,
                              doppler_indices=None,
@@ -45,21 +22,20 @@ def add_doppler_compensation(input_data,
 
     Compensation of Doppler phase shift on the virtual antennas (corresponding to second or third Tx antenna chirps). 
     Symbols corresponding to virtual antennas, are rotated by half of the Doppler phase shift measured by Doppler FFT 
-    for 2 Tx system and 1/3 and 2/3 of the Doppler phase shift for 3 Tx system. The phase shift read from the table 
-    using half or 1/3 of the object Doppler index value. If the Doppler index is odd, an extra half of the bin phase 
-    shift is added.
+    for 2 Tx system and 1/3 and 2/3 of the Doppler phase shift for 3 Tx system, i.e. the virtual antennas of Tx k are
+    rotated by exp(-j * 2 * pi * k * doppler_idx / (num_tx_antennas * num_doppler_bins)) with the signed doppler index.
 
-    The original function is called per detected objects. This functions is modified to directly compensate the 
-    azimuth_in matrix (numDetObj, num_angle_bins)
+    The original function is called per detected objects. This functions directly compensates all detected objects
+    (or all doppler bins) at once.
 
     Args:
-        input_data (ndarray): (range, num_antennas, doppler) Radar data cube that needs to be compensated. It can be the input
-            of azimuth FFT after CFAR or the intermediate right before beamforming.
+        input_data (ndarray): Data to compensate in place, with the virtual antennas (grouped by Tx) on axis 1. Either
+            (numDetObj, num_antennas, ...) azimuth input of the detected objects if doppler_indices is given, or a
+            (range, num_antennas, doppler) radar data cube.
         num_tx_antennas (int): Number of transmitters.
-        num_doppler_bins (int): (Optional) Number of doppler bins in the radar data cube. If given, that means the doppler
-            indices are signed and needs to be converted to unsigned.
-        doppler_indices (ndarray): (Optional) Doppler index of the object with the shape of (num_detected_objects). If given, 
-            that means we only compensate on selected doppler bins.
+        doppler_indices (ndarray): (Optional) Doppler index of the object with the shape of (num_detected_objects). If
+            given, that means we only compensate on selected doppler bins.
+        num_doppler_bins (int): Number of doppler bins. Required with doppler_indices, which may be signed or unsigned.
     
     Return:
         input_data (ndarray): Original input data with the columns related to virtual receivers got compensated.
@@ -68,43 +44,30 @@ def add_doppler_compensation(input_data,
         >>> # If the compensation is done right before naive azimuth FFT and objects is detected already. you need to 
         >>> # feed in the doppler_indices
         >>> dataIn = add_doppler_compensation(dataIn, 3, doppler_indices, 128)
-  """
+    """
     num_antennas = input_data.shape[1]
     if num_tx_antennas == 1:
         return input_data
     elif num_tx_antennas > 3:
         raise ValueError("the specified number of transimitters is currently not supported")
+    num_rx_antennas = num_antennas // num_tx_antennas
 
-    # Call the gen function above to generate the tables.
-    azimuth_mod_coefs, bins = _generate_dft_sin_cos_table(int(num_doppler_bins))
-    
-    # Convert signed doppler indices to unsigned and divide Doppler index by 2.
     if doppler_indices is not None:
-        if num_doppler_bins is not None:
-            doppler_compensation_indices = doppler_indices & (num_doppler_bins - 1)
-            doppler_compensation_indices[doppler_compensation_indices[:] >= (num_doppler_bins / 2)] -= num_doppler_bins
-            doppler_compensation_indices = doppler_compensation_indices // 2
-            doppler_compensation_indices[doppler_compensation_indices[:] < 0] += num_doppler_bins
-        exp_doppler_compensation = azimuth_mod_coefs[doppler_compensation_indices]
-    else:
-        exp_doppler_compensation = azimuth_mod_coefs
-
-    # Add half bin rotation if Doppler index was odd
-    if num_tx_antennas == 2:
-        exp_doppler_compensation[(doppler_indices[:] % 2) == 1] *= bins[0]
+        if num_doppler_bins is None:
+            raise ValueError("num_doppler_bins is required to compensate selected doppler bins")
+        # One doppler index per detected object, broadcast along the trailing axes
+        doppler = np.asarray(doppler_indices).astype(np.int64) % num_doppler_bins
+        doppler = doppler.reshape((-1,) + (1,) * (input_data.ndim - 1))
     else:
-        exp_doppler_compensation[(doppler_indices[:] % 3) == 1] *= bins[1]
-        exp_doppler_compensation[(doppler_indices[:] % 3) == 2] *= bins[2]
-
-    # Expand the dim so that the broadcasting below will work.
-    exp_doppler_compensation = np.expand_dims(exp_doppler_compensation, axis=1)
-
-    # Rotate
-    azimuth_values = input_data[:, (num_antennas/num_tx_antennas):, :]
-    for azi_val in azimuth_values:
-        Re = exp_doppler_compensation.real * azi_val.imag - exp_doppler_compensation.imag * azi_val.real
-        Im = exp_doppler_compensation.imag * azi_val.imag + exp_doppler_compensation.real * azi_val.real
-        input_data[:, (num_antennas/num_tx_antennas):, :] = Re + 1j * Im
+        # Doppler on the last axis of the cube
+        num_doppler_bins = input_data.shape[-1]
+        doppler = np.arange(num_doppler_bins)
+    doppler = np.where(doppler >= num_doppler_bins / 2, doppler - num_doppler_bins, doppler)
+
+    # Rotate the virtual antennas of every Tx after the first one
+    for tx in range(1, num_tx_antennas):
+        rotation = np.exp(-2j * np.pi * tx * doppler / (num_tx_antennas * num_doppler_bins))
+        input_data[:, tx * num_rx_antennas:(tx + 1) * num_rx_antennas] *= rotation
 
     return input_data
 
@@ -11,6 +11,7 @@
 # ==============================================================================
 
 import numpy as np
+import scipy.signal
 from . import compensation
 from . import utils
 
@@ -116,9 +117,10 @@ def doppler_processing(radar_cube,
     # transpose to (numRangeBins, numVirtualAntennas, num_doppler_bins)
     fft2d_in = np.transpose(fft2d_in, axes=(2, 1, 0))
 
-    # Windowing 16x32
+    # Windowing 16x32 (in place when fft2d_in is already a copy of the input)
     if window_type_2d:
-        fft2d_in = utils.windowing(fft2d_in, window_type_2d, axis=2)
+        owned = interleaved or clutter_removal_enabled
+        fft2d_in = utils.windowing(fft2d_in, window_type_2d, axis=2, out=fft2d_in if owned else None)
 
     # It is assumed that doppler is at the last axis.
     # FFT 32x32
@@ -204,3 +206,69 @@ def doppler_estimation(radar_cube,
     doppler_est[doppler_est[:] >= num_doppler_bins] -= num_doppler_bins * 2
 
     return doppler_est
+
+
+class DopplerCZT:
+    """Planned chirp-Z Doppler transform over a Doppler (velocity) window.
+
+    Zero-padding the Doppler FFT to num_chirps * interp_factor bins refines the whole spectrum, although often only a
+    small velocity window is of interest. The chirp-Z transform evaluates the spectrum on num_bins frequencies of the
+    requested window only, so its cost and output size do not grow with the interpolation of the full spectrum. The
+    transform and window are planned once and the engine is then called on every cube of that configuration.
+
+    Doppler frequencies are normalized to cycles per chirp, the unambiguous range being [-0.5, 0.5). A velocity window
+    of +-v m/s thus corresponds to +-0.5 * v / max_velocity with max_velocity the unambiguous velocity. With the full
+    window and num_chirps * interp_factor bins the output equals the fftshifted zero-padded Doppler FFT.
+
+    Example:
+        >>> engine = DopplerCZT(128, 256, doppler_window=(-3 / max_velocity / 2, 3 / max_velocity / 2))
+        >>> fft2d_out = engine(fft1d_out, axis=0)  # 256 Doppler bins over +-3 m/s
+
+    """
+
+    def __init__(self, num_chirps, num_bins, doppler_window=(-0.5, 0.5), window_type_2d=None, dtype=np.complex64):
+        """Plan the chirp-Z Doppler transform.
+
+        Args:
+            num_chirps (int): Number of chirps (Doppler samples) per frame.
+            num_bins (int): Number of Doppler bins evaluated over the window.
+            doppler_window (tuple): (low, high) normalized Doppler frequencies of the window, in cycles per chirp. The
+                bins are low + k * (high - low) / num_bins.
+            window_type_2d (mmwave.dsp.utils.Window): Optional window before the transform.
+            dtype (np.dtype): Complex dtype of the output.
+
+        """
+        low, high = doppler_window
+        if not -0.5 <= low < high <= 0.5:
+            raise ValueError("doppler_window should be within [-0.5, 0.5] cycles per chirp, got {}".format(doppler_window))
+
+        self.num_chirps = num_chirps
+        self.num_bins = num_bins
+        self.doppler_window = (low, high)
+        self.dtype = np.dtype(dtype)
+
+        step = (high - low) / num_bins
+        self.freqs = low + np.arange(num_bins) * step
+        self.window = utils.get_window(window_type_2d, num_chirps, self.dtype.char.lower()) if window_type_2d else None
+        self._czt = scipy.signal.CZT(num_chirps, num_bins, w=np.exp(-2j * np.pi * step), a=np.exp(2j * np.pi * low))
+
+    def __call__(self, x, axis=0):
+        """Compute the Doppler spectrum over the planned window.
+
+        Args:
+            x (ndarray): Range FFT output with num_chirps samples along axis.
+            axis (int): Doppler (chirp) axis of x.
+
+        Returns:
+            fft2d_out (ndarray): Doppler spectrum with the chirp axis replaced by num_bins bins at freqs.
+
+        """
+        x = np.moveaxis(x, axis, -1)
+        if x.shape[-1] != self.num_chirps:
+            raise ValueError("expected {} chirps, got {}".format(self.num_chirps, x.shape[-1]))
+        if self.window is not None:
+            x = x * self.window
+
+        fft2d_out = self._czt(x, axis=-1).astype(self.dtype, copy=False)
+
+        return np.moveaxis(fft2d_out, -1, axis)
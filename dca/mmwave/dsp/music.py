@@ -92,29 +92,30 @@ def aoa_spatial_smoothing(covariance_matrix, num_subarrays, forward_backward=Fal
     This implementations referred to the github.com/morriswmz/doatools.py
     
     Args:
-        covariance_matrx (~np.ndarray): Covariance matrix of input signal.
+        covariance_matrx (~np.ndarray): Covariance matrix of input signal, or a stack (..., num_ant, num_ant) of
+         covariance matrices.
         num_subarrays (int): Number of subarrays to perform the spatial smoothing.
         forward_backward (bool): If True, perform backward smoothing as well.
     
     Returns:
         (~np.ndarray): Decorrelated covariance matrix.
     """
-    num_receivers = covariance_matrix.shape[0]
+    num_receivers = covariance_matrix.shape[-1]
     assert num_subarrays >=1 and num_subarrays <= num_receivers, "num_subarrays is wrong"
 
     # Forward pass
-    result = covariance_matrix[:num_receivers-num_subarrays+1, :num_receivers-num_subarrays+1].copy()
+    result = covariance_matrix[..., :num_receivers-num_subarrays+1, :num_receivers-num_subarrays+1].copy()
     for i in range(1, num_subarrays):
-        result += covariance_matrix[i:i+num_receivers-num_subarrays+1, i:i+num_receivers-num_subarrays+1]
+        result += covariance_matrix[..., i:i+num_receivers-num_subarrays+1, i:i+num_receivers-num_subarrays+1]
     result /= num_subarrays
     if not forward_backward:
         return result
     
     # Adds backward pass
     if np.iscomplexobj(result):
-        return 0.5 * (result + np.flip(result).conj())
+        return 0.5 * (result + result[..., ::-1, ::-1].conj())
     else:
-        return 0.5 * (result + np.flip(result))
+        return 0.5 * (result + result[..., ::-1, ::-1])
 
 def aoa_esprit(steering_vec, rx_chirps, num_sources, displacement):
     """ Perform Estimation of Signal Parameters via Rotation Invariance Techniques (ESPIRIT) for Angle of Arrival.
@@ -156,4 +157,138 @@ def aoa_esprit(steering_vec, rx_chirps, num_sources, displacement):
     sin_vals = np.angle(w) / np.pi
     locations = np.rad2deg(np.arcsin(sin_vals))
 
-    return locations
\ No newline at end of file
+    return locations
+
+
+# ------------------------------- BATCHED ESTIMATORS -------------------------------
+# The batched estimators take the snapshots of many range-Doppler cells at once, as a (num_cells, num_ant) or
+# (num_cells, num_ant, num_chirps) tensor, and decompose all covariance matrices with a single batched LA.eigh. Angles
+# follow the convention of gen_steering_vec, i.e. a half wavelength ULA with phase -pi * n * sin(theta).
+
+def batch_covariance(x, num_subarrays=1, forward_backward=False):
+    """Stacked spatial covariance matrices of the snapshots of many cells, optionally spatially smoothed.
+
+    Args:
+        x (~np.ndarray): Snapshots with the shape of (num_cells, num_ant) or (num_cells, num_ant, num_chirps).
+        num_subarrays (int): Number of subarrays of the spatial smoothing (1: no smoothing). The smoothed covariance
+         matrices are of size num_ant - num_subarrays + 1.
+        forward_backward (bool): If True, perform forward-backward averaging as well.
+
+    Returns:
+        (~np.ndarray): Covariance matrices with the shape of (num_cells, num_ant - num_subarrays + 1, ...).
+    """
+    x = np.asarray(x)
+    if x.ndim == 2:
+        x = x[:, :, None]
+    if x.ndim != 3:
+        raise ValueError("snapshots should be of shape (num_cells, num_ant) or (num_cells, num_ant, num_chirps).")
+
+    R = x @ np.swapaxes(x.conj(), 1, 2) / x.shape[2]
+    if num_subarrays > 1 or forward_backward:
+        R = aoa_spatial_smoothing(R, num_subarrays, forward_backward)
+
+    return R
+
+def _batch_subspaces(x, num_sources, num_subarrays, forward_backward):
+    """helper function to get the stacked signal and noise subspaces (ascending eigenvalues) of all cells.
+    """
+    R = batch_covariance(x, num_subarrays, forward_backward)
+    if not 1 <= num_sources < R.shape[-1]:
+        raise ValueError("number of sources should be positive and less than the size of the (smoothed) covariance "
+                         "matrix.")
+    _, v = LA.eigh(R)
+
+    return v[..., -num_sources:], v[..., :-num_sources]
+
+def aoa_music_1D_batch(steering_vec, x, num_sources, num_subarrays=1, forward_backward=False):
+    """Batched 1D MUSIC on ULA for the snapshots of many range-Doppler cells (see aoa_music_1D).
+
+    Args:
+        steering_vec (~np.ndarray): steering vector with the shape of (FoV/angel_resolution, num_ant).
+         It is generated (and cached) by the gen_steering_vec() function. With spatial smoothing only its first
+         num_ant - num_subarrays + 1 antennas are used.
+        x (~np.ndarray): Snapshots with the shape of (num_cells, num_ant) or (num_cells, num_ant, num_chirps).
+        num_sources (int): Number of sources in the scene. Needs to be smaller than num_ant - num_subarrays + 1.
+        num_subarrays (int): Number of subarrays of the spatial smoothing (1: no smoothing).
+        forward_backward (bool): If True, perform forward-backward averaging.
+
+    Returns:
+        (~np.ndarray): the MUSIC spectra with the shape of (num_cells, FoV/angel_resolution).
+
+    Example:
+        >>> _, steering_vec = gen_steering_vec(90, 1, 8)
+        >>> spectra = aoa_music_1D_batch(steering_vec, azimuth_input[:, :8], 1, num_subarrays=2)
+    """
+    assert np.shape(x)[1] == steering_vec.shape[1], "Mismatch between number of receivers in snapshots and steering_vec"
+    _, noise_subspace = _batch_subspaces(x, num_sources, num_subarrays, forward_backward)
+
+    v = np.swapaxes(noise_subspace.conj(), 1, 2) @ steering_vec[:, :noise_subspace.shape[1]].T
+    spectrum = np.reciprocal(np.sum(v.real ** 2 + v.imag ** 2, axis=1))
+
+    return spectrum
+
+def aoa_root_music_1D_batch(x, num_sources, num_subarrays=1, forward_backward=False):
+    """Batched 1D root MUSIC on ULA for the snapshots of many range-Doppler cells (see aoa_root_music_1D).
+
+    The polynomial roots of all cells are found at once as the eigenvalues of the stacked companion matrices. The
+    num_sources roots inside and closest to the unit circle give the angles.
+
+    Args:
+        x (~np.ndarray): Snapshots with the shape of (num_cells, num_ant) or (num_cells, num_ant, num_chirps).
+        num_sources (int): Number of sources in the scene. Needs to be smaller than num_ant - num_subarrays + 1.
+        num_subarrays (int): Number of subarrays of the spatial smoothing (1: no smoothing).
+        forward_backward (bool): If True, perform forward-backward averaging.
+
+    Returns:
+        (~np.ndarray): Angles in degrees with the shape of (num_cells, num_sources), in ascending order. Cells with
+         fewer roots inside the unit circle are padded with NaN.
+    """
+    _, noise_subspace = _batch_subspaces(x, num_sources, num_subarrays, forward_backward)
+    v = noise_subspace @ np.swapaxes(noise_subspace.conj(), 1, 2)
+    num_ant = v.shape[-1]
+
+    # (1) Polynomial coefficients: sums of the diagonals of v, highest power first
+    coeffs = np.stack([np.trace(v, offset=k, axis1=1, axis2=2) for k in range(num_ant - 1, -num_ant, -1)], axis=1)
+
+    # (2) Roots of all polynomials as eigenvalues of the companion matrices
+    degree = coeffs.shape[1] - 1
+    companion = np.zeros((coeffs.shape[0], degree, degree), dtype=coeffs.dtype)
+    companion[:, 0, :] = -coeffs[:, 1:] / coeffs[:, :1]
+    companion[:, np.arange(1, degree), np.arange(degree - 1)] = 1
+    z = LA.eigvals(companion)
+
+    # (3) Keep the num_sources roots inside and closest to the unit circle
+    radius = np.where(np.abs(z) <= 1.0, np.abs(z), -1.0)
+    order = np.argsort(radius, axis=1)[:, -num_sources:]
+    z = np.take_along_axis(z, order, axis=1)
+    sin_vals = np.where(np.take_along_axis(radius, order, axis=1) >= 0, -np.angle(z) / np.pi, np.nan)
+    locations = np.sort(np.rad2deg(np.arcsin(sin_vals)), axis=1)
+
+    return locations
+
+def aoa_esprit_batch(x, num_sources, displacement=1, num_subarrays=1, forward_backward=False):
+    """Batched least squares ESPRIT on ULA for the snapshots of many range-Doppler cells (see aoa_esprit).
+
+    Args:
+        x (~np.ndarray): Snapshots with the shape of (num_cells, num_ant) or (num_cells, num_ant, num_chirps).
+        num_sources (int): Number of sources in the scene. Needs to be smaller than num_ant - num_subarrays + 1.
+        displacement (int): displacmenet between two subarrays.
+        num_subarrays (int): Number of subarrays of the spatial smoothing (1: no smoothing).
+        forward_backward (bool): If True, perform forward-backward averaging.
+
+    Returns:
+        (~np.ndarray): Angles in degrees with the shape of (num_cells, num_sources), in ascending order.
+    """
+    signal_subspace, _ = _batch_subspaces(x, num_sources, num_subarrays, forward_backward)
+    num_antennas = signal_subspace.shape[1]
+    if displacement > num_antennas/2 or displacement <= 0:
+        raise ValueError("The separation between two subarrays can only range from 1 to half of the original array size.")
+
+    # Rotation between the signal subspaces of the two shifted subarrays
+    phi = LA.pinv(signal_subspace[:, :num_antennas - displacement]) @ signal_subspace[:, displacement:]
+    w = LA.eigvals(phi)
+
+    sin_vals = np.clip(-np.angle(w) / (np.pi * displacement), -1, 1)
+    locations = np.sort(np.rad2deg(np.arcsin(sin_vals)), axis=1)
+
+    return locations
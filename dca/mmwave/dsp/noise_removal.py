@@ -17,8 +17,8 @@ def peak_grouping_along_doppler(det_obj_2d,
                                 det_matrix,
                                 num_doppler_bins):
     """Perform peak grouping along the doppler direction only.
-    This is a temporary remedy for the slow and old implementation of peak_grouping_qualified() function residing in
-    dsp.py currently. Will merge this back to there to enable more generic peak grouping.
+    Unlike cfar.peak_grouping, a peak must be strictly greater than both doppler neighbors to be kept. See
+    cfar.peak_grouping and cfar.peak_grouping_qualified for the generic 3x3 / range-only / doppler-only grouping.
     """
     num_det_objs = det_obj_2d.shape[0]
     range_idx = det_obj_2d['rangeIdx']
@@ -0,0 +1,139 @@
+# Copyright 2019 The OpenRadar Authors. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import scipy.fft
+from . import utils
+
+
+class RangeDopplerFFT:
+    """Planned 2D range-Doppler FFT over raw radarcubes.
+
+    The engine is planned once for a (num_samples, num_chirps, num_rx, window, interp_factor) configuration and then
+    called on every radarcube of that configuration. Compared to range_processing followed by a separate Doppler FFT it
+
+    1. caches the range and Doppler windows as one broadcastable window tensor,
+    2. removes static clutter on the ADC samples (the mean over chirps commutes with the range FFT),
+    3. folds the Doppler fftshift into the window tensor as a (-1)^n modulation (for an even number of Doppler bins),
+    4. runs both FFTs with scipy.fft over the memory-contiguous layout (frames, chirps, rx, samples) of the cube, so no
+       transposed copies are made.
+
+    Real-valued ADC data is transformed with rfft along range when the kept range bins are all non-negative frequencies.
+    Complex and IQ_INT16 (structured 'i', 'q') radarcubes are transformed as complex IQ data.
+
+    Example:
+        >>> engine = RangeDopplerFFT(256, 128, 4, window_type_1d=Window.hamming, window_type_2d=Window.hamming)
+        >>> fft2d_out = engine(radar_cube)  # (num_range_bins, num_doppler_bins, num_rx, num_frames)
+
+    """
+
+    def __init__(self, num_samples, num_chirps, num_rx, window_type_1d=None, window_type_2d=None, interp_factor=1,
+                 clutter_removal_enabled=True, positive_range_only=False, num_range_bins=None, dtype=np.complex64,
+                 workers=None):
+        """Plan the range-Doppler FFT.
+
+        Args:
+            num_samples (int): Number of ADC samples per chirp (range FFT length).
+            num_chirps (int): Number of chirps per frame.
+            num_rx (int): Number of receivers.
+            window_type_1d (mmwave.dsp.utils.Window): Optional window before the range FFT.
+            window_type_2d (mmwave.dsp.utils.Window): Optional window before the Doppler FFT.
+            interp_factor (int): Zero-padding factor of the Doppler FFT (num_chirps * interp_factor Doppler bins).
+            clutter_removal_enabled (bool): Remove the mean over chirps (static clutter) before the Doppler FFT.
+            positive_range_only (bool): Keep only the positive half of the range spectrum (num_samples // 2 bins). The
+                Doppler FFT is then computed on the kept range bins only.
+            num_range_bins (int): Optional number of range bins to keep, overrides positive_range_only.
+            dtype (np.dtype): Complex dtype of the computation and output.
+            workers (int): Number of threads used by scipy.fft (None: single threaded, -1: all cores).
+
+        """
+        self.num_samples = num_samples
+        self.num_chirps = num_chirps
+        self.num_rx = num_rx
+        self.window_type_1d = window_type_1d
+        self.window_type_2d = window_type_2d
+        self.interp_factor = interp_factor
+        self.clutter_removal_enabled = clutter_removal_enabled
+        self.positive_range_only = positive_range_only
+        self.dtype = np.dtype(dtype)
+        self.workers = workers
+
+        if num_range_bins is None:
+            num_range_bins = num_samples // 2 if positive_range_only else num_samples
+        self.num_range_bins = num_range_bins
+        self.num_doppler_bins = num_chirps * interp_factor
+
+        # fftshift along Doppler is equivalent to modulating the input with (-1)^n when the FFT length is even
+        self._shift_in_window = self.num_doppler_bins % 2 == 0
+        self.window = self._window_tensor()
+
+    def _window_tensor(self):
+        """Build the (1, num_chirps, 1, num_samples) window tensor of the planned configuration."""
+        real_dtype = self.dtype.char.lower()
+        window_range = np.ones(self.num_samples, dtype=real_dtype)
+        window_doppler = np.ones(self.num_chirps, dtype=real_dtype)
+
+        if self.window_type_1d:
+            window_range = utils.get_window(self.window_type_1d, self.num_samples, real_dtype)
+        if self.window_type_2d:
+            window_doppler = utils.get_window(self.window_type_2d, self.num_chirps, real_dtype)
+        if self._shift_in_window:
+            window_doppler = window_doppler * np.where(np.arange(self.num_chirps) % 2, -1, 1).astype(real_dtype)
+
+        return (window_doppler[:, None, None] * window_range).reshape(1, self.num_chirps, 1, self.num_samples)
+
+    def __call__(self, radar_cube):
+        """Compute the range-Doppler spectrum of a raw radarcube.
+
+        Args:
+            radar_cube (ndarray): (num_samples, num_chirps, num_rx, num_frames) raw radarcube as yielded by
+                DataHandling.raw_data_cube / raw_frames.
+
+        Returns:
+            fft2d_out (ndarray): (num_range_bins, num_doppler_bins, num_rx, num_frames) range-Doppler spectrum with the
+                Doppler axis fftshifted. The array is a transposed view of a C-contiguous
+                (num_frames, num_doppler_bins, num_rx, num_range_bins) array.
+
+        """
+        # (frames, chirps, rx, samples) is the memory order of the raw radarcube, so this is a view
+        fft2d_in = np.transpose(radar_cube, (3, 1, 2, 0))
+        if fft2d_in.dtype.names:
+            # IQ_INT16 pairs
+            iq = np.empty(fft2d_in.shape, dtype=self.dtype)
+            iq.real, iq.imag = fft2d_in['i'], fft2d_in['q']
+            fft2d_in = iq
+
+        # rfft only returns the non-negative frequencies of real input
+        real_input = not np.iscomplexobj(fft2d_in) and self.num_range_bins <= self.num_samples // 2 + 1
+
+        # (1) static clutter removal and windowing into a single working buffer
+        work_dtype = self.dtype.char.lower() if real_input else self.dtype
+        if self.clutter_removal_enabled:
+            fft2d_in = np.subtract(fft2d_in, fft2d_in.mean(axis=1, keepdims=True), dtype=work_dtype)
+            np.multiply(fft2d_in, self.window, out=fft2d_in)
+        else:
+            fft2d_in = np.multiply(fft2d_in, self.window, dtype=work_dtype)
+
+        # (2) range FFT along the contiguous axis (rfft for real ADC data returns the positive range bins directly)
+        if real_input:
+            fft1d_out = scipy.fft.rfft(fft2d_in, axis=3, workers=self.workers, overwrite_x=True)
+        else:
+            fft1d_out = scipy.fft.fft(fft2d_in, axis=3, workers=self.workers, overwrite_x=True)
+        fft1d_out = fft1d_out[..., :self.num_range_bins]
+
+        # (3) zero-padded Doppler FFT on the kept range bins
+        fft2d_out = scipy.fft.fft(fft1d_out, n=self.num_doppler_bins, axis=1, workers=self.workers,
+                                  overwrite_x=True)
+        if not self._shift_in_window:
+            fft2d_out = np.fft.fftshift(fft2d_out, axes=1)
+
+        return np.transpose(fft2d_out, (3, 1, 2, 0))
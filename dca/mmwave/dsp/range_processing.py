@@ -11,6 +11,8 @@
 # ==============================================================================
 
 import numpy as np
+import scipy.fft
+import scipy.signal
 from . import utils
 
 
@@ -58,15 +60,132 @@ def range_processing(adc_data, window_type_1d=None, axis=-1):
     else:
         fft1d_in = adc_data
 
-    # Note: np.fft.fft is a 1D operation, using higher dimension input defaults to slicing last axis for transformation
-    radar_cube = np.fft.fft(fft1d_in, axis=axis)
+    # Note: fft is a 1D operation, using higher dimension input defaults to slicing last axis for transformation.
+    # The windowed input is a temporary, so the FFT may reuse its memory.
+    radar_cube = scipy.fft.fft(fft1d_in, axis=axis, overwrite_x=fft1d_in is not adc_data)
 
     return radar_cube
 
 
-def zoom_range_processing(adc_data, low_freq, high_freq, fs, d, resample_number):
+class ZoomRangeFFT:
+    """Planned zoom FFT of a frequency (range) band over whole ADC cubes.
+
+    The engine is planned once for a (num_samples, low_freq, high_freq, fs, num_bins) configuration and then called on
+    every cube of that configuration. All chirps and receivers are transformed along the sample axis in one batched
+    call, the mixing phasor (and window) being cached in the engine. Two backends evaluate the spectrum on num_bins
+    frequencies F = fc + (k - num_bins // 2) * step around the band center fc:
+
+    1. 'fft': mix the band down to DC, low-pass filter and decimate by the zoom factor, then FFT the decimated
+       samples. The decimation factor is the largest divisor of num_samples keeping at least 2 * num_bins samples, so
+       the returned bins lie in the flat passband of the (cached) anti-aliasing filter. The resolution is the FFT
+       resolution, step = fs / num_samples, so the default num_bins covers the band. The filter makes the spectrum an
+       approximation of the DFT, out of band energy leaking in at the filter stopband attenuation (about -50 dB).
+    2. 'czt': chirp-Z transform evaluated on the band only, step = (high_freq - low_freq) / num_bins. More bins than the
+       default zoom in at a finer resolution than the FFT (interpolated spectrum).
+
+    With the default num_bins both backends return the same frequencies if the band spans a whole number of FFT bins.
+
+    Example:
+        >>> engine = ZoomRangeFFT(256, low_freq=2e5, high_freq=4e5, fs=2e6, backend='czt', num_bins=128)
+        >>> zoom_fft_out = engine(adc_data)  # (num_chirps_per_frame, num_rx_antennas, 128)
+        >>> engine.freqs  # frequencies of the zoomed bins
+
+    """
+
+    def __init__(self, num_samples, low_freq, high_freq, fs, num_bins=None, backend='fft', window_type_1d=None,
+                 dtype=np.complex64, workers=None):
+        """Plan the zoom FFT.
+
+        Args:
+            num_samples (int): Number of ADC samples per chirp.
+            low_freq (float): Lower bound of the frequency band to zoom on.
+            high_freq (float): Upper bound of the frequency band to zoom on.
+            fs (float): Sampling rate of the ADC samples.
+            num_bins (int): Number of zoomed bins. Defaults to the number of FFT bins in the band (rounded down).
+            backend (str): 'fft' (mix, decimate and FFT) or 'czt' (chirp-Z transform).
+            window_type_1d (mmwave.dsp.utils.Window): Optional window applied before the transform.
+            dtype (np.dtype): Complex dtype of the computation and output.
+            workers (int): Number of threads used by scipy.fft (None: single threaded, -1: all cores).
+
+        """
+        if low_freq < 0 or high_freq > fs or high_freq <= low_freq:
+            raise ValueError("invalid zoom band [{}, {}] for a sampling rate of {}".format(low_freq, high_freq, fs))
+        if backend not in ('fft', 'czt'):
+            raise ValueError("backend should be 'fft' or 'czt', got {}".format(backend))
+
+        self.num_samples = num_samples
+        self.fs = fs
+        self.backend = backend
+        self.dtype = np.dtype(dtype)
+        self.workers = workers
+        self.center_freq = (low_freq + high_freq) / 2
+        self.num_bins = num_bins or max(int(num_samples * (high_freq - low_freq) / fs), 1)
+        if backend == 'fft' and self.num_bins > num_samples:
+            raise ValueError("the fft backend cannot return more than num_samples bins, use the czt backend")
+
+        step = fs / num_samples if backend == 'fft' else (high_freq - low_freq) / self.num_bins
+        self.freqs = self.center_freq + (np.arange(self.num_bins) - self.num_bins // 2) * step
+
+        # Cached mixing phasor and window, as one vector applied to the sample axis
+        mix = np.exp(-2j * np.pi * self.center_freq / fs * np.arange(num_samples))
+        if window_type_1d:
+            mix *= utils.get_window(window_type_1d, num_samples)
+        self.phasor = mix.astype(self.dtype)
+
+        if backend == 'czt':
+            # Spectrum of the mixed signal at (k - num_bins // 2) * step
+            self._czt = scipy.signal.CZT(num_samples, self.num_bins, w=np.exp(-2j * np.pi * step / fs),
+                                         a=np.exp(-2j * np.pi * (self.num_bins // 2) * step / fs))
+        else:
+            # Decimate by the largest divisor of num_samples keeping 2 * num_bins samples
+            self.decimation = 1
+            for d in range(2, num_samples // (2 * self.num_bins) + 1):
+                if num_samples % d == 0:
+                    self.decimation = d
+            # Anti-aliasing filter, scaled so the short FFT matches the num_samples points DFT
+            if self.decimation > 1:
+                self._taps = self.decimation * scipy.signal.firwin(8 * self.decimation + 1, 1 / self.decimation,
+                                                                   window=('kaiser', 5.0))
+            self._bins = (np.arange(self.num_bins) - self.num_bins // 2) % (num_samples // self.decimation)
+
+    def __call__(self, adc_data, axis=-1):
+        """Compute the zoomed spectrum of every chirp and receiver.
+
+        Args:
+            adc_data (ndarray): ADC cube, e.g. (num_chirps_per_frame, num_rx_antennas, num_adc_samples).
+            axis (int): Sample axis of adc_data.
+
+        Returns:
+            zoom_fft_out (ndarray): Complex spectrum with the sample axis replaced by num_bins zoomed bins at freqs.
+
+        """
+        adc_data = np.moveaxis(adc_data, axis, -1)
+        if adc_data.shape[-1] != self.num_samples:
+            raise ValueError("expected {} samples, got {}".format(self.num_samples, adc_data.shape[-1]))
+
+        # (1) mix the band down to DC (and window) in one broadcast
+        mixed = np.multiply(adc_data, self.phasor, dtype=self.dtype)
+
+        # (2) batched transform along the sample axis
+        if self.backend == 'czt':
+            zoom_fft_out = self._czt(mixed, axis=-1).astype(self.dtype, copy=False)
+        else:
+            # (2a) low-pass filter and decimate, the chirp being periodically extended
+            if self.decimation > 1:
+                mixed = scipy.signal.resample_poly(mixed, 1, self.decimation, axis=-1, window=self._taps,
+                                                   padtype='wrap')
+            # (2b) short FFT of the decimated samples
+            zoom_fft_out = scipy.fft.fft(mixed, axis=-1, workers=self.workers, overwrite_x=True)[..., self._bins]
+            zoom_fft_out = zoom_fft_out.astype(self.dtype, copy=False)
+
+        return np.moveaxis(zoom_fft_out, -1, axis)
+
+
+def zoom_range_processing(adc_data, low_freq, high_freq, fs, d=None, resample_number=None, backend='fft'):
     """Perform ZoomFFT on complex-format ADC data in a user-defined frequency range.
 
+    All chirps and receivers are zoomed at once, see ZoomRangeFFT.
+
     Args:
         adc_data (ndarray): (num_chirps_per_frame, num_rx_antennas, num_adc_samples). Performed on each frame. adc_data
                             is in complex by default. Complex is float32/float32 by default.
@@ -75,24 +194,15 @@ def zoom_range_processing(adc_data, low_freq, high_freq, fs, d, resample_number)
         high_freq (int): a user-defined number which specifies the higher bound on the range of frequency spectrum which
                          the user would like to zoom on
         fs (int) : sampling rate of the original signal
-        d (int): Sample spacing (inverse of the sampling rate)
-        resample_number (int): The number of samples in the re-sampled signal.
+        d (int): Sample spacing (inverse of the sampling rate). Unused, fs defines the sampling.
+        resample_number (int): The number of samples in the re-sampled signal (number of zoomed bins).
+        backend (str): 'fft' or 'czt', see ZoomRangeFFT.
     
     Returns:
-        zoom_fft_spectrum (ndarray): (num_chirps_per_frame, num_rx_antennas, resample_number).
+        zoom_fft_spectrum (ndarray): (num_chirps_per_frame, num_rx_antennas, resample_number) magnitude spectrum.
     """
-    # adc_data shape: [num_chirps_per_frame, num_rx_antennas, num_range_bins]
-    num_chirps_per_frame = adc_data.shape[0]
-    num_rx_antennas = adc_data.shape[1]
-    # num_range_bins = adc_data.shape[2]
-
-    zoom_fft_spectrum = np.zeros(shape=(num_chirps_per_frame, num_rx_antennas, resample_number))
-
-    for i in range(num_chirps_per_frame):
-        for j in range(num_rx_antennas):
-            zoom_fft_inst = ZoomFFT.ZoomFFT(low_freq, high_freq, fs, adc_data[i, j, :])
-            zoom_fft_inst.compute_fft()
-            zoom_fft_spectrum[i, j, :] = zoom_fft_inst.compute_zoomfft()
+    engine = ZoomRangeFFT(adc_data.shape[-1], low_freq, high_freq, fs, num_bins=resample_number, backend=backend)
+    zoom_fft_spectrum = np.abs(engine(adc_data))
 
     return zoom_fft_spectrum
 
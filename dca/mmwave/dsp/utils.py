@@ -10,8 +10,10 @@
 # limitations under the License.
 # ==============================================================================
 
+import functools
 import numpy as np
 import scipy
+import scipy.signal
 
 try:
     from enum import Enum
@@ -45,7 +47,69 @@ PEAKVAL = 2
 
 MAX_OBJ_OUT = 100
 
-def windowing(input, window_type, axis=0):
+def window_coefficients(window_type, window_length):
+    """Generate the coefficients of the given window type.
+
+    Args:
+        window_type: enum chosen between barthann, bartlett, cosine, general_cosine, hamming and hann.
+
+        window_length: number of coefficients.
+
+    Returns:
+        window (ndarray): (window_length,) window coefficients.
+
+    """
+    HFT90D = [1, 1.942604, 1.340318, 0.440811, 0.043097]
+    if window_type == Window.barthann:
+        window = scipy.signal.windows.barthann(window_length)
+    elif window_type == Window.bartlett:
+        window = scipy.signal.windows.bartlett(window_length)
+    elif window_type == Window.cosine:
+        window = scipy.signal.windows.cosine(window_length )
+    elif window_type == Window.general_cosine:
+        window = scipy.signal.windows.general_cosine(window_length, HFT90D)
+    elif window_type == Window.hamming:
+        window = scipy.signal.windows.hamming(window_length)
+    elif window_type == Window.hann:
+        window = scipy.signal.windows.hann(window_length)
+    else:
+        raise ValueError("The specified window is not supported!!!")
+
+    return window
+
+@functools.lru_cache(maxsize=128)
+def _window_tensor(window_type, window_length, dtype, axis, ndim):
+    window_dims = np.ones(ndim, dtype=int)
+    window_dims[axis] = window_length
+    window = window_coefficients(window_type, window_length).astype(dtype).reshape(tuple(window_dims))
+    window.setflags(write=False)
+    return window
+
+def get_window(window_type, window_length, dtype=np.float64, axis=0, ndim=1):
+    """Cached window coefficients shaped to broadcast along one axis of an ndim array.
+
+    Windows are synthesized once per (window type, length, dtype, axis, ndim) and shared afterwards, so the returned
+    array is read-only.
+
+    Args:
+        window_type: enum chosen between barthann, bartlett, cosine, general_cosine, hamming and hann.
+
+        window_length: number of coefficients.
+
+        dtype: real dtype of the coefficients (use float32 for complex64 data to keep the product in single precision).
+
+        axis: the axis of the windowed array the coefficients lie along.
+
+        ndim: number of dimensions of the windowed array.
+
+    Returns:
+        window (ndarray): read-only coefficients of shape (1, .., window_length, .., 1).
+
+    """
+    axis = axis % ndim
+    return _window_tensor(window_type, window_length, np.dtype(dtype), axis, ndim)
+
+def windowing(input, window_type, axis=0, out=None):
     """Window the input based on given window type.
 
     Args:
@@ -54,6 +118,8 @@ def windowing(input, window_type, axis=0):
         window_type: enum chosen between Bartlett, Blackman, Hamming, Hanning and Kaiser.
 
         axis: the axis along which the windowing will be applied.
+
+        out: optional array the windowed input is written to (may be the input itself for in-place windowing).
     
     Returns:
 
@@ -74,28 +140,12 @@ def windowing(input, window_type, axis=0):
     else:
         raise ValueError("The specified window is not supported!!!")
     '''
-    HFT90D = [1, 1.942604, 1.340318, 0.440811, 0.043097]
-    window_length = input.shape[axis]
-    if window_type == Window.barthann:
-        window = scipy.signal.windows.barthann(window_length)
-    elif window_type == Window.bartlett:
-        window = scipy.signal.windows.bartlett(window_length)
-    elif window_type == Window.cosine:
-        window = scipy.signal.windows.cosine(window_length )
-    elif window_type == Window.general_cosine:
-        window = scipy.signal.windows.general_cosine(window_length, HFT90D)
-    elif window_type == Window.hamming:
-        window = scipy.signal.windows.hamming(window_length)
-    elif window_type == Window.hann:
-        window = scipy.signal.windows.hann(window_length)
-    else:
-        raise ValueError("The specified window is not supported!!!")
+    # cached window reshaped along axis, in the precision of the input (float32 for complex64/float32 input)
+    window_dtype = np.float32 if np.asarray(input).dtype in (np.float32, np.complex64) else np.float64
+    window = get_window(window_type, input.shape[axis], window_dtype, axis, np.ndim(input))
 
     # output = input * window
-    window_dims = np.ones((np.ndim(input)), dtype=int)
-    window_dims[0] = window_length
-    output = input * window.reshape(tuple(window_dims))
-    return output
+    return np.multiply(input, window, out=out)
 
 def XYestimation(azimuthMagSqr,
                  numAngleBins,
@@ -0,0 +1,160 @@
+# Copyright 2019 The OpenRadar Authors. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from mmwave.dataloader import adc
+from mmwave.dataloader.adc import DCA1000
+
+PACKET_SIZE = 100   # payload bytes per packet
+FRAME_SIZE = 400    # bytes per frame
+
+
+class FakeSocket:
+    """Data socket replaying the given packets, then timing out like an idle DCA1000."""
+
+    def __init__(self, packets):
+        self.packets = list(packets)
+
+    def setsockopt(self, *args):
+        pass
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv_into(self, buffer):
+        if not self.packets:
+            time.sleep(0.01)
+            raise socket.timeout()
+        packet = self.packets.pop(0)
+        buffer[:len(packet)] = packet
+        return len(packet)
+
+
+def make_packet(stream, packet_num, packet_size=PACKET_SIZE):
+    """Packet packet_num (1-based) of the byte stream, with the DCA1000 sequence number and byte count header."""
+    byte_count = (packet_num - 1) * packet_size
+    return (packet_num.to_bytes(4, 'little') + byte_count.to_bytes(6, 'little') +
+            stream[byte_count:byte_count + packet_size].tobytes())
+
+
+def receive(stream, packet_order, num_slots=4, reorder_frames=2):
+    """Run the receiver over the packets in the given order, then stop it."""
+    dca = DCA1000.__new__(DCA1000)   # no sockets bound to the DCA1000 addresses
+    dca.data_socket = FakeSocket(make_packet(stream, packet_num) for packet_num in packet_order)
+    dca._receiver = None
+    dca._receiver_stop = threading.Event()
+
+    dca.start_receiver(num_slots=num_slots, reorder_frames=reorder_frames, bytes_in_frame=FRAME_SIZE)
+    while dca.data_socket.packets:
+        time.sleep(0.01)
+    dca.stop_receiver()
+    return dca
+
+
+@pytest.fixture
+def stream():
+    return np.random.default_rng(0).integers(1, 256, size=4 * FRAME_SIZE, dtype=np.uint8)
+
+
+def test_duplicate_packets_are_dropped(stream):
+    dca = receive(stream, [1, 2, 2, 3, 4, 5, 6, 7, 8])
+
+    frame = dca.read_frame()
+    assert dca.frame_num == 0 and dca.lost_packets == 0
+    np.testing.assert_array_equal(frame.view(np.uint8), stream[:FRAME_SIZE])
+    assert dca.stream_stats['duplicate_packets'] == 1
+    assert dca.stream_stats['lost_packets'] == 0
+    assert dca.stream_stats['late_packets'] == 0
+
+
+def test_reordered_and_lost_packets(stream):
+    # packet 3 arrives late, packet 6 never, packet 3 is then duplicated after its frame was published
+    dca = receive(stream, [1, 2, 4, 3, 5, 7, 8, 9, 10, 11, 12, 13, 3])
+
+    frame = dca.read_frame()
+    assert dca.frame_num == 0 and dca.lost_packets == 0
+    np.testing.assert_array_equal(frame.view(np.uint8), stream[:FRAME_SIZE])
+
+    frame = dca.read_frame()
+    assert dca.frame_num == 1 and dca.lost_packets == 1
+    expected = stream[FRAME_SIZE:2 * FRAME_SIZE].copy()
+    expected[PACKET_SIZE:2 * PACKET_SIZE] = 0
+    np.testing.assert_array_equal(frame.view(np.uint8), expected)
+
+    stats = dca.stream_stats
+    assert (stats['lost_packets'], stats['reordered_packets'], stats['duplicate_packets']) == (1, 1, 1)
+
+
+def test_read_frame_overrun_while_copying(stream):
+    dca = receive(stream, range(1, 9))
+
+    # the receiver reuses the slot of frame 0 while the reader copies it
+    reused = []
+
+    class ReusedRing(np.ndarray):
+        def __getitem__(self, index):
+            data = np.ndarray.__getitem__(self, index)
+            if index == 0 and not reused:
+                reused.append(0)
+                dca._reset_slot(0, dca._slot_frame[0] + 4)
+            return data
+
+    dca.ring_buffer = dca.ring_buffer.view(ReusedRing)
+    frame = dca.read_frame()
+    assert dca.stream_stats['overrun_frames'] == 1
+    assert dca.frame_num == 1
+    np.testing.assert_array_equal(frame.view(np.uint8), stream[FRAME_SIZE:2 * FRAME_SIZE])
+
+
+def test_reset_slot_marks_frame_before_clearing(stream):
+    dca = receive(stream, range(1, 5))
+    marks = []
+
+    class RecordingRing(np.ndarray):
+        def fill(self, value):
+            marks.append(int(dca._slot_frame[0]))
+            np.ndarray.fill(self, value)
+
+    dca.ring_buffer = dca.ring_buffer.view(RecordingRing)
+    dca._reset_slot(0, 4)
+    assert marks == [4]
+    assert not dca.ring_buffer[0].any()
+
+
+class FakeDataSocket(FakeSocket):
+    """Data socket replaying the given packets to DCA1000.read."""
+
+    def recvfrom(self, size):
+        if not self.packets:
+            raise socket.timeout()
+        return self.packets.pop(0), ('192.168.33.180', 4098)
+
+
+def test_read_drops_duplicate_packets():
+    stream = np.random.default_rng(1).integers(1, 256, size=2 * adc.BYTES_IN_FRAME, dtype=np.uint8)
+    num_packets = -(-adc.BYTES_IN_FRAME // adc.BYTES_IN_PACKET) + 1
+    packet_order = [1, 2, 2, 3, 3] + list(range(4, num_packets + 1))
+
+    dca = DCA1000.__new__(DCA1000)
+    dca.data_socket = FakeDataSocket(make_packet(stream, packet_num, adc.BYTES_IN_PACKET) for packet_num in packet_order)
+    dca._pending_packets = []
+    dca._packet_buffer = None
+
+    frame = dca.read()
+    assert dca.lost_packets == 0 and dca.frame_valid
+    np.testing.assert_array_equal(frame.view(np.uint8), stream[:adc.BYTES_IN_FRAME])
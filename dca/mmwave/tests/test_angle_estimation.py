@@ -0,0 +1,318 @@
+# Copyright 2019 The OpenRadar Authors. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import pytest
+
+from mmwave.dsp import angle_estimation
+
+
+@pytest.fixture
+def boresight_detections():
+    """Three detections of targets at boresight on the 12 virtual antennas of the xWR1843."""
+    return np.ones((3, 12), dtype=np.complex64) * np.array([1, 2, 3])[:, None]
+
+
+@pytest.mark.parametrize('method', ['Capon', 'Bartlett'])
+def test_beamforming_naive_mixed_xyz(boresight_detections, method):
+    phi, theta, ranges, xyz_vec = angle_estimation.beamforming_naive_mixed_xyz(
+        boresight_detections, np.array([10, 20, 30]), 0.1, method=method)
+
+    np.testing.assert_array_equal(ranges, [10, 20, 30])
+    np.testing.assert_allclose(theta, 0, atol=1e-6)
+    np.testing.assert_allclose(phi, 0, atol=1e-6)
+    np.testing.assert_allclose(xyz_vec[1], [1, 2, 3], rtol=1e-6)
+
+
+@pytest.mark.parametrize('method', ['capon', 'MUSIC', None])
+def test_beamforming_naive_mixed_xyz_unknown_method(boresight_detections, method):
+    with pytest.raises(ValueError):
+        angle_estimation.beamforming_naive_mixed_xyz(boresight_detections, np.array([10, 20, 30]), 0.1, method=method)
+
+
+def peak_search_full_loop(doa_spectrum, gamma=1.2, peak_threshold_weight=0.251188643150958):
+    """Previous per-bin peak_search_full (peaks collected in a list instead of a fixed array of 4)."""
+    ang_est = []
+    peak_threshold = max(doa_spectrum) * peak_threshold_weight
+    steering_vec_size = len(doa_spectrum)
+    running_idx = 0
+    extend_loc = 0
+    init_stage = True
+    max_val = 0
+    min_val = np.inf
+    max_loc = 0
+    locate_max = False
+
+    while running_idx < (steering_vec_size + extend_loc):
+        local_index = running_idx - steering_vec_size if running_idx >= steering_vec_size else running_idx
+        current_val = doa_spectrum[local_index]
+        if current_val > max_val:
+            max_val = current_val
+            max_loc = local_index
+        if current_val < min_val:
+            min_val = current_val
+
+        if locate_max:
+            if current_val < max_val / gamma:
+                if max_val >= peak_threshold:
+                    ang_est.append(max_loc)
+                min_val = current_val
+                locate_max = False
+        else:
+            if current_val > min_val * gamma:
+                locate_max = True
+                max_val = current_val
+                if init_stage:
+                    extend_loc = running_idx
+                    init_stage = False
+        running_idx += 1
+
+    return ang_est
+
+
+def peak_search_full_variance_loop(doa_spectrum, steering_vec_size, sidelobe_level=0.251188643150958, gamma=1.2):
+    """Previous per-bin peak_search_full_variance, returning (peakLoc, peakVal, peakWid) tuples and the total power."""
+    peak_threshold = max(doa_spectrum) * sidelobe_level
+    running_index = 0
+    extend_loc = 0
+    init_stage = True
+    max_val = 0
+    total_power = 0
+    max_loc = 0
+    max_loc_r = 0
+    min_val = np.inf
+    locate_max = False
+    peak_data = []
+
+    while running_index < (steering_vec_size + extend_loc):
+        local_index = running_index - steering_vec_size if running_index >= steering_vec_size else running_index
+        current_val = doa_spectrum[local_index]
+        if current_val > max_val:
+            max_val = current_val
+            max_loc = local_index
+            max_loc_r = running_index
+        if current_val < min_val:
+            min_val = current_val
+
+        if locate_max:
+            if current_val < max_val / gamma:
+                if max_val > peak_threshold:
+                    peak_data.append((max_loc, max_val, running_index - max_loc_r))
+                    total_power += max_val
+                min_val = current_val
+                locate_max = False
+        else:
+            if current_val > min_val * gamma:
+                locate_max = True
+                max_val = current_val
+                if init_stage:
+                    extend_loc = running_index
+                    init_stage = False
+        running_index += 1
+
+    return peak_data, total_power
+
+
+@pytest.fixture
+def spectra():
+    """Integer spectra with maximum 8, so with sidelobe level 0.5 many maxima are equal to the threshold."""
+    spectra = np.random.default_rng(0).integers(1, 5, size=(200, 24)).astype(np.float64)
+    spectra[:, 0] = 8
+    return spectra
+
+
+def test_peak_search_full_matches_previous_loop(spectra):
+    for spectrum in spectra:
+        num_max, ang_est = angle_estimation.peak_search_full(spectrum, peak_threshold_weight=0.5)
+        assert list(ang_est[:num_max]) == peak_search_full_loop(spectrum, peak_threshold_weight=0.5)
+
+
+@pytest.mark.parametrize('steering_vec_size', [24, 16])
+def test_peak_search_full_variance_matches_previous_loop(spectra, steering_vec_size):
+    # with steering_vec_size 16 the maximum of some spectra lies beyond the searched bins
+    spectra = np.roll(spectra, 20, axis=1)
+    for spectrum in spectra:
+        peak_data, total_power = angle_estimation.peak_search_full_variance(spectrum, steering_vec_size, 0.5)
+        ref_peak_data, ref_total_power = peak_search_full_variance_loop(spectrum, steering_vec_size, 0.5)
+
+        assert [tuple(peak) for peak in peak_data.tolist()] == ref_peak_data
+        assert total_power == ref_total_power
+
+
+def test_peak_search_batch_thresholds(spectra):
+    peaks = angle_estimation.peak_search_batch(spectra, sidelobe_level=0.5)
+    strict = angle_estimation.peak_search_batch(spectra, sidelobe_level=0.5, strict_threshold=True)
+    fields = ['detIdx', 'peakLoc', 'peakVal', 'peakWid']     # peakVar depends on the power of the kept peaks
+    assert np.any(peaks['peakVal'] == 4)
+    np.testing.assert_array_equal(strict[fields], peaks[peaks['peakVal'] > 4][fields])
+
+    absolute = angle_estimation.peak_search_batch(spectra, peak_threshold=np.full(spectra.shape[0], 4.0))
+    np.testing.assert_array_equal(absolute, peaks)
+
+
+def forward_backward_avg_exchange(Rxx):
+    """Previous forward_backward_avg of a single matrix, with the exchange matrix J."""
+    J = np.fliplr(np.eye(Rxx.shape[0]))
+    return 0.5 * (Rxx + J @ np.conjugate(Rxx) @ J)
+
+
+@pytest.fixture
+def snapshots():
+    """(num_detections, num_ant, num_chirps) complex snapshots."""
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(5, 8, 32)) + 1j * rng.normal(size=(5, 8, 32))
+
+
+@pytest.fixture
+def steering_vec():
+    return angle_estimation.gen_steering_vec(60, 2, 8, dtype=np.complex128)[1]
+
+
+def test_forward_backward_avg_stack(snapshots):
+    Rxx = np.einsum('dvt,dwt->dvw', snapshots, snapshots.conj())
+    R_fb = angle_estimation.forward_backward_avg(Rxx)
+
+    for d in range(Rxx.shape[0]):
+        np.testing.assert_allclose(R_fb[d], forward_backward_avg_exchange(Rxx[d]), rtol=1e-12)
+        np.testing.assert_allclose(angle_estimation.forward_backward_avg(Rxx[d]), R_fb[d], rtol=1e-12)
+
+
+def test_aoa_bartlett_batch_matches_per_detection(snapshots, steering_vec):
+    doa_spectrum = angle_estimation.aoa_bartlett_batch(steering_vec, snapshots)
+    for d, x in enumerate(snapshots):
+        expected = angle_estimation.aoa_bartlett(steering_vec, x, axis=0).mean(axis=1)
+        np.testing.assert_allclose(doa_spectrum[d], expected, rtol=1e-10)
+
+    # single snapshots
+    np.testing.assert_allclose(angle_estimation.aoa_bartlett_batch(steering_vec, snapshots[:, :, 0]),
+                               np.abs(snapshots[:, :, 0] @ steering_vec.conj().T) ** 2, rtol=1e-10)
+
+
+def test_aoa_capon_batch_matches_per_detection(snapshots, steering_vec):
+    den, weights = angle_estimation.aoa_capon_batch(snapshots, steering_vec, diag_load=0)
+    for d, x in enumerate(snapshots):
+        expected_den, expected_weights = angle_estimation.aoa_capon(x, steering_vec)
+        np.testing.assert_allclose(den[d], expected_den, rtol=1e-8)
+        # aoa_capon sums the weights of all thetas
+        np.testing.assert_allclose(weights[d].sum(axis=1), expected_weights, rtol=1e-8)
+
+    magnitude, _ = angle_estimation.aoa_capon_batch(snapshots, steering_vec, magnitude=True, diag_load=0)
+    np.testing.assert_allclose(magnitude, np.abs(den))
+
+
+def test_aoa_capon_batch_diagonal_loading(snapshots, steering_vec):
+    # a single snapshot has a singular covariance, the loading keeps it invertible
+    x = snapshots[:, :, 0]
+    den, weights = angle_estimation.aoa_capon_batch(x, steering_vec, diag_load=1e-2)
+
+    for d in range(x.shape[0]):
+        Rxx = forward_backward_avg_exchange(np.outer(x[d], x[d].conj()))
+        Rxx += 1e-2 * np.trace(Rxx).real / 8 * np.eye(8)
+        first = np.linalg.inv(Rxx) @ steering_vec.T
+        expected_den = 1 / np.einsum('pv,vp->p', steering_vec.conj(), first)
+        np.testing.assert_allclose(den[d], expected_den, rtol=1e-8)
+        np.testing.assert_allclose(weights[d], first * expected_den, rtol=1e-8)
+
+
+# Fixed spectra and the outputs of the per-bin searches before peak_search_batch, with sidelobe level 0.5. Peaks equal
+# to the threshold (4 in the second spectrum) are kept by peak_search_full only, and the last spectrum peaks across the
+# wrap around.
+FIXED_SPECTRA = np.array([[1, 3, 8, 3, 1, 4, 4.5, 1, 2, 6, 2, 1, 4, 1, 2],
+                          [2, 1, 4, 1, 8, 1, 4, 4, 1, 3, 1, 5, 1, 1, 2],
+                          [5, 1, 1, 1, 1, 1, 2, 1, 1, 1, 1, 1, 1, 1, 6]])
+PREVIOUS_ANG_EST = [[2, 6, 9, 9], [2, 4, 4, 11], [14]]
+PREVIOUS_PEAK_DATA = [[(2, 8.0, 1, 0.05376453), (6, 4.5, 1, 0.07168604), (9, 6.0, 1, 0.06208194)],
+                      [(4, 8.0, 1, 0.04506939), (11, 5.0, 1, 0.05700877)],
+                      [(14, 6.0, 2, 0.07071068)]]
+# peak_search_full_variance with steering_vec_size 10
+PREVIOUS_PEAK_DATA_10 = [[(2, 8.0, 1), (6, 4.5, 1), (9, 6.0, 1)], [(4, 8.0, 1)], [(0, 5.0, 1)]]
+
+
+def split_peaks(peaks, fields):
+    return [[tuple(peak) for peak in peaks[peaks['detIdx'] == det_idx][fields].tolist()]
+            for det_idx in range(FIXED_SPECTRA.shape[0])]
+
+
+def test_peak_search_previous_outputs():
+    for spectrum, ang_est, peak_data, peak_data_10 in zip(FIXED_SPECTRA, PREVIOUS_ANG_EST, PREVIOUS_PEAK_DATA,
+                                                          PREVIOUS_PEAK_DATA_10):
+        num_max, out = angle_estimation.peak_search_full(spectrum, peak_threshold_weight=0.5)
+        assert list(out[:num_max]) == ang_est
+
+        out, total_power = angle_estimation.peak_search_full_variance(spectrum, 15, 0.5)
+        assert [tuple(peak) for peak in out.tolist()] == [peak[:3] for peak in peak_data]
+        np.testing.assert_allclose(angle_estimation.variance_estimation(len(out), 1, out, total_power),
+                                   [peak[3] for peak in peak_data], rtol=1e-6)
+
+        out, _ = angle_estimation.peak_search_full_variance(spectrum, 10, 0.5)
+        assert [tuple(peak) for peak in out.tolist()] == peak_data_10
+
+
+def test_peak_search_batch_previous_outputs():
+    peaks = angle_estimation.peak_search_batch(FIXED_SPECTRA, sidelobe_level=0.5)
+    assert [[loc for loc, in det] for det in split_peaks(peaks, ['peakLoc'])] == PREVIOUS_ANG_EST
+
+    strict = angle_estimation.peak_search_batch(FIXED_SPECTRA, sidelobe_level=0.5, strict_threshold=True)
+    assert split_peaks(strict, ['peakLoc', 'peakVal', 'peakWid']) == [[peak[:3] for peak in det]
+                                                                      for det in PREVIOUS_PEAK_DATA]
+    np.testing.assert_allclose(strict['peakVar'], [peak[3] for det in PREVIOUS_PEAK_DATA for peak in det], rtol=1e-6)
+
+    # absolute thresholds: equal to sidelobe_level times the maximum, or of the whole spectrum for a searched part
+    absolute = angle_estimation.peak_search_batch(FIXED_SPECTRA, peak_threshold=[4, 4, 3])
+    np.testing.assert_array_equal(absolute, peaks)
+    partial = angle_estimation.peak_search_batch(FIXED_SPECTRA[:, :10], peak_threshold=FIXED_SPECTRA.max(axis=1) * 0.5,
+                                                 strict_threshold=True)
+    assert split_peaks(partial, ['peakLoc', 'peakVal', 'peakWid']) == PREVIOUS_PEAK_DATA_10
+
+
+def steering_vec_loop(ang_est_range, ang_est_resolution, ant_positions, elevation=0):
+    """Previous element by element gen_steering_vec, extended to (azimuth, elevation) antenna positions."""
+    num_vec = int(round(2 * ang_est_range / ang_est_resolution + 1))
+    steering_vectors = np.zeros((num_vec, len(ant_positions)), dtype='complex64')
+    phi = elevation * np.pi / 180
+    for kk in range(num_vec):
+        theta = (-ang_est_range + kk * ang_est_resolution) * np.pi / 180
+        for jj, (x, z) in enumerate(ant_positions):
+            mag = -1 * np.pi * (x * np.sin(theta) * np.cos(phi) + z * np.sin(phi))
+            steering_vectors[kk, jj] = complex(np.cos(mag), np.sin(mag))
+    return num_vec, steering_vectors
+
+
+def test_gen_steering_vec_matches_previous_loop(tmp_path):
+    ula = [(jj, 0) for jj in range(4)]
+    planar = [(0, 0), (1, 0), (2, 1), (3, 1)]
+
+    num_vec, steering_vec = angle_estimation.gen_steering_vec(90, 1, 4)
+    ref_num_vec, ref = steering_vec_loop(90, 1, ula)
+    assert num_vec == ref_num_vec
+    np.testing.assert_allclose(steering_vec, ref, atol=1e-6)
+
+    _, steering_vec = angle_estimation.gen_steering_vec(60, 0.5, 4, ant_positions=[0, 1, 2, 3])
+    np.testing.assert_allclose(steering_vec, steering_vec_loop(60, 0.5, ula)[1], atol=1e-6)
+
+    _, steering_vec = angle_estimation.gen_steering_vec(60, 2, 4, ant_positions=planar, elevation=20)
+    np.testing.assert_allclose(steering_vec, steering_vec_loop(60, 2, planar, elevation=20)[1], atol=1e-6)
+
+    # persisted, and loaded back by a fresh process (empty in-memory cache)
+    _, cached = angle_estimation.gen_steering_vec(60, 2, 4, ant_positions=planar, elevation=20, cache_dir=str(tmp_path))
+    assert [f.suffix for f in tmp_path.iterdir()] == ['.npy']
+    angle_estimation._steering_matrix.cache_clear()
+    _, loaded = angle_estimation.gen_steering_vec(60, 2, 4, ant_positions=planar, elevation=20, cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(loaded, cached)
+    np.testing.assert_allclose(loaded, steering_vec_loop(60, 2, planar, elevation=20)[1], atol=1e-6)
+
+
+def test_gen_steering_vec_returns_copies():
+    _, steering_vec = angle_estimation.gen_steering_vec(90, 1, 4)
+    steering_vec[0] = 0
+    _, steering_vec = angle_estimation.gen_steering_vec(90, 1, 4)
+    np.testing.assert_allclose(steering_vec, steering_vec_loop(90, 1, [(jj, 0) for jj in range(4)])[1], atol=1e-6)
@@ -0,0 +1,189 @@
+# Copyright 2019 The OpenRadar Authors. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import pytest
+
+from mmwave.dsp import cfar
+
+
+def os_loop(x, guard_len=0, noise_len=8, k=12, scale=1.0):
+    """Previous OS-CFAR implementation (see cfar_benchmark.py), exact for guard_len=0."""
+    n = len(x)
+    noise_floor = np.zeros(n)
+    threshold = np.zeros(n, dtype=np.float32)
+    cut_idx = -1
+
+    left_idx = list(np.arange(n - noise_len - guard_len - 1, n - guard_len - 1))
+    right_idx = list(np.arange(guard_len, guard_len + noise_len))
+
+    while cut_idx < (n - 1):
+        cut_idx += 1
+
+        left_idx.pop(0)
+        left_idx.append((cut_idx - 1) % n)
+
+        right_idx.pop(0)
+        right_idx.append((cut_idx + guard_len + noise_len) % n)
+
+        window = np.concatenate((x[left_idx], x[right_idx]))
+        window.partition(k)
+        noise_floor[cut_idx] = window[k]
+        threshold[cut_idx] = noise_floor[cut_idx] * scale
+
+    return threshold, noise_floor
+
+
+def training_cells_1d(x, cut_idx, guard_len, noise_len):
+    """Training cells of a CUT of a wrapped 1D signal."""
+    n = len(x)
+    left = [(cut_idx - guard_len - i) % n for i in range(noise_len, 0, -1)]
+    right = [(cut_idx + guard_len + i) % n for i in range(1, noise_len + 1)]
+    return x[left + right]
+
+
+def training_cells_2d(rd_map, cut, guard_len, noise_len, mode):
+    """Training cells of a CUT of a map: the outer rectangle minus the guard rectangle, outside cells wrapped or 0."""
+    cells = []
+    for dr in range(-guard_len[0] - noise_len[0], guard_len[0] + noise_len[0] + 1):
+        for dd in range(-guard_len[1] - noise_len[1], guard_len[1] + noise_len[1] + 1):
+            if abs(dr) <= guard_len[0] and abs(dd) <= guard_len[1]:
+                continue
+            idx = [cut[0] + dr, cut[1] + dd]
+            inside = True
+            for axis in range(2):
+                if mode[axis] == 'wrap':
+                    idx[axis] %= rd_map.shape[axis]
+                inside &= 0 <= idx[axis] < rd_map.shape[axis]
+            cells.append(rd_map[tuple(idx)] if inside else 0)
+    return np.array(cells, dtype=np.float64)
+
+
+@pytest.fixture
+def rd_maps():
+    return np.random.default_rng(0).integers(0, 1000, size=(2, 12, 16)).astype(np.float64)
+
+
+def test_os_matches_previous_loop(rd_maps):
+    for signal in rd_maps[0]:
+        threshold, noise_floor = cfar.os_(signal, guard_len=0, noise_len=4, k=5, scale=1.5)
+        ref_threshold, ref_noise_floor = os_loop(signal, guard_len=0, noise_len=4, k=5, scale=1.5)
+        np.testing.assert_array_equal(noise_floor, ref_noise_floor)
+        np.testing.assert_array_equal(threshold, ref_threshold)
+
+
+@pytest.mark.parametrize('guard_len, noise_len, k', [(0, 3, 2), (2, 3, 4), (1, 5, 9)])
+def test_os_brute_force(rd_maps, guard_len, noise_len, k):
+    threshold, noise_floor = cfar.os_(rd_maps, guard_len=guard_len, noise_len=noise_len, k=k, scale=1.5, axis=1)
+
+    for frame_idx in range(rd_maps.shape[0]):
+        for doppler_idx in range(rd_maps.shape[2]):
+            signal = rd_maps[frame_idx, :, doppler_idx]
+            for range_idx in range(signal.size):
+                expected = np.sort(training_cells_1d(signal, range_idx, guard_len, noise_len))[k]
+                assert noise_floor[frame_idx, range_idx, doppler_idx] == expected
+    np.testing.assert_array_equal(threshold, (noise_floor * 1.5).astype(np.float32))
+
+
+@pytest.mark.parametrize('guard_len, noise_len, mode', [
+    ((1, 1), (1, 2), 'wrap'), ((0, 2), (2, 1), 'constant'), ((1, 0), (1, 3), ('constant', 'wrap'))])
+def test_os_2d_brute_force(rd_maps, guard_len, noise_len, mode):
+    mode_pair = (mode, mode) if isinstance(mode, str) else mode
+    threshold, noise_floor = cfar.os_2d_(rd_maps, guard_len=guard_len, noise_len=noise_len, k=3, scale=2.0, mode=mode)
+
+    for frame_idx, rd_map in enumerate(rd_maps):
+        for cut in np.ndindex(rd_map.shape):
+            expected = np.sort(training_cells_2d(rd_map, cut, guard_len, noise_len, mode_pair))[3]
+            assert noise_floor[frame_idx][cut] == expected
+    np.testing.assert_array_equal(threshold, noise_floor * 2.0)
+
+
+@pytest.mark.parametrize('guard_len, noise_len, mode', [
+    ((1, 1), (1, 2), 'wrap'), ((0, 2), (2, 1), 'constant'), ((1, 0), (1, 3), ('constant', 'wrap'))])
+def test_ca_2d_brute_force(rd_maps, guard_len, noise_len, mode):
+    mode_pair = (mode, mode) if isinstance(mode, str) else mode
+    threshold, noise_floor = cfar.ca_2d_(rd_maps, guard_len=guard_len, noise_len=noise_len, mode=mode, l_bound=10)
+
+    for frame_idx, rd_map in enumerate(rd_maps):
+        for cut in np.ndindex(rd_map.shape):
+            expected = training_cells_2d(rd_map, cut, guard_len, noise_len, mode_pair).mean()
+            assert noise_floor[frame_idx][cut] == pytest.approx(expected)
+    np.testing.assert_allclose(threshold, noise_floor + 10)
+
+
+@pytest.mark.parametrize('cfar_type, kwargs', [('ca', {'l_bound': 200}), ('os', {'k': 6, 'scale': 1.3})])
+def test_cfar_2d_detection_list(rd_maps, cfar_type, kwargs):
+    det = cfar.cfar_2d(rd_maps, cfar_type=cfar_type, guard_len=1, noise_len=(1, 2), **kwargs)
+    threshold, noise_floor = getattr(cfar, cfar_type + '_2d_')(rd_maps, guard_len=1, noise_len=(1, 2), **kwargs)
+
+    expected = np.argwhere(rd_maps > threshold)
+    np.testing.assert_array_equal(np.stack([det['frame_idx'], det['range_idx'], det['doppler_idx']], axis=1), expected)
+    np.testing.assert_array_equal(det['peakVal'], rd_maps[tuple(expected.T)])
+    np.testing.assert_allclose(det['snr'], (rd_maps - noise_floor)[tuple(expected.T)], rtol=1e-6)
+
+
+def test_cfar_2d_unknown_type(rd_maps):
+    with pytest.raises(ValueError):
+        cfar.cfar_2d(rd_maps, cfar_type='go')
+
+
+def grouping_reference(det, num_doppler_bins, max_range_idx, min_range_idx, group_doppler, group_range):
+    """Per detection walk of peak_grouping_qualified: neighbors are the detections of the same frame."""
+    peaks = {(d['frame_idx'], d['range_idx'], d['doppler_idx'] % num_doppler_bins): d['peakVal'] for d in det}
+    keep = []
+    for d in det:
+        frame_idx, range_idx, doppler_idx = d['frame_idx'], d['range_idx'], d['doppler_idx'] % num_doppler_bins
+        kept = min_range_idx <= range_idx <= max_range_idx
+        for dr in ([-1, 0, 1] if group_range else [0]):
+            for dd in ([-1, 0, 1] if group_doppler else [0]):
+                if not min_range_idx <= range_idx + dr <= max_range_idx:
+                    continue
+                kept &= peaks.get((frame_idx, range_idx + dr, (doppler_idx + dd) % num_doppler_bins), 0) <= \
+                    peaks[(frame_idx, range_idx, doppler_idx)]
+        keep.append(kept)
+    return det[np.array(keep, dtype=bool)]
+
+
+@pytest.mark.parametrize('group_doppler, group_range', [(1, 1), (1, 0), (0, 1), (0, 0)])
+def test_peak_grouping_qualified_per_frame(rd_maps, group_doppler, group_range):
+    det = cfar.cfar_2d(rd_maps, cfar_type='ca', guard_len=0, noise_len=1, l_bound=0)
+    assert np.unique(det['frame_idx']).size == 2
+
+    out = cfar.peak_grouping_qualified(det, 16, 10, 1, group_doppler, group_range)
+    np.testing.assert_array_equal(out, grouping_reference(det, 16, 10, 1, group_doppler, group_range))
+
+
+def test_peak_grouping_qualified_ignores_other_frames():
+    # the same cell and its neighbor detected in two frames: each frame is grouped on its own
+    det = np.zeros(4, dtype=[('frame_idx', np.int32), ('range_idx', np.int32), ('doppler_idx', np.int32),
+                             ('peakVal', np.float64), ('snr', np.float32)])
+    det['frame_idx'] = [0, 0, 1, 1]
+    det['range_idx'] = [5, 5, 5, 6]
+    det['doppler_idx'] = [3, 4, 3, 3]
+    det['peakVal'] = [10, 20, 30, 5]
+
+    out = cfar.peak_grouping_qualified(det, 16, 10, 1, 1, 1)
+    np.testing.assert_array_equal(out, det[[1, 2]])
+
+
+def test_peak_grouping_qualified_late_frames():
+    # frame numbers of a long capture: the grouping must not depend on their value
+    det = cfar.cfar_2d(np.random.default_rng(0).integers(0, 1000, size=(2, 12, 16)).astype(np.float64),
+                       cfar_type='ca', guard_len=0, noise_len=1, l_bound=0)
+    late = det.copy()
+    late['frame_idx'] = np.where(det['frame_idx'] == 0, 2 ** 30, 2 ** 30 + 50000)
+
+    out = cfar.peak_grouping_qualified(late, 16, 10, 1, 1, 1)
+    expected = cfar.peak_grouping_qualified(det, 16, 10, 1, 1, 1)
+    np.testing.assert_array_equal(out[['range_idx', 'doppler_idx', 'peakVal']],
+                                  expected[['range_idx', 'doppler_idx', 'peakVal']])
+    np.testing.assert_array_equal(out['frame_idx'], np.where(expected['frame_idx'] == 0, 2 ** 30, 2 ** 30 + 50000))
@@ -0,0 +1,67 @@
+# Copyright 2019 The OpenRadar Authors. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import pytest
+
+from mmwave.dataloader import parse_raw_adc
+
+PACKET_SIZE = 64
+BYTES_IN_FRAME = 160
+
+
+def make_dump(path, stream, packet_order):
+    """Raw DCA1000 dump of the packets (1-based sequence numbers) of the byte stream, in the given order."""
+    with open(str(path), 'wb') as f:
+        for packet_num in packet_order:
+            payload = stream[(packet_num - 1) * PACKET_SIZE:packet_num * PACKET_SIZE].tobytes()
+            f.write(packet_num.to_bytes(4, 'little') + len(payload).to_bytes(4, 'little') +
+                    ((packet_num - 1) * PACKET_SIZE).to_bytes(6, 'little') + payload)
+
+
+def reference_parse(source_fp):
+    """Packet by packet parser: payloads placed by sequence number, missing packets zero filled."""
+    with open(str(source_fp), 'rb') as f:
+        buff = f.read()
+    packets = {}
+    pos = 0
+    while pos + 14 <= len(buff):
+        packet_num = int.from_bytes(buff[pos:pos + 4], 'little')
+        packet_length = int.from_bytes(buff[pos + 4:pos + 8], 'little')
+        packets[packet_num] = buff[pos + 14:pos + 14 + packet_length]
+        pos += 14 + packet_length
+
+    num_bytes = max((packet_num - 1) * PACKET_SIZE + len(payload) for packet_num, payload in packets.items())
+    stream = bytearray(num_bytes)
+    for packet_num, payload in packets.items():
+        stream[(packet_num - 1) * PACKET_SIZE:(packet_num - 1) * PACKET_SIZE + len(payload)] = payload
+    return bytes(stream)
+
+
+@pytest.mark.parametrize('packet_order, lost', [
+    (range(1, 11), [0, 0, 0]),
+    ([1, 3, 2, 4, 5, 7, 6, 8, 9, 10], [0, 0, 0]),             # reordered
+    ([1, 2, 4, 5, 6, 8, 9, 10], [1, 1, 1]),                   # missing 3 (straddling frames 0 and 1) and 7
+    ([1, 2, 2, 3, 5, 4, 6, 7, 8, 10, 9, 9], [0, 0, 0]),       # duplicated, the short last packet out of order
+])
+def test_parse_raw_adc_matches_reference(tmp_path, packet_order, lost):
+    # 10 packets, the last one short, and 3 complete frames of 160 bytes
+    stream = np.random.default_rng(0).integers(0, 256, size=9 * PACKET_SIZE + 40, dtype=np.uint8)
+    make_dump(tmp_path / 'raw.bin', stream, packet_order)
+
+    valid, stats = parse_raw_adc(str(tmp_path / 'raw.bin'), str(tmp_path / 'adc.bin'), BYTES_IN_FRAME)
+
+    with open(str(tmp_path / 'adc.bin'), 'rb') as f:
+        assert f.read() == reference_parse(tmp_path / 'raw.bin')
+    np.testing.assert_array_equal(stats['lost_packets'], lost)
+    np.testing.assert_array_equal(valid, np.array(lost) == 0)
+    assert stats['duplicate_packets'] == len(packet_order) - len(set(packet_order))
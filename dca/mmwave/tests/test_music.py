@@ -0,0 +1,137 @@
+# Copyright 2019 The OpenRadar Authors. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import pytest
+
+from mmwave.dsp import angle_estimation
+from mmwave.dsp import music
+
+NUM_ANT = 8
+ANGLES = np.array([[-20, 15], [-40, 30], [5, 50], [-10, 25]])
+
+
+@pytest.fixture
+def snapshots():
+    """(num_cells, num_ant, num_chirps) snapshots of two uncorrelated sources per cell at ANGLES, with a little noise."""
+    rng = np.random.default_rng(0)
+    num_chirps = 64
+    steering = np.exp(-1j * np.pi * np.arange(NUM_ANT)[None, :, None] * np.sin(np.deg2rad(ANGLES))[:, None, :])
+    sources = rng.normal(size=(len(ANGLES), 2, num_chirps)) + 1j * rng.normal(size=(len(ANGLES), 2, num_chirps))
+    noise = rng.normal(size=(len(ANGLES), NUM_ANT, num_chirps)) + 1j * rng.normal(size=(len(ANGLES), NUM_ANT, num_chirps))
+    return steering @ sources + 0.05 * noise
+
+
+@pytest.fixture
+def steering_vec():
+    return angle_estimation.gen_steering_vec(90, 1, NUM_ANT, dtype=np.complex128)[1]
+
+
+def spatial_smoothing_flip(covariance_matrix, num_subarrays, forward_backward=False):
+    """Previous aoa_spatial_smoothing of a single matrix, with the backward pass through np.flip."""
+    n = covariance_matrix.shape[0] - num_subarrays + 1
+    result = sum(covariance_matrix[i:i + n, i:i + n] for i in range(num_subarrays)) / num_subarrays
+    return 0.5 * (result + np.flip(result).conj()) if forward_backward else result
+
+
+def root_music_loop(R, num_sources):
+    """Root MUSIC of a single covariance matrix with np.roots, angles in the convention of gen_steering_vec."""
+    _, v = np.linalg.eigh(R)
+    noise_subspace = v[:, :-num_sources]
+    c = noise_subspace @ noise_subspace.T.conj()
+    num_ant = c.shape[0]
+    z = np.roots([np.trace(c, offset=k) for k in range(num_ant - 1, -num_ant, -1)])
+    z = z[np.abs(z) <= 1]
+    z = z[np.argsort(np.abs(z))[-num_sources:]]
+    return np.sort(np.rad2deg(np.arcsin(-np.angle(z) / np.pi)))
+
+
+def esprit_loop(R, num_sources, displacement):
+    """Least squares ESPRIT of a single covariance matrix, angles in the convention of gen_steering_vec."""
+    _, v = np.linalg.eigh(R)
+    signal_subspace = v[:, -num_sources:]
+    num_ant = signal_subspace.shape[0]
+    phi = np.linalg.lstsq(signal_subspace[:num_ant - displacement], signal_subspace[displacement:], rcond=None)[0]
+    w = np.linalg.eigvals(phi)
+    return np.sort(np.rad2deg(np.arcsin(-np.angle(w) / (np.pi * displacement))))
+
+
+@pytest.mark.parametrize('num_subarrays, forward_backward', [(1, False), (1, True), (3, False), (3, True)])
+def test_batch_covariance_matches_per_cell(snapshots, num_subarrays, forward_backward):
+    R = music.batch_covariance(snapshots, num_subarrays, forward_backward)
+    assert R.shape == (len(ANGLES), NUM_ANT - num_subarrays + 1, NUM_ANT - num_subarrays + 1)
+
+    for cell, x in enumerate(snapshots):
+        expected = angle_estimation.cov_matrix(x)
+        if num_subarrays > 1 or forward_backward:
+            np.testing.assert_allclose(music.aoa_spatial_smoothing(expected, num_subarrays, forward_backward),
+                                       spatial_smoothing_flip(expected, num_subarrays, forward_backward), rtol=1e-12)
+            expected = spatial_smoothing_flip(expected, num_subarrays, forward_backward)
+        np.testing.assert_allclose(R[cell], expected, rtol=1e-10, atol=1e-12)
+
+    # single snapshots
+    R = music.batch_covariance(snapshots[:, :, 0])
+    np.testing.assert_allclose(R, snapshots[:, :, 0, None] * snapshots[:, None, :, 0].conj())
+
+
+def test_aoa_music_1D_batch_matches_per_cell(snapshots, steering_vec):
+    spectra = music.aoa_music_1D_batch(steering_vec, snapshots, 2)
+    for cell, x in enumerate(snapshots):
+        np.testing.assert_allclose(spectra[cell], music.aoa_music_1D(steering_vec, x, 2), rtol=1e-6)
+
+        # the two highest local maxima are the sources
+        peaks = np.flatnonzero((spectra[cell, 1:-1] > spectra[cell, :-2]) & (spectra[cell, 1:-1] > spectra[cell, 2:])) + 1
+        peaks = np.sort(peaks[np.argsort(spectra[cell, peaks])[-2:]])
+        np.testing.assert_array_equal(peaks - 90, ANGLES[cell])
+
+
+@pytest.mark.parametrize('num_subarrays, forward_backward', [(1, False), (2, True)])
+def test_aoa_root_music_1D_batch(snapshots, num_subarrays, forward_backward):
+    locations = music.aoa_root_music_1D_batch(snapshots, 2, num_subarrays, forward_backward)
+    R = music.batch_covariance(snapshots, num_subarrays, forward_backward)
+    for cell in range(len(ANGLES)):
+        np.testing.assert_allclose(locations[cell], root_music_loop(R[cell], 2), atol=1e-6)
+    np.testing.assert_allclose(locations, ANGLES, atol=0.5)
+
+
+@pytest.mark.parametrize('displacement, num_subarrays, forward_backward', [(1, 1, False), (2, 1, False), (1, 2, True)])
+def test_aoa_esprit_batch(snapshots, displacement, num_subarrays, forward_backward):
+    locations = music.aoa_esprit_batch(snapshots, 2, displacement, num_subarrays, forward_backward)
+    R = music.batch_covariance(snapshots, num_subarrays, forward_backward)
+    for cell in range(len(ANGLES)):
+        np.testing.assert_allclose(locations[cell], esprit_loop(R[cell], 2, displacement), atol=1e-6)
+
+    # the subarrays are displacement half wavelengths apart: angles beyond asin(1 / displacement) are ambiguous
+    unambiguous = np.all(np.abs(np.sin(np.deg2rad(ANGLES))) < 1 / displacement, axis=1)
+    np.testing.assert_allclose(locations[unambiguous], ANGLES[unambiguous], atol=0.5)
+
+
+def test_batch_coherent_sources_with_spatial_smoothing():
+    # the same chirp samples from both angles: a rank one covariance until it is spatially smoothed
+    source = np.exp(2j * np.pi * np.random.default_rng(1).random(32))
+    steering = np.exp(-1j * np.pi * np.arange(NUM_ANT)[:, None] * np.sin(np.deg2rad([-20, 30])))
+    x = (steering @ np.stack([source, 0.8 * source]))[None]
+
+    np.testing.assert_allclose(music.aoa_root_music_1D_batch(x, 2, num_subarrays=3, forward_backward=True), [[-20, 30]],
+                               atol=1e-6)
+    np.testing.assert_allclose(music.aoa_esprit_batch(x, 2, num_subarrays=3, forward_backward=True), [[-20, 30]],
+                               atol=1e-6)
+
+
+@pytest.mark.parametrize('num_sources, num_subarrays', [(NUM_ANT, 1), (NUM_ANT + 1, 1), (NUM_ANT - 2, 3), (0, 1)])
+def test_batch_num_sources_out_of_range(snapshots, steering_vec, num_sources, num_subarrays):
+    with pytest.raises(ValueError):
+        music.aoa_music_1D_batch(steering_vec, snapshots, num_sources, num_subarrays)
+    with pytest.raises(ValueError):
+        music.aoa_root_music_1D_batch(snapshots, num_sources, num_subarrays)
+    with pytest.raises(ValueError):
+        music.aoa_esprit_batch(snapshots, num_sources, num_subarrays=num_subarrays)
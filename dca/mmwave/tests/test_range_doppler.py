@@ -0,0 +1,138 @@
+# Copyright 2019 The OpenRadar Authors. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import pytest
+
+from mmwave.dsp import DopplerCZT
+from mmwave.dsp import RangeDopplerFFT
+from mmwave.dsp import ZoomRangeFFT
+from mmwave.dsp.utils import Window, get_window
+
+IQ_INT16 = np.dtype([('i', np.int16), ('q', np.int16)])
+
+
+def reference(radar_cube, num_range_bins, interp_factor=1, window_range=None, window_doppler=None):
+    """Range-Doppler spectrum with plain np.fft on the (samples, chirps, rx, frames) radarcube."""
+    x = radar_cube.astype(np.complex128)
+    x = x - x.mean(axis=1, keepdims=True)
+    if window_range is not None:
+        x = x * window_range[:, None, None, None]
+    if window_doppler is not None:
+        x = x * window_doppler[None, :, None, None]
+    x = np.fft.fft(x, axis=0)[:num_range_bins]
+    x = np.fft.fft(x, n=radar_cube.shape[1] * interp_factor, axis=1)
+    return np.fft.fftshift(x, axes=1)
+
+
+@pytest.fixture
+def cubes():
+    rng = np.random.default_rng(0)
+    shape = (16, 8, 2, 3)
+    real = rng.integers(-100, 100, size=shape).astype(np.int16)
+    iq = np.empty(shape, dtype=IQ_INT16)
+    iq['i'], iq['q'] = real, rng.integers(-100, 100, size=shape)
+    return real, iq
+
+
+@pytest.mark.parametrize('positive_range_only, num_range_bins, expected_bins', [
+    (False, None, 16), (True, None, 8), (False, 5, 5), (True, 12, 12)])
+def test_real_input_range_bins(cubes, positive_range_only, num_range_bins, expected_bins):
+    real, _ = cubes
+    engine = RangeDopplerFFT(16, 8, 2, positive_range_only=positive_range_only, num_range_bins=num_range_bins,
+                             dtype=np.complex128)
+
+    out = engine(real)
+    assert out.shape == (expected_bins, 8, 2, 3)
+    np.testing.assert_allclose(out, reference(real, expected_bins), atol=1e-9)
+
+    # same settings give the same spectrum as the complex path
+    np.testing.assert_allclose(out, engine(real.astype(np.complex128)), atol=1e-9)
+
+
+def test_iq_int16_input(cubes):
+    _, iq = cubes
+    engine = RangeDopplerFFT(16, 8, 2, window_type_1d=Window.hann, window_type_2d=Window.hamming, interp_factor=2,
+                             dtype=np.complex128)
+    iq_complex = iq['i'] + 1j * iq['q'].astype(np.float64)
+
+    out = engine(iq)
+    assert out.shape == (16, 16, 2, 3)
+    np.testing.assert_allclose(out, reference(iq_complex, 16, 2, np.hanning(16), np.hamming(8)), atol=1e-8)
+
+
+@pytest.fixture
+def chirps():
+    """(num_chirps, num_rx, 256) chirps of tones in and out of the [2e5, 4.5e5] band (32 FFT bins at fs 2e6), with noise."""
+    rng = np.random.default_rng(0)
+    n = np.arange(256)
+    tones = (20 * np.exp(2j * np.pi * 2.6e5 / 2e6 * n) + 10 * np.exp(2j * np.pi * 3.43e5 / 2e6 * n) +
+             30 * np.exp(2j * np.pi * 8e5 / 2e6 * n))
+    return tones + rng.normal(size=(4, 2, 256)) + 1j * rng.normal(size=(4, 2, 256))
+
+
+def direct_dft(x, freqs, fs):
+    return x @ np.exp(-2j * np.pi * np.outer(np.arange(x.shape[-1]), freqs / fs))
+
+
+@pytest.mark.parametrize('backend, num_bins', [('fft', None), ('fft', 10), ('fft', 200), ('czt', None), ('czt', 64)])
+def test_zoom_range_fft_matches_direct_dft(chirps, backend, num_bins):
+    engine = ZoomRangeFFT(256, 2e5, 4.5e5, 2e6, num_bins=num_bins, backend=backend, dtype=np.complex128)
+    out = engine(chirps)
+    expected = direct_dft(chirps, engine.freqs, 2e6)
+
+    assert out.shape == (4, 2, engine.num_bins)
+    if backend == 'czt':
+        np.testing.assert_allclose(out, expected, rtol=0, atol=1e-9 * np.abs(expected).max())
+    else:
+        # the anti-aliasing filter of the decimation lets some out of band energy (the 8e5 tone) leak in
+        np.testing.assert_allclose(out, expected, rtol=0, atol=3e-3 * np.abs(expected).max())
+
+
+def test_zoom_range_fft_backends_agree(chirps):
+    fft_engine = ZoomRangeFFT(256, 2e5, 4.5e5, 2e6, backend='fft')
+    czt_engine = ZoomRangeFFT(256, 2e5, 4.5e5, 2e6, backend='czt', num_bins=fft_engine.num_bins)
+    assert fft_engine.decimation == 4 and fft_engine.num_bins == 32
+
+    np.testing.assert_allclose(fft_engine.freqs, czt_engine.freqs)
+    czt_out = czt_engine(chirps)
+    np.testing.assert_allclose(fft_engine(chirps), czt_out, rtol=0, atol=3e-3 * np.abs(czt_out).max())
+
+    # the sample axis may be anywhere
+    np.testing.assert_allclose(fft_engine(np.moveaxis(chirps, -1, 0), axis=0), np.moveaxis(fft_engine(chirps), -1, 0))
+
+
+@pytest.mark.parametrize('window_type_2d', [None, Window.hann])
+@pytest.mark.parametrize('interp_factor', [1, 4])
+def test_doppler_czt_matches_zero_padded_fft(window_type_2d, interp_factor):
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(16, 3, 5)) + 1j * rng.normal(size=(16, 3, 5))
+    num_bins = 16 * interp_factor
+    windowed = x * get_window(window_type_2d, 16)[:, None, None] if window_type_2d else x
+    expected = np.fft.fftshift(np.fft.fft(windowed, n=num_bins, axis=0), axes=0)
+
+    engine = DopplerCZT(16, num_bins, window_type_2d=window_type_2d, dtype=np.complex128)
+    np.testing.assert_allclose(engine(x, axis=0), expected, rtol=0, atol=1e-9 * np.abs(expected).max())
+    np.testing.assert_allclose(engine.freqs, np.fft.fftshift(np.fft.fftfreq(num_bins)))
+
+    # a velocity window evaluates the same bins of the zero-padded spectrum only
+    engine = DopplerCZT(16, num_bins // 2, doppler_window=(-0.25, 0.25), window_type_2d=window_type_2d,
+                        dtype=np.complex128)
+    np.testing.assert_allclose(np.moveaxis(engine(np.moveaxis(x, 0, 2), axis=2), 2, 0),
+                               expected[num_bins // 4:3 * num_bins // 4], rtol=0, atol=1e-9 * np.abs(expected).max())
+
+
+def test_doppler_czt_invalid_input():
+    with pytest.raises(ValueError):
+        DopplerCZT(16, 32, doppler_window=(-0.6, 0.5))
+    with pytest.raises(ValueError):
+        DopplerCZT(16, 32)(np.zeros((8, 2)), axis=0)
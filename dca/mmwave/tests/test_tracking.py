@@ -0,0 +1,81 @@
+# Copyright 2019 The OpenRadar Authors. All Rights Reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import pytest
+
+from mmwave.tracking import EKF
+
+
+def scenario(num_frames, num_targets=6, pts_per_target=30, clutter=60, seed=0):
+    """Point clouds (num_points, [range, azimuth, doppler, snr]) of targets moving at constant velocity in clutter."""
+    rng = np.random.default_rng(seed)
+    pos = np.stack([rng.uniform(-4, 4, num_targets), rng.uniform(2, 10, num_targets)], axis=1)
+    vel = np.stack([rng.uniform(-1, 1, num_targets), rng.uniform(-1.5, 1.5, num_targets)], axis=1)
+
+    frames = []
+    for frame_idx in range(num_frames):
+        pos = pos + vel * 0.05
+        points = []
+        for target in range(num_targets):
+            if (frame_idx + target) % 17 == 16:
+                continue    # occasional missed detection
+            n = pts_per_target + rng.integers(-5, 5)
+            xy = pos[target] + rng.normal(scale=0.12, size=(n, 2))
+            ranges = np.hypot(xy[:, 0], xy[:, 1])
+            dopplers = (xy @ vel[target]) / ranges + rng.normal(scale=0.05, size=n)
+            points.append(np.stack([ranges, np.arctan2(xy[:, 0], xy[:, 1]), dopplers, rng.uniform(2, 20, n)], axis=1))
+        points.append(np.stack([rng.uniform(0.5, 12, clutter), rng.uniform(-1, 1, clutter),
+                                rng.uniform(-3, 3, clutter), rng.uniform(1, 5, clutter)], axis=1))
+        points = np.concatenate(points)
+        frames.append(points[rng.permutation(len(points))])
+    return frames
+
+
+def step(ekf, points):
+    ekf.update_point_cloud(points[:, 0], points[:, 1], points[:, 2], points[:, 3])
+    targets, num_targets = ekf.step()
+    return sorted((int(target.uid), np.asarray(target.S, dtype=np.float64)) for target in targets[:int(num_targets[0])])
+
+
+@pytest.mark.parametrize('backend', ['unit', 'batch'])
+def test_active_and_free_tracks_stay_disjoint(backend):
+    ekf = EKF(backend=backend)
+    module = ekf.h_track_module
+    max_active = 0
+
+    for frame_idx, points in enumerate(scenario(num_frames=60, seed=1)):
+        if frame_idx > 30:
+            points = points[:0]     # every target leaves: the tracks are freed, several in the same frame
+        step(ekf, points)
+
+        active = {elem.data for elem in module.activeList}
+        free = {elem.data for elem in module.freeList}
+        assert not active & free
+        assert len(active) + len(free) == module.maxNumTracks
+        assert len(active) == module.targetNumCurrent
+        max_active = max(max_active, len(active))
+
+    assert max_active >= 2 and not module.activeList
+
+
+def test_unit_and_batch_backends_match():
+    unit, batch = EKF(backend='unit'), EKF(backend='batch')
+
+    for frame_idx, points in enumerate(scenario(num_frames=80, seed=2)):
+        if frame_idx > 50:
+            points = points[:len(points) // 3]
+        unit_tracks, batch_tracks = step(unit, points), step(batch, points)
+
+        assert [uid for uid, _ in unit_tracks] == [uid for uid, _ in batch_tracks]
+        for (_, unit_state), (_, batch_state) in zip(unit_tracks, batch_tracks):
+            np.testing.assert_allclose(unit_state, batch_state, rtol=1e-3, atol=2e-3)
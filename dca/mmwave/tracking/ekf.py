@@ -8,17 +8,20 @@ class EKF:
     """Extended Kalman Filter with built in tracking
 
     Attributes:
-        point_cloud (ndarray): Array of point objects
+        point_cloud (ndarray): Structured point cloud (range, angle, doppler and snr columns)
         target_desc (ndarray): Array of detected objects
         t_num (int): Number of detected objects
         h_track_module (object): Tracking meta-data
         num_points (int): Number of detected points
 
+    Args:
+        backend (str): Predict/update backend of the tracker, 'batch' runs the kalman filters of all tracks at once
+            with stacked matrices, 'unit' track by track.
+
     """
 
-    def __init__(self):
-        self.point_cloud = np.array(
-            [ekf_utils.gtrack_measurementPoint() for _ in range(ekf_utils.MAXNUMBERMEASUREMENTS)])
+    def __init__(self, backend='batch'):
+        self.point_cloud = ekf_utils.gtrack_pointCloud(ekf_utils.MAXNUMBERMEASUREMENTS)
 
         self.target_desc = np.array([ekf_utils.gtrack_targetDesc() for _ in range(ekf_utils.MAXNUMBERTRACKERS)])
 
@@ -45,6 +48,7 @@ class EKF:
         config.maxNumPoints = 250
         config.maxNumTracks = 20
         config.initialRadialVelocity = 0
+        config.backend = backend
 
         adv_params.gatingParams = app_gating_params
         adv_params.sceneryParams = app_scenery_params
@@ -68,12 +72,12 @@ class EKF:
         Returns:
             None
         """
-        for distance, azimuth, doppler, snr, idx in zip(ranges, azimuths, dopplers, snrs, range(len(ranges))):
-            self.point_cloud[idx].range = distance
-            self.point_cloud[idx].angle = azimuth
-            self.point_cloud[idx].doppler = doppler
-            self.point_cloud[idx].snr = snr
-        self.num_points = len(ranges)
+        num_points = len(ranges)
+        self.point_cloud['range'][:num_points] = ranges
+        self.point_cloud['angle'][:num_points] = azimuths
+        self.point_cloud['doppler'][:num_points] = dopplers
+        self.point_cloud['snr'][:num_points] = snrs
+        self.num_points = num_points
 
     def step(self):
         """Step the EKF
@@ -1,4 +1,5 @@
 import numpy as np
+from collections import deque
 
 '''global constants'''
 
@@ -154,6 +155,20 @@ class gtrack_moduleConfig():
         self.maxAcceleration = 12
         self.deltaT = 0.4
         self.advParams = gtrack_advancedParameters()
+        self.backend = 'unit'   # 'unit': predict/update unit by unit, 'batch': all tracks at once (gtrack_batch)
+
+
+# GTRACK Measurement point cloud (structure of arrays): point['range'] etc. are contiguous columns, point[n].range
+# still reads a single measurement
+gtrack_POINT_DTYPE = np.dtype([('range', np.float64), ('angle', np.float64), ('doppler', np.float64),
+                               ('snr', np.float64)])
+
+# GTRACK Measurement variances of the point cloud
+gtrack_VARIANCE_DTYPE = np.dtype([('rangeVar', np.float64), ('angleVar', np.float64), ('dopplerVar', np.float64)])
+
+
+def gtrack_pointCloud(num):
+    return np.zeros(num, dtype=gtrack_POINT_DTYPE).view(np.recarray)
 
 
 # GTRACK Measurement point
@@ -690,6 +705,13 @@ def gtrack_computeJacobian(format, cart, jac):
 
 
 def gtrack_unrollRadialVelocity(rvMax, rvExp, rvIn):
+    if np.ndim(rvIn) or np.ndim(rvExp):
+        # all measurements at once, the factor is truncated as in the scalar path
+        distance = np.asarray(rvExp - rvIn).astype(np.float32)
+        up = np.trunc((distance + rvMax) / (2 * rvMax))
+        down = np.trunc((rvMax - distance) / (2 * rvMax))
+        return np.where(distance >= 0, rvIn + 2 * rvMax * up, rvIn - 2 * rvMax * down).astype(np.float32)
+
     distance = np.float32(rvExp - rvIn)
     if distance >= 0:
         factor = int((distance + rvMax) / (2 * rvMax))
@@ -801,6 +823,14 @@ class VelocityHandlingState():
 
 # GTRACK Unit instance structure
 class GtrackUnitInstance():
+    __slots__ = ('uid', 'tid', 'heartBeatCount', 'allocationTime', 'allocationRange', 'allocationVelocity',
+                 'associatedPoints', 'state', 'stateVectorType', 'currentStateVectorType', 'stateVectorLength',
+                 'measurementVectorLength', 'verbose', 'gatingParams', 'stateParams', 'allocationParams',
+                 'unrollingParams', 'variationParams', 'sceneryParams', 'velocityHandling', 'initialRadialVelocity',
+                 'maxRadialVelocity', 'radialVelocityResolution', 'rangeRate', 'detect2activeCount', 'detect2freeCount',
+                 'active2freeCount', 'maxAcceleration', 'processVariance', 'dt', 'F4', 'F6', 'Q4', 'Q6', 'F', 'Q',
+                 'S_hat', 'S_apriori_hat', 'P_hat', 'P_apriori_hat', 'H_s', 'gD', 'gC', 'gC_inv', 'G')
+
     def __init__(self):
         self.uid = 0
         self.tid = 0
@@ -873,11 +903,24 @@ class GtrackModuleInstance():
         self.allocIndex = None
         self.hTrack = None
 
+        # active units in allocation order and queue of the free units
         self.activeList = []
-        self.freeList = []
+        self.freeList = deque()
 
         self.uidElem = None
 
+        # predict/update backend and the states of all units, stacked (maxNumTracks, ...). The arrays of every unit
+        # instance are views of its row
+        self.backend = 'unit'
+        self.S_hat = None
+        self.S_apriori_hat = None
+        self.P_hat = None
+        self.P_apriori_hat = None
+        self.H_s = None
+        self.gD = None
+        self.gC = None
+        self.gC_inv = None
+
         self.targetDesc = None
         self.targetNumTotal = 0
         self.targetNumCurrent = 0
@@ -0,0 +1,220 @@
+import numpy as np
+
+from . import ekf_utils
+from . import gtrack_unit
+
+
+# Batched GTRACK unit predict and update (module backend 'batch').
+# The states of all units live in the module arrays inst.S_hat (maxNumTracks, 6), inst.P_hat (maxNumTracks, 36), ...
+# and every unit instance works on views of its row (see gtrack_test.create). The functions below gather the rows of
+# the given units, run the extended kalman filter of all of them with stacked (T, 6, 6) matrices and scatter the results
+# back, so the units stay usable by the unit level functions. Velocity handling and the unit state machine are scalar
+# and still run unit by unit.
+
+
+# batched version of ekf_utils.gtrack_cartesian2spherical for (T, 6) states
+def cartesian2spherical(cart):
+    posx, posy, velx, vely = cart[:, 0], cart[:, 1], cart[:, 2], cart[:, 3]
+
+    sph = np.zeros(shape=(cart.shape[0], 3), dtype=np.float32)
+    sph[:, 0] = np.sqrt(posx * posx + posy * posy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        azimuth = np.arctan(posx / posy)
+        sph[:, 2] = (posx * velx + posy * vely) / sph[:, 0]
+    sph[:, 1] = np.where(posy == 0, np.float32(np.pi / 2), np.where(posy > 0, azimuth, azimuth + np.pi))
+
+    return sph
+
+
+# batched version of ekf_utils.gtrack_computeJacobian (2DA state vectors), returns (T, 3, 6) jacobians
+def compute_jacobian(cart):
+    posx, posy, velx, vely = cart[:, 0], cart[:, 1], cart[:, 2], cart[:, 3]
+
+    range2 = posx * posx + posy * posy
+    range = np.sqrt(range2)
+    range3 = range * range2
+
+    jac = np.zeros(shape=(cart.shape[0], 3, 6), dtype=np.float32)
+    jac[:, 0, 0] = posx / range
+    jac[:, 0, 1] = posy / range
+    jac[:, 1, 0] = posy / range2
+    jac[:, 1, 1] = -posx / range2
+    jac[:, 2, 0] = (posy * (velx * posy - vely * posx)) / range3
+    jac[:, 2, 1] = (posx * (vely * posx - velx * posy)) / range3
+    jac[:, 2, 2] = posx / range
+    jac[:, 2, 3] = posy / range
+
+    return jac
+
+
+# batched version of ekf_utils.gtrack_matrixInv3 for (T, 3, 3) matrices, singular matrices give zeros
+def matrix_inv3(A):
+    singular = np.linalg.det(A) == 0
+    inv = np.linalg.inv(np.where(singular[:, None, None], np.eye(3, dtype=A.dtype), A))
+    inv[singular] = 0
+
+    return inv.astype(np.float32)
+
+
+# GTRACK Module calls this function to run the prediction step of the units uids at once
+def batch_predict(inst, uids):
+    uids = np.asarray(uids, dtype=np.intp)
+    if uids.size == 0:
+        return
+    units = [inst.hTrack[uid] for uid in uids]
+    for unit in units:
+        unit.heartBeatCount += 1
+
+    F = inst.params.F6.reshape(6, 6)
+    Q = inst.params.Q6.reshape(6, 6)
+    process_variance = np.array([unit.processVariance for unit in units], dtype=np.float32)
+    moving = process_variance != 0
+
+    # (1) S = F S, P = F P F' + processVariance Q made symmetrical, states without process variance are kept
+    S_hat = inst.S_hat[uids]
+    P_hat = inst.P_hat[uids].reshape(-1, 6, 6)
+
+    S_apriori_hat = S_hat @ F.T
+    P_apriori_hat = F @ P_hat @ F.T + process_variance[:, None, None] * Q
+    P_apriori_hat = np.float32(0.5) * (P_apriori_hat + P_apriori_hat.transpose(0, 2, 1))
+
+    S_apriori_hat = np.where(moving[:, None], S_apriori_hat, S_hat)
+    P_apriori_hat = np.where(moving[:, None, None], P_apriori_hat, P_hat)
+
+    # (2) predicted measurements
+    inst.S_apriori_hat[uids] = S_apriori_hat
+    inst.P_apriori_hat[uids] = P_apriori_hat.reshape(-1, 36)
+    inst.H_s[uids] = cartesian2spherical(S_apriori_hat)
+
+
+# GTRACK Module calls this function to run the update step of the units uids at once with the points associated to
+# them in inst.bestIndex. Returns the list of the unit states after the update
+def batch_update(inst, uids, point, var, num):
+    uids = np.asarray(uids, dtype=np.intp)
+    if uids.size == 0:
+        return []
+    units = [inst.hTrack[uid] for uid in uids]
+    num_units = uids.size
+
+    # (1) rows of the associated points, the first point of every unit is the pilot the others are unrolled to
+    row_of_uid = np.full(256, -1, dtype=np.intp)
+    row_of_uid[uids] = np.arange(num_units)
+    rows = row_of_uid[inst.bestIndex[:num]]
+    mine = np.flatnonzero(rows >= 0)
+    rows = rows[mine]
+    count = np.bincount(rows, minlength=num_units)
+
+    doppler = point['doppler']
+    _, first = np.unique(rows, return_index=True)
+    pilot = np.full(num_units, -1, dtype=np.intp)
+    pilot[rows[first]] = mine[first]
+    unrolled = np.ones(mine.size, dtype=bool)
+    unrolled[first] = False
+    rv_max = np.array([unit.maxRadialVelocity for unit in units], dtype=np.float32)
+    doppler[mine[unrolled]] = ekf_utils.gtrack_unrollRadialVelocity(rv_max[rows[unrolled]],
+                                                                    doppler[pilot[rows[unrolled]]],
+                                                                    doppler[mine[unrolled]])
+
+    my_range = point['range'][mine]
+    my_angle = point['angle'][mine]
+    my_doppler = doppler[mine]
+
+    # (2) units without points: static units stop, the others keep the prediction
+    S_apriori_hat = inst.S_apriori_hat[uids]
+    P_apriori_hat = inst.P_apriori_hat[uids]
+    empty = count == 0
+    if np.any(empty):
+        res = np.array([unit.radialVelocityResolution for unit in units], dtype=np.float32)
+        S_hat = inst.S_hat[uids]
+        static = empty & (np.abs(S_hat[:, 2]) < res) & (np.abs(S_hat[:, 3]) < res)
+        S_empty = S_apriori_hat.copy()
+        S_empty[static, 2:] = 0
+        inst.S_hat[uids[empty]] = S_empty[empty]
+        inst.P_hat[uids[empty]] = P_apriori_hat[empty]
+        for row in np.flatnonzero(static):
+            units[row].processVariance = 0
+
+    active = np.flatnonzero(~empty)
+    if active.size:
+        _update_active(inst, [units[row] for row in active], uids[active], count[active],
+                       np.searchsorted(active, rows), my_range, my_angle, my_doppler,
+                       None if var is None else var[mine])
+
+    states = []
+    for unit, n in zip(units, count):
+        gtrack_unit.unit_event(unit, n)
+        states.append(unit.state)
+
+    return states
+
+
+# kalman filter update of the units with associated points, rows maps every point to its unit
+def _update_active(inst, units, uids, count, rows, my_range, my_angle, my_doppler, my_var):
+    num_units = uids.size
+    n = count.astype(np.float64)
+
+    # (1) measurement (mean of the points) and measurement noise
+    U = np.zeros(shape=(num_units, 3), dtype=np.float32)
+    U[:, 0] = np.bincount(rows, weights=my_range, minlength=num_units) / n
+    U[:, 1] = np.bincount(rows, weights=my_angle, minlength=num_units) / n
+    U[:, 2] = np.bincount(rows, weights=my_doppler, minlength=num_units) / n
+    mean = U.copy()
+
+    Rm = np.zeros(shape=(num_units, 3), dtype=np.float32)
+    if my_var is not None:
+        Rm[:, 0] = np.float32(np.bincount(rows, weights=my_var['rangeVar'], minlength=num_units)) / n
+        Rm[:, 1] = np.float32(np.bincount(rows, weights=my_var['angleVar'], minlength=num_units)) / n
+        Rm[:, 2] = np.float32(np.bincount(rows, weights=my_var['dopplerVar'], minlength=num_units)) / n
+    else:
+        variation = inst.params.variationParams
+        angle_std = np.float32(2) * np.arctan(np.float32(0.5 * variation.widthStd) / inst.H_s[uids, 0])
+        Rm[:, 0] = np.float32(variation.lengthStd * variation.lengthStd)
+        Rm[:, 1] = angle_std * angle_std
+        Rm[:, 2] = np.float32(variation.dopplerStd * variation.dopplerStd)
+
+    # (2) scalar per unit bookkeeping and radial velocity handling
+    for unit, um, points in zip(units, U, count):
+        unit.associatedPoints += points
+        if unit.processVariance == 0:
+            unit.processVariance = np.float32((0.5 * unit.maxAcceleration) * (0.5 * unit.maxAcceleration))
+        gtrack_unit.velocity_state_handling(unit, um)
+
+    # (3) group dispersion of the units with enough points
+    gD = inst.gD[uids].reshape(-1, 3, 3)
+    dispersed = count > gtrack_unit.gtrack_MIN_POINTS_TO_UPDATE_DISPERSION
+    if np.any(dispersed):
+        d = np.stack((my_range, my_angle, my_doppler), axis=1) - mean[rows]
+        D = np.zeros(shape=(num_units, 3, 3), dtype=np.float32)
+        for i, j in ((0, 0), (1, 1), (2, 2), (0, 1), (0, 2), (1, 2)):
+            D[:, i, j] = D[:, j, i] = np.bincount(rows, weights=np.float32(d[:, i] * d[:, j]), minlength=num_units) / n
+
+        associated = np.array([unit.associatedPoints for unit in units], dtype=np.float32)
+        alpha = np.maximum(np.float32(count / associated), np.float32(gtrack_unit.gtrack_MIN_DISPERSION_ALPHA))
+        alpha = alpha[:, None, None]
+        gD = np.where(dispersed[:, None, None], (1. - alpha) * gD + alpha * D, gD).astype(np.float32)
+        inst.gD[uids] = gD.reshape(-1, 9)
+
+    # (4) measurement noise of the centroid
+    est = gtrack_unit.gtrack_EST_POINTS
+    alpha = np.where(count > est, 0, np.float32((est - count) / ((est - 1) * n))).astype(np.float32)
+    Rc = np.zeros(shape=(num_units, 3, 3), dtype=np.float32)
+    Rc[:, [0, 1, 2], [0, 1, 2]] = Rm / n[:, None] + alpha[:, None] * gD[:, [0, 1, 2], [0, 1, 2]]
+
+    # (5) kalman gain, state and covariance updates
+    S_apriori_hat = inst.S_apriori_hat[uids]
+    P_apriori_hat = inst.P_apriori_hat[uids].reshape(-1, 6, 6)
+
+    J = compute_jacobian(S_apriori_hat)
+    u_tilda = U - inst.H_s[uids]
+    PJ = P_apriori_hat @ J.transpose(0, 2, 1)
+    JPJ = J @ PJ
+    cC_inv = matrix_inv3(JPJ + Rc)
+    K = PJ @ cC_inv
+
+    inst.S_hat[uids] = S_apriori_hat + (K @ u_tilda[:, :, None])[:, :, 0]
+    inst.P_hat[uids] = (P_apriori_hat - K @ PJ.transpose(0, 2, 1)).reshape(-1, 36)
+
+    gC = JPJ + gD
+    gC[:, [0, 1, 2], [0, 1, 2]] += Rm
+    inst.gC[uids] = gC.reshape(-1, 9)
+    inst.gC_inv[uids] = matrix_inv3(gC).reshape(-1, 9)
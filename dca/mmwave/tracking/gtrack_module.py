@@ -1,13 +1,18 @@
 import numpy as np
-import sys
 
 from . import ekf_utils
 from . import gtrack_unit
+from . import gtrack_batch
 
 
 # This is a MODULE level predict function. The function is called by external
 # step function to perform unit level kalman filter predictions
+# With the 'batch' backend all units are predicted at once (see gtrack_batch)
 def module_predict(inst):
+    if inst.backend == 'batch':
+        gtrack_batch.batch_predict(inst, [i.data for i in inst.activeList])
+        return
+
     for i in inst.activeList:
         uid = i.data
         if uid > inst.maxNumTracks:
@@ -17,92 +22,149 @@ def module_predict(inst):
 
 # This is a MODULE level associatiation function. The function is called
 #  by external step function to associate measurement points with known targets
+#  The gated scores of all (track, point) pairs are computed at once and every point goes to its best scoring track,
+#  the first active track on ties as in the sequential unit scoring
 def module_associate(inst, point, num):
-    for i in inst.activeList:
-        uid = i.data
-        gtrack_unit.unit_score(inst.hTrack[uid], point, inst.bestScore, inst.bestIndex, num)
+    units = [inst.hTrack[i.data] for i in inst.activeList]
+    if not units or num == 0:
+        return
+
+    # (1) unit gates and stacked unit states, one row per active track
+    log_det = np.array([gtrack_unit.unit_gate(unit) for unit in units], dtype=np.float32)[:, None]
+    gate = np.array([unit.G for unit in units], dtype=np.float32)[:, None]
+    uid = np.array([unit.uid for unit in units], dtype=np.uint8)
+    H_s = np.array([unit.H_s for unit in units], dtype=np.float32)
+    gC_inv = np.array([unit.gC_inv for unit in units], dtype=np.float32).T[:, :, None]
+
+    # radial velocity is unrolled around the allocation velocity until the unit velocity is locked
+    locked = np.array([unit.velocityHandling >= ekf_utils.VelocityHandlingState().VELOCITY_LOCKED for unit in units])
+    rv_exp = np.where(locked, H_s[:, 2], [unit.allocationVelocity for unit in units]).astype(np.float32)[:, None]
+
+    # (2) innovations and Mahalanobis distances of all (track, point) pairs
+    u_tilda = np.empty(shape=(3, len(units), num), dtype=np.float32)
+    u_tilda[0] = point['range'][:num] - H_s[:, 0:1]
+    u_tilda[1] = point['angle'][:num] - H_s[:, 1:2]
+    rv_out = ekf_utils.gtrack_unrollRadialVelocity(inst.params.maxRadialVelocity, rv_exp, point['doppler'][:num])
+    u_tilda[2] = rv_out - rv_exp
+
+    chi2 = ekf_utils.gtrack_computeMahalanobis3(u_tilda, gC_inv)
+    score = np.where(chi2 < gate, (log_det + chi2).astype(np.float32), np.float32(np.inf))
+
+    # (3) best track of every point
+    best = np.argmin(score, axis=0)
+    points = np.arange(num)
+    best_score = score[best, points]
+    better = (best_score < inst.bestScore[:num]) & (inst.bestIndex[:num] != ekf_utils.gtrack_ID_POINT_BEHIND_THE_WALL)
+
+    inst.bestScore[:num][better] = best_score[better]
+    inst.bestIndex[:num][better] = uid[best[better]]
+    point['doppler'][:num][better] = rv_out[best[better], points[better]]
 
 
 # This is a MODULE level allocation function. The function is called by
 # external step function to allocate new targets for the non-associated 
 # measurement points
+#  Every non-associated point seeds a set grown greedily with the following non-associated points that are within the
+#  velocity and distance thresholds of the running mean of the set. The gates of every seed against all following
+#  points are computed in one broadcast (the running mean starts at the seed), afterwards each accepted point only
+#  re-tests the remaining points against the updated mean at once
 def module_allocate(inst, point, num):
-    un = np.zeros(shape=(3,), dtype=np.float32)
-    uk = np.zeros(shape=(3,), dtype=np.float32)
-    un_sum = np.zeros(shape=(3,), dtype=np.float32)
-    for n in range(num):
-        if inst.bestIndex[n] == ekf_utils.gtrack_ID_POINT_NOT_ASSOCIATED:
-            t_elem = inst.freeList[0] if inst.freeList else None
-            if t_elem is None:
-                if (inst.verbose & ekf_utils.VERBOSE_WARNING_INFO) != 0:
-                    raise ValueError('Maximum number of tracks reached!, module_allocate')
-                return
-            inst.allocIndex[0] = n
-            alloc_num = 1
-            alloc_snr = point[n].snr
-
-            un[0] = un_sum[0] = np.float32(point[n].range)
-            un[1] = un_sum[1] = np.float32(point[n].angle)
-            un[2] = un_sum[2] = np.float32(point[n].doppler)
-            # print(un[0], un[1], un[2])
-
-            for k in range(n + 1, num):
-                if inst.bestIndex[k] == ekf_utils.gtrack_ID_POINT_NOT_ASSOCIATED:
-                    uk[0] = np.float32(point[k].range)
-                    uk[1] = np.float32(point[k].angle)
-                    uk[2] = ekf_utils.gtrack_unrollRadialVelocity(inst.params.maxRadialVelocity, un[2],
-                                                                  point[k].doppler)
-
-                    if np.abs(uk[2] - un[2]) < inst.params.allocationParams.maxVelThre:
-                        dist = np.float32(un[0] * un[0] + uk[0] * uk[0] - 2 * un[0] * uk[0] * np.cos(un[1] - uk[1]))
-                        if dist < inst.params.allocationParams.maxDistanceThre:
-                            inst.allocIndex[alloc_num] = k
-
-                            un_sum[0] += uk[0]
-                            un_sum[1] += uk[1]
-                            un_sum[2] += uk[2]
-
-                            alloc_num += 1
-                            alloc_snr += point[k].snr
-
-                            un[0] = np.float32(un_sum[0] / alloc_num)
-                            un[1] = np.float32(un_sum[1] / alloc_num)
-                            un[2] = np.float32(un_sum[2] / alloc_num)
-            if (alloc_num > inst.params.allocationParams.pointsThre) and \
-                    (alloc_snr > inst.params.allocationParams.snrThre) and \
-                    (np.abs(un[2]) > inst.params.allocationParams.velocityThre):
-                for k in range(alloc_num):
-                    inst.bestIndex[inst.allocIndex[k]] = t_elem.data
-
-                inst.targetNumTotal += 1
-                inst.targetNumCurrent += 1
-
-                t_elem = inst.freeList.pop(0)
-
-                gtrack_unit.unit_start(inst.hTrack[t_elem.data], inst.heartBeat, inst.targetNumTotal, un)
-
-                inst.activeList.append(t_elem)
+    alloc_params = inst.params.allocationParams
+    max_rv = inst.params.maxRadialVelocity
+
+    free = np.flatnonzero(inst.bestIndex[:num] == ekf_utils.gtrack_ID_POINT_NOT_ASSOCIATED)
+    if free.size == 0:
+        return
+    ranges = point['range'][free].astype(np.float32)
+    angles = point['angle'][free].astype(np.float32)
+    dopplers = point['doppler'][free]
+    snrs = point['snr'][free]
+    available = np.ones(free.size, dtype=bool)
+
+    def gate(un, k):
+        # velocity and distance gates of the candidate points k against the mean un
+        uk = ekf_utils.gtrack_unrollRadialVelocity(max_rv, un[2], dopplers[k])
+        dist = (un[0] * un[0] + ranges[k] * ranges[k] - 2 * un[0] * ranges[k] * np.cos(un[1] - angles[k]))
+        return (np.abs(uk - un[2]) < alloc_params.maxVelThre) & (dist.astype(np.float32) < alloc_params.maxDistanceThre), uk
+
+    # (1) first gate of every seed (running mean = seed) against all points, in one broadcast
+    seed = np.stack((ranges, angles, dopplers.astype(np.float32)))
+    first_gate, first_uk = gate(seed[:, :, None], np.arange(free.size))
+    first_gate &= np.triu(np.ones_like(first_gate), 1)
+
+    for n in range(free.size):
+        if not available[n]:
+            continue
+        t_elem = inst.freeList[0] if inst.freeList else None
+        if t_elem is None:
+            if (inst.verbose & ekf_utils.VERBOSE_WARNING_INFO) != 0:
+                raise ValueError('Maximum number of tracks reached!, module_allocate')
+            return
+
+        # (2) grow the set from the seed, accepting the first gated point until none is left
+        members = [n]
+        un = seed[:, n].copy()
+        un_sum = un.copy()
+        alloc_snr = snrs[n]
+
+        passed = first_gate[n] & available
+        uk = first_uk[n]
+        k = n
+        while True:
+            candidates = np.flatnonzero(passed[k + 1:])
+            if candidates.size == 0:
+                break
+            k = k + 1 + candidates[0]
+
+            un_sum += np.array([ranges[k], angles[k], uk[k]], dtype=np.float32)
+            members.append(k)
+            alloc_snr += snrs[k]
+            un = np.float32(un_sum / len(members))
+
+            # re-test the remaining points against the updated mean
+            rest = np.arange(k + 1, free.size)
+            passed = np.zeros(free.size, dtype=bool)
+            uk = np.zeros(free.size, dtype=np.float32)
+            passed[rest], uk[rest] = gate(un, rest)
+            passed &= available
+
+        # (3) allocate a new track if the set passes the allocation thresholds
+        alloc_num = len(members)
+        if (alloc_num > alloc_params.pointsThre) and (alloc_snr > alloc_params.snrThre) and \
+                (np.abs(un[2]) > alloc_params.velocityThre):
+            inst.allocIndex[:alloc_num] = free[members]
+            inst.bestIndex[free[members]] = t_elem.data
+            available[members] = False
+
+            inst.targetNumTotal += 1
+            inst.targetNumCurrent += 1
+
+            t_elem = inst.freeList.popleft()
+
+            gtrack_unit.unit_start(inst.hTrack[t_elem.data], inst.heartBeat, inst.targetNumTotal, un)
+
+            inst.activeList.append(t_elem)
 
 
 # This is a MODULE level update function. The function is called by external 
 # step function to perform unit level kalman filter updates
+# With the 'batch' backend all units are updated at once (see gtrack_batch)
 def module_update(inst, point, var, num):
-    # NotImplemented
-
-    # first create a list of elements that need to be removed
-    need_removal = []
-    for i in inst.activeList:
-        uid = i.data
-        state = gtrack_unit.unit_update(inst.hTrack[uid], point, var, inst.bestIndex, num)
+    if inst.backend == 'batch':
+        states = gtrack_batch.batch_update(inst, [i.data for i in inst.activeList], point, var, num)
+    else:
+        states = [gtrack_unit.unit_update(inst.hTrack[i.data], point, var, inst.bestIndex, num)
+                  for i in inst.activeList]
+
+    # release the freed units to the free queue in one pass, the active ones keep their allocation order
+    active = []
+    for i, state in zip(inst.activeList, states):
         if state == ekf_utils.TrackState().TRACK_STATE_FREE:
-            need_removal.append(i)
+            inst.freeList.append(i)
             inst.targetNumCurrent -= 1
-
-    inst.freeList += need_removal
-
-    for index, item in enumerate(inst.activeList):
-        if item in need_removal:
-            inst.activeList.pop(index)
+        else:
+            active.append(i)
+    inst.activeList[:] = active
 
 
 # This is a MODULE level report function. The function is called by
@@ -122,9 +184,11 @@ def module_report(inst, t, t_num):
 #  @param[in]  handle
 #      Handle to GTRACK module
 #  @param[in]  point
-#      Pointer to an array of input measurments. Each measurement has range/angle/radial velocity information
+#      Structured array of input measurments (ekf_utils.gtrack_POINT_DTYPE, see ekf_utils.gtrack_pointCloud).
+#      Each measurement has range/angle/radial velocity information
 #  @param[in]  var
-#      Pointer to an array of input measurment variances. Shall be set to NULL if variances are unknown
+#      Structured array of input measurment variances (ekf_utils.gtrack_VARIANCE_DTYPE).
+#      Shall be set to None if variances are unknown
 #  @param[in]  mNum
 #      Number of input measurements
 #  @param[out]  t
@@ -153,19 +217,18 @@ def step(handle, point, var, m_num, t, t_num, m_index):
     if m_num > inst.maxNumPoints:
         m_num = inst.maxNumPoints
 
-    for n in range(m_num):
-        inst.bestScore[n] = sys.float_info.max
-
-        x_pos = point[n].range * np.sin(point[n].angle)
-        y_pos = point[n].range * np.cos(point[n].angle)
-        if inst.params.sceneryParams.numBoundaryBoxes != 0:
-            inst.bestIndex[n] = ekf_utils.gtrack_ID_POINT_BEHIND_THE_WALL
-            for numBoxes in range(inst.params.sceneryParams.numBoundaryBoxes):
-                if ekf_utils.isPointInsideBox(x_pos, y_pos, inst.params.sceneryParams.boundaryBox[numBoxes]) == 1:
-                    inst.bestIndex[n] = ekf_utils.gtrack_ID_POINT_NOT_ASSOCIATED
-                    break
-        else:
-            inst.bestIndex[n] = ekf_utils.gtrack_ID_POINT_NOT_ASSOCIATED
+    inst.bestScore[:m_num] = np.inf
+
+    if inst.params.sceneryParams.numBoundaryBoxes != 0:
+        x_pos = point['range'][:m_num] * np.sin(point['angle'][:m_num])
+        y_pos = point['range'][:m_num] * np.cos(point['angle'][:m_num])
+        inside = np.zeros(m_num, dtype=bool)
+        for box in inst.params.sceneryParams.boundaryBox[:inst.params.sceneryParams.numBoundaryBoxes]:
+            inside |= (x_pos > box.left) & (x_pos < box.right) & (y_pos > box.bottom) & (y_pos < box.top)
+        inst.bestIndex[:m_num] = np.where(inside, ekf_utils.gtrack_ID_POINT_NOT_ASSOCIATED,
+                                          ekf_utils.gtrack_ID_POINT_BEHIND_THE_WALL)
+    else:
+        inst.bestIndex[:m_num] = ekf_utils.gtrack_ID_POINT_NOT_ASSOCIATED
 
     module_predict(inst)
     module_associate(inst, point, m_num)
@@ -173,6 +236,5 @@ def step(handle, point, var, m_num, t, t_num, m_index):
     module_update(inst, point, var, m_num)
     module_report(inst, t, t_num)
 
-    if m_index != 0:
-        for n in range(m_num):
-            m_index[n] = inst.bestIndex[n]
+    if m_index is not None and np.ndim(m_index) > 0:
+        m_index[:m_num] = inst.bestIndex[:m_num]
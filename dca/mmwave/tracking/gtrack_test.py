@@ -43,11 +43,14 @@ def create(config):
         raise ValueError('maxNumPoints exceeded, create')
     if config.maxNumTracks > ekf_utils.gtrack_NUM_TRACKS_MAX:
         raise ValueError('maxNumTracks exceeded, create')
+    if config.backend not in ('unit', 'batch'):
+        raise ValueError('backend should be unit or batch, create')
 
     inst = ekf_utils.GtrackModuleInstance()
 
     inst.maxNumPoints = config.maxNumPoints
     inst.maxNumTracks = config.maxNumTracks
+    inst.backend = config.backend
 
     inst.heartBeat = 0
 
@@ -141,6 +144,16 @@ def create(config):
 
     inst.hTrack = [ekf_utils.GtrackUnitInstance() for _ in range(inst.maxNumTracks)]
 
+    # states of all units, each unit instance works on views of its row
+    inst.S_hat = np.zeros(shape=(inst.maxNumTracks, 6), dtype=np.float32)
+    inst.S_apriori_hat = np.zeros(shape=(inst.maxNumTracks, 6), dtype=np.float32)
+    inst.P_hat = np.zeros(shape=(inst.maxNumTracks, 36), dtype=np.float32)
+    inst.P_apriori_hat = np.zeros(shape=(inst.maxNumTracks, 36), dtype=np.float32)
+    inst.H_s = np.zeros(shape=(inst.maxNumTracks, 3), dtype=np.float32)
+    inst.gD = np.zeros(shape=(inst.maxNumTracks, 9), dtype=np.float32)
+    inst.gC = np.zeros(shape=(inst.maxNumTracks, 9), dtype=np.float32)
+    inst.gC_inv = np.zeros(shape=(inst.maxNumTracks, 9), dtype=np.float32)
+
     inst.bestScore = np.array([0. for _ in range(inst.maxNumPoints)], dtype=np.float32)
 
     inst.bestIndex = np.array([0 for _ in range(inst.maxNumPoints)], dtype=np.uint8)
@@ -159,4 +172,7 @@ def create(config):
         inst.params.uid = uid
         inst.hTrack[uid] = gtrack_unit.unit_create(inst.params)
 
+        for name in ('S_hat', 'S_apriori_hat', 'P_hat', 'P_apriori_hat', 'H_s', 'gD', 'gC', 'gC_inv'):
+            setattr(inst.hTrack[uid], name, getattr(inst, name)[uid])
+
     return inst
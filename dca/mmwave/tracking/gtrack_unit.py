@@ -59,24 +59,24 @@ def unit_predict(handle):
     sLen = inst.stateVectorLength
 
     if inst.processVariance != 0:
-        inst.S_apriori_hat = ekf_utils.gtrack_matrixMultiply(sLen, sLen, 1, inst.F, inst.S_hat)
+        inst.S_apriori_hat[:] = ekf_utils.gtrack_matrixMultiply(sLen, sLen, 1, inst.F, inst.S_hat)
         temp1 = ekf_utils.gtrack_matrixMultiply(6, 6, 6, inst.F, inst.P_hat)
         temp2 = ekf_utils.gtrack_matrixTransposeMultiply(6, 6, 6, temp1, inst.F)
         temp1 = ekf_utils.gtrack_matrixScalerMultiply(sLen, sLen, inst.Q, inst.processVariance)
         temp3 = ekf_utils.gtrack_matrixAdd(sLen, sLen, temp1, temp2)
 
-        inst.P_apriori_hat = ekf_utils.gtrack_matrixMakeSymmetrical(sLen, temp3)
+        inst.P_apriori_hat[:] = ekf_utils.gtrack_matrixMakeSymmetrical(sLen, temp3)
     else:
-        inst.S_apriori_hat = copy.deepcopy(inst.S_hat)
-        inst.P_apriori_hat = copy.deepcopy(inst.P_hat)
+        inst.S_apriori_hat[:] = inst.S_hat
+        inst.P_apriori_hat[:] = inst.P_hat
 
     ekf_utils.gtrack_cartesian2spherical(inst.stateVectorType, inst.S_apriori_hat, inst.H_s)
 
 
-# GTRACK Module calls this function to obtain the measurement vector scoring from the GTRACK unit perspective
-def unit_score(handle, point, best_score, best_ind, num):
+# GTRACK Module calls this function to create the unit gate before scoring. Returns the log determinant of the
+# group covariance which is added to the Mahalanobis distance of the scores
+def unit_gate(handle):
     limits = np.zeros(shape=(3,), dtype=np.float32)
-    u_tilda = np.zeros(shape=(3,), dtype=np.float32)
 
     inst = handle
 
@@ -91,34 +91,39 @@ def unit_score(handle, point, best_score, best_ind, num):
 
     det = ekf_utils.gtrack_matrixDet3(inst.gC)
 
-    log_det = np.float32(np.log(det))
+    return np.float32(np.log(det))
 
-    for n in range(num):
-        if best_ind[n] == ekf_utils.gtrack_ID_POINT_BEHIND_THE_WALL:
-            continue
 
-        u_tilda[0] = np.float32(point[n].range - inst.H_s[0])
-        u_tilda[1] = np.float32(point[n].angle - inst.H_s[1])
+# GTRACK Module calls this function to obtain the measurement vector scoring from the GTRACK unit perspective
+# (see gtrack_module.module_associate for all units at once)
+def unit_score(handle, point, best_score, best_ind, num):
+    inst = handle
 
-        if inst.velocityHandling < ekf_utils.VelocityHandlingState().VELOCITY_LOCKED:
-            # Radial velocity estimation is not yet known, unroll based on velocity measured at allocation time
-            rv_out = ekf_utils.gtrack_unrollRadialVelocity(inst.maxRadialVelocity, inst.allocationVelocity,
-                                                          point[n].doppler)
-            u_tilda[2] = np.float32(rv_out - inst.allocationVelocity)
-        else:
-            # Radial velocity estimation is known 
-            rv_out = ekf_utils.gtrack_unrollRadialVelocity(inst.maxRadialVelocity, inst.H_s[2], point[n].doppler)
-            u_tilda[2] = np.float32(rv_out - inst.H_s[2])
+    log_det = unit_gate(inst)
 
-        chi2 = ekf_utils.gtrack_computeMahalanobis3(u_tilda, inst.gC_inv)
-        # print(inst.gC_inv)
+    # all points at once, reading the point cloud columns
+    doppler = point['doppler'][:num]
+    u_tilda = np.empty(shape=(3, num), dtype=np.float32)
+    u_tilda[0] = point['range'][:num] - inst.H_s[0]
+    u_tilda[1] = point['angle'][:num] - inst.H_s[1]
 
-        if chi2 < inst.G:
-            score = np.float32(log_det + chi2)
-            if score < best_score[n]:
-                best_score[n] = score
-                best_ind[n] = np.uint8(inst.uid)
-                point[n].doppler = rv_out
+    if inst.velocityHandling < ekf_utils.VelocityHandlingState().VELOCITY_LOCKED:
+        # Radial velocity estimation is not yet known, unroll based on velocity measured at allocation time
+        rv_out = ekf_utils.gtrack_unrollRadialVelocity(inst.maxRadialVelocity, inst.allocationVelocity, doppler)
+        u_tilda[2] = rv_out - inst.allocationVelocity
+    else:
+        # Radial velocity estimation is known 
+        rv_out = ekf_utils.gtrack_unrollRadialVelocity(inst.maxRadialVelocity, inst.H_s[2], doppler)
+        u_tilda[2] = rv_out - inst.H_s[2]
+
+    chi2 = ekf_utils.gtrack_computeMahalanobis3(u_tilda, inst.gC_inv)
+
+    score = (log_det + chi2).astype(np.float32)
+    better = (chi2 < inst.G) & (score < best_score[:num]) & \
+             (best_ind[:num] != ekf_utils.gtrack_ID_POINT_BEHIND_THE_WALL)
+    best_score[:num][better] = score[better]
+    best_ind[:num][better] = np.uint8(inst.uid)
+    doppler[better] = rv_out[better]
 
 
 # GTRACK Module calls this function to start target tracking. This function is called during modules' allocation step,
@@ -154,10 +159,10 @@ def unit_start(handle, time_stamp, tid, um):
     m[1] = um[1]
 
     ekf_utils.gtrack_spherical2cartesian(inst.currentStateVectorType, m, inst.S_apriori_hat)
-    inst.H_s = copy.deepcopy(m)
+    inst.H_s[:] = m
 
-    inst.P_apriori_hat = copy.deepcopy(ekf_utils.pinit6x6)
-    inst.gD = copy.deepcopy(ekf_utils.zero3x3)
+    inst.P_apriori_hat[:] = ekf_utils.pinit6x6
+    inst.gD[:] = ekf_utils.zero3x3
     inst.G = 1.
 
 
@@ -172,8 +177,6 @@ def unit_update(handle, point, var, pInd, num):
     cC_inv = np.zeros(shape=(9,), dtype=np.float32)
     K = np.zeros(shape=(18,), dtype=np.float32)  # 6x3
 
-    u_mean = ekf_utils.gtrack_measurementPoint()
-
     D = np.zeros(shape=(9,), dtype=np.float32)
     Rm = np.zeros(shape=(9,), dtype=np.float32)
     Rc = np.zeros(shape=(9,), dtype=np.float32)
@@ -184,42 +187,38 @@ def unit_update(handle, point, var, pInd, num):
     mlen = inst.measurementVectorLength
     slen = inst.stateVectorLength
 
-    myPointNum = 0
-
-    for n in range(num):
-        if pInd[n] == inst.uid:
-            myPointNum += 1
-            u_mean.range += point[n].range
-            u_mean.angle += point[n].angle
+    # points associated with this unit, the first one is the pilot the other radial velocities are unrolled to
+    mine = np.flatnonzero(pInd[:num] == inst.uid)
+    myPointNum = mine.size
 
-            if var != None:
-                Rm[0] += var[n].rangeVar
-                Rm[4] += var[n].angleVar
-                Rm[8] += var[n].dopplerVar
+    if myPointNum:
+        doppler = point['doppler']
+        doppler[mine[1:]] = ekf_utils.gtrack_unrollRadialVelocity(inst.maxRadialVelocity, doppler[mine[0]],
+                                                                  doppler[mine[1:]])
+        my_range = point['range'][mine]
+        my_angle = point['angle'][mine]
+        my_doppler = doppler[mine]
 
-            if myPointNum == 1:
-                rvPilot = point[n].doppler
-                u_mean.doppler = rvPilot
-            else:
-                rvCurrent = ekf_utils.gtrack_unrollRadialVelocity(inst.maxRadialVelocity, rvPilot, point[n].doppler)
-                point[n].doppler = rvCurrent
-                u_mean.doppler += rvCurrent
+        if var is not None:
+            Rm[0] = var['rangeVar'][mine].sum()
+            Rm[4] = var['angleVar'][mine].sum()
+            Rm[8] = var['dopplerVar'][mine].sum()
 
     if myPointNum == 0:
         # INACTIVE
         if (np.abs(inst.S_hat[2]) < inst.radialVelocityResolution) and \
                 (np.abs(inst.S_hat[3]) < inst.radialVelocityResolution):
-            inst.S_hat = np.zeros(shape=(inst.S_hat.shape), dtype=np.float32)
+            inst.S_hat[:] = 0
 
             inst.S_hat[0] = inst.S_apriori_hat[0]
             inst.S_hat[1] = inst.S_apriori_hat[1]
 
-            inst.P_hat = copy.deepcopy(inst.P_apriori_hat)
+            inst.P_hat[:] = inst.P_apriori_hat
 
             inst.processVariance = 0
         else:
-            inst.S_hat = copy.deepcopy(inst.S_apriori_hat)
-            inst.P_hat = copy.deepcopy(inst.P_apriori_hat)
+            inst.S_hat[:] = inst.S_apriori_hat
+            inst.P_hat[:] = inst.P_apriori_hat
 
         unit_event(inst, myPointNum)
         return inst.state
@@ -229,11 +228,11 @@ def unit_update(handle, point, var, pInd, num):
     if inst.processVariance == 0:
         inst.processVariance = np.float32((0.5 * (inst.maxAcceleration)) * (0.5 * (inst.maxAcceleration)))
 
-    u_mean.range = np.float32(u_mean.range / myPointNum)
-    u_mean.angle = np.float32(u_mean.angle / myPointNum)
-    u_mean.doppler = np.float32(u_mean.doppler / myPointNum)
+    mean_range = np.float32(my_range.sum() / myPointNum)
+    mean_angle = np.float32(my_angle.sum() / myPointNum)
+    mean_doppler = np.float32(my_doppler.sum() / myPointNum)
 
-    if var != None:
+    if var is not None:
         Rm[0] = np.float32(Rm[0] / myPointNum)
         Rm[4] = np.float32(Rm[4] / myPointNum)
         Rm[8] = np.float32(Rm[8] / myPointNum)
@@ -246,21 +245,22 @@ def unit_update(handle, point, var, pInd, num):
         Rm[4] = angleStd * angleStd
         Rm[8] = dDopplerVar
 
-    U[0] = u_mean.range
-    U[1] = u_mean.angle
-    U[2] = u_mean.doppler
+    U[0] = mean_range
+    U[1] = mean_angle
+    U[2] = mean_doppler
 
     velocity_state_handling(inst, U)
 
     if myPointNum > gtrack_MIN_POINTS_TO_UPDATE_DISPERSION:
-        for n in range(num):
-            if pInd[n] == inst.uid:
-                D[0] += np.float32((point[n].range - u_mean.range) * (point[n].range - u_mean.range))
-                D[4] += np.float32((point[n].angle - u_mean.angle) * (point[n].angle - u_mean.angle))
-                D[8] += np.float32((point[n].doppler - u_mean.doppler) * (point[n].doppler - u_mean.doppler))
-                D[1] += np.float32((point[n].range - u_mean.range) * (point[n].angle - u_mean.angle))
-                D[2] += np.float32((point[n].range - u_mean.range) * (point[n].doppler - u_mean.doppler))
-                D[5] += np.float32((point[n].angle - u_mean.angle) * (point[n].doppler - u_mean.doppler))
+        d_range = my_range - mean_range
+        d_angle = my_angle - mean_angle
+        d_doppler = my_doppler - mean_doppler
+        D[0] = np.float32(d_range * d_range).sum()
+        D[4] = np.float32(d_angle * d_angle).sum()
+        D[8] = np.float32(d_doppler * d_doppler).sum()
+        D[1] = np.float32(d_range * d_angle).sum()
+        D[2] = np.float32(d_range * d_doppler).sum()
+        D[5] = np.float32(d_angle * d_doppler).sum()
 
         D[0] = np.float32(D[0] / myPointNum)
         D[4] = np.float32(D[4] / myPointNum)
@@ -305,16 +305,16 @@ def unit_update(handle, point, var, pInd, num):
     K = ekf_utils.gtrack_matrixMultiply(slen, mlen, mlen, PJ, cC_inv)
 
     temp1 = ekf_utils.gtrack_matrixMultiply(slen, mlen, 1, K, u_tilda)
-    inst.S_hat = ekf_utils.gtrack_matrixAdd(slen, 1, inst.S_apriori_hat, temp1)
+    inst.S_hat[:] = ekf_utils.gtrack_matrixAdd(slen, 1, inst.S_apriori_hat, temp1)
     # print(temp1)
 
     temp1 = ekf_utils.gtrack_matrixTransposeMultiply(slen, mlen, slen, K, PJ)
-    inst.P_hat = ekf_utils.gtrack_matrixSub(slen, slen, inst.P_apriori_hat, temp1)
+    inst.P_hat[:] = ekf_utils.gtrack_matrixSub(slen, slen, inst.P_apriori_hat, temp1)
 
     temp1 = ekf_utils.gtrack_matrixAdd(mlen, mlen, JPJ, Rm)
-    inst.gC = ekf_utils.gtrack_matrixAdd(mlen, mlen, temp1, inst.gD)
+    inst.gC[:] = ekf_utils.gtrack_matrixAdd(mlen, mlen, temp1, inst.gD)
 
-    inst.gC_inv = ekf_utils.gtrack_matrixInv3(inst.gC)
+    inst.gC_inv[:] = ekf_utils.gtrack_matrixInv3(inst.gC)
 
     unit_event(inst, myPointNum)
     return inst.state
@@ -18,7 +18,8 @@ class ProcessingChain:
         - add parameters dict to input processing parameters 
     """
 
-    def __init__(self, num_samples=256, num_chirps=64, num_tx=1, num_rx=4, fps=10, window=3, interp_factor=1, accumulate_channels=True):
+    def __init__(self, num_samples=256, num_chirps=64, num_tx=1, num_rx=4, fps=10, window=3, interp_factor=1, accumulate_channels=True, batch_size=None, workers=None,
+                 doppler_backend='fft', doppler_bins=None):
 
         self.num_samples = num_samples
         self.num_chirps = num_chirps
@@ -28,6 +29,10 @@ class ProcessingChain:
         self.window_name = None 
         self.interp_factor = interp_factor
         self.accumulate_channels = accumulate_channels
+        self.batch_size = batch_size    # frames per processed radarcube (None: one radarcube per ADC data file)
+        self.doppler_backend = doppler_backend  # 'fft' (zero-padded fft) or 'czt' (chirp-z over a doppler window)
+        self.doppler_bins = doppler_bins or num_chirps * interp_factor     # doppler bins of the czt backend
+        self.doppler_czt = {}   # planned chirp-z engines per (doppler window, window type)
         self.data_handle = DataHandling(self.num_samples, self.num_chirps, self.num_tx, self.num_rx, self.fps)
         
         # assign window name
@@ -58,18 +63,50 @@ class ProcessingChain:
             self.window_name = dsp.Window.hann
         else:
             self.window_name = dsp.Window.hamming
+
+        # range-Doppler FFT planned once for this configuration (workers: scipy.fft threads)
+        self.range_doppler_fft = dsp.RangeDopplerFFT(self.num_samples, self.num_chirps, self.num_rx, window_type_1d=self.window_name, 
+                                    window_type_2d=self.window_name, interp_factor=self.interp_factor, clutter_removal_enabled=True, 
+                                    dtype=self.data_handle.dtype, workers=workers)
         
+    def raw_data_generator(self, dir_name):
+        '''
+        Raw radarcube generator consumed by the processing methods (axes: fast_time, slow_time, channels, frames). 
+
+        Yields batches of self.batch_size frames when a batch size is set, otherwise one radarcube per ADC data file.
+        '''
+        if self.batch_size:
+            return self.data_handle.raw_frames(dir_name, batch_size=self.batch_size)
+        return self.data_handle.raw_data_cube(dir_name)
+
+    def allocate_output(self, shape, num_frames, out_file=None, dtype=np.float32):
+        '''
+        Preallocate a processing output with the frames along the last axis, filled in place frame by frame.
+
+        Args:
+            - shape:        output shape without the frames axis
+            - num_frames:   number of frames (last axis)
+            - out_file:     optional .npy file name; if given the output is a memory-mapped .npy file instead of an array
+        Output:
+            - output array (or np.memmap) of shape (*shape, num_frames)
+        '''
+        if out_file:
+            return np.lib.format.open_memmap(out_file, mode='w+', dtype=dtype, shape=(*shape, num_frames))
+        return np.zeros((*shape, num_frames), dtype=dtype)
 
     
-    def doppler_processing_custom(self, radar_cube, clutter_removal_enabled=True, interleaved=False, window_type_2d=None, axis=1):
+    def doppler_processing_custom(self, radar_cube, clutter_removal_enabled=True, interleaved=False, window_type_2d=None, axis=1, doppler_window=None):
 
         '''
         Custom Doppler processing module for obtaining Doppler FFT on the N-D FFT data. 
 
         Args:
             - radar_cube : raw data 3/4-D cube
+            - doppler_window : (low, high) doppler window in cycles per chirp ([-0.5, 0.5) is the full spectrum) evaluated
+                               by the czt backend with self.doppler_bins bins (default: full spectrum)
         Output:
-            - FFT across defined axis and in same shape and input 
+            - FFT across defined axis and in same shape and input (self.doppler_bins bins with the czt backend,
+              num_chirps * interp_factor bins with the fft backend)
         Issues and To-do's:
             1. Interleaved implementation
         '''
@@ -84,9 +121,14 @@ class ProcessingChain:
         if clutter_removal_enabled:
             fft1d_out = dsp.compensation.clutter_removal(fft1d_out, axis=0)
 
-        # Windowing 16x32
+        # Chirp-Z transform over the doppler window (windowing included in the planned engine)
+        if self.doppler_backend == 'czt':
+            fft2d_out = self.doppler_czt_engine(doppler_window or (-0.5, 0.5), window_type_2d)(fft1d_out, axis=0)
+            return np.transpose(fft2d_out, axes_vals)
+
+        # Windowing 16x32 (in place on the clutter-removed copy, the input cube is left untouched)
         if window_type_2d:
-            fft2d_in = dsp.utils.windowing(fft1d_out, window_type_2d, axis=0)
+            fft2d_in = dsp.utils.windowing(fft1d_out, window_type_2d, axis=0, out=fft1d_out if clutter_removal_enabled else None)
         else:
             fft2d_in = fft1d_out
 
@@ -99,7 +141,23 @@ class ProcessingChain:
 
         return fft2d_out
 
-    def range_doppler_process(self, dir_name, log_scaled=False, process_single_datafile=False, normalize=True, save_path='/mnt/c/work/mmw_pc/single_chip/processing_results/range_doppler_vidoes/'):
+    def doppler_czt_engine(self, doppler_window, window_type_2d=None):
+        '''
+        Chirp-Z doppler engine for the doppler window, planned on first use and cached afterwards.
+
+        Args:
+            - doppler_window:   (low, high) doppler window in cycles per chirp
+            - window_type_2d:   optional window before the transform
+        Output:
+            - planned dsp.DopplerCZT engine with self.doppler_bins bins
+        '''
+        key = (tuple(doppler_window), window_type_2d)
+        if key not in self.doppler_czt:
+            self.doppler_czt[key] = dsp.DopplerCZT(self.num_chirps, self.doppler_bins, doppler_window=doppler_window,
+                                                   window_type_2d=window_type_2d)
+        return self.doppler_czt[key]
+
+    def range_doppler_process(self, dir_name, log_scaled=False, process_single_datafile=False, normalize=True, save_path='/mnt/c/work/mmw_pc/single_chip/processing_results/range_doppler_vidoes/', out_file=None):
         # NOTE: remove the single iteration limit after this analysis
 
         """
@@ -108,8 +166,9 @@ class ProcessingChain:
                 - data specifications provided with class instantiation
                 - full filename of the data directory 
                 - save path 
+                - out_file: optional .npy file the output radarcube is memory-mapped to (for long recordings)
             Outputs:
-                - None
+                - radarcube (axes: doppler, range, frames), preallocated from the ADC file sizes and filled in place
         """
 
         # (1) define video writing object 
@@ -131,19 +190,19 @@ class ProcessingChain:
         index_channel = 0   # if accumulation disabled 
         
         # (2.1) initiate the raw_data generator function
-        raw_data = self.data_handle.raw_data_cube(dir_name)
+        raw_data = self.raw_data_generator(dir_name)
         data_status = True
 
-        # output radarcube np array
-        radarcube = np.zeros((self.num_chirps * self.interp_factor, self.num_samples, 0))
+        # output radarcube np array (preallocated for all frames of the capture, filled in place)
+        frame_shape = (self.num_chirps * self.interp_factor, self.num_samples)
+        frame_index = 0
 
         if process_single_datafile:
             rcube = next(raw_data, [])   # output 0 when no done reading all data files
+            radarcube = self.allocate_output(frame_shape, rcube.shape[-1], out_file)
 
-            # (2.2) peform range-doppler ffts 
-            fft1d_out = dsp.range_processing(rcube, window_type_1d=self.window_name, axis=axis_range) 
-            fft2d_out = self.doppler_processing_custom(fft1d_out, clutter_removal_enabled=True, 
-                        interleaved=False, window_type_2d=self.window_name, axis=axis_doppler)
+            # (2.2) peform range-doppler ffts (windowing, clutter removal and both ffts in the planned engine)
+            fft2d_out = self.range_doppler_fft(rcube)
                     
             # (2.3) data shaping (log scaling followed by accumulation/channel selection)
             fft2d_log_process = 10*np.log10(np.abs(fft2d_out) + 1e-4) if log_scaled else fft2d_out 
@@ -166,22 +225,22 @@ class ProcessingChain:
                 # append the frame to output radarcube array
                 #radarcube = np.append(radarcube, img_normalize.reshape(*img_normalize.shape,1), axis=2)
             
-            radarcube = np.append(radarcube, video_in, axis=2)
+            radarcube[:, :, :] = video_in
     
             # (3) release the video object    
             out.release()
             return radarcube
             
+        radarcube = self.allocate_output(frame_shape, self.data_handle.num_frames(dir_name), out_file)
+
         while data_status: # //NOTE: uncomment it after analysis
             rcube = next(raw_data, [])   # output 0 when no done reading all data files
             data_status = np.size(rcube)
             if len(rcube) == 0:
                 break     # enable break here
 
-            # (2.2) peform range-doppler ffts 
-            fft1d_out = dsp.range_processing(rcube, window_type_1d=self.window_name, axis=axis_range) 
-            fft2d_out = self.doppler_processing_custom(fft1d_out, clutter_removal_enabled=True, 
-                        interleaved=False, window_type_2d=self.window_name, axis=axis_doppler)
+            # (2.2) peform range-doppler ffts (windowing, clutter removal and both ffts in the planned engine)
+            fft2d_out = self.range_doppler_fft(rcube)
                     
             # (2.3) data shaping (log scaling followed by accumulation/channel selection)
             fft2d_log_process = 10*np.log10(np.abs(fft2d_out) + 1e-4) if log_scaled else fft2d_out 
@@ -204,14 +263,16 @@ class ProcessingChain:
                 
                     # append the frame to output radarcube array
                     #radarcube = np.append(radarcube, video_in.reshape(*video_in[:, :, frame].shape,1), axis=2)
-            radarcube = np.append(radarcube, video_in, axis=2)
+            radarcube[:, :, frame_index:frame_index + video_in.shape[2]] = video_in
+            frame_index += video_in.shape[2]
 
         # (3) release the video object    
         out.release()
         print('range-doppler video written successfully ...\n')
         return radarcube
         
-    def micro_doppler_stft(self, dir_name, max_velocity, normalize=False, accum_type=0, save_path='/mnt/c/work/mmw_pc/single_chip/processing_results/micro_doppler_plots/', y_label='frequency'):
+    def micro_doppler_stft(self, dir_name, max_velocity, normalize=False, accum_type=0, save_path='/mnt/c/work/mmw_pc/single_chip/processing_results/micro_doppler_plots/', y_label='frequency', out_file=None,
+                           velocity_window=None):
 
         '''
         Steps for short-time Fourier tranform based micro-Doppler processing:
@@ -223,6 +284,9 @@ class ProcessingChain:
             - data specifications provided with class instantiation
             - full filename of data directory
             - path to save micro-doppler image  
+            - out_file: optional .npy file the spectrogram is memory-mapped to (for hour-long recordings)
+            - velocity_window: optional velocity (m/s) the czt backend zooms on, the spectrogram covers +-velocity_window
+                               with self.doppler_bins bins instead of the full +-max_velocity (unambiguous velocity)
         Outputs:
             - numpy array of micro-doppler spectrogram
         '''
@@ -235,10 +299,18 @@ class ProcessingChain:
         index_channel = 0
 
         data_status = True
-        micro_doppler_spectrum = np.zeros((self.num_chirps * self.interp_factor, 0))
+        frame_index = 0
+        # (0.1) doppler window of the czt backend (full spectrum with the fft backend)
+        doppler_window = None
+        if self.doppler_backend == 'czt':
+            velocity_window = min(velocity_window or max_velocity, max_velocity)
+            doppler_window = (-0.5 * velocity_window / max_velocity, 0.5 * velocity_window / max_velocity)
+            max_velocity = velocity_window
+        num_doppler_bins = self.doppler_bins if self.doppler_backend == 'czt' else self.num_chirps * self.interp_factor
+        micro_doppler_spectrum = self.allocate_output((num_doppler_bins,), self.data_handle.num_frames(dir_name), out_file)
 
         # (1) instantiate the raw_data generator
-        raw_data = self.data_handle.raw_data_cube(dir_name)
+        raw_data = self.raw_data_generator(dir_name)
         # print(type(raw_data))
 
         # (2) keep appending micro-doppler spectrogram while data_status is active
@@ -262,7 +334,7 @@ class ProcessingChain:
 
             # (2.2) perform doppler-fft and append to output spectrum 
             micro_doppler_raw = self.doppler_processing_custom(data_range_accum, clutter_removal_enabled=True, 
-            interleaved=False, window_type_2d=dsp.Window.bartlett, axis=axis_doppler)
+            interleaved=False, window_type_2d=dsp.Window.bartlett, axis=axis_doppler, doppler_window=doppler_window)
             
             if self.accumulate_channels:
                 micro_doppler = 10*np.log10(np.sum(np.abs(micro_doppler_raw), axis=axis_channel) + 1e-10) + 30
@@ -278,7 +350,8 @@ class ProcessingChain:
                     micro_doppler[:, frame] = (micro_doppler[:, frame] - min) / (max - min)
                     micro_doppler[:, frame] = np.round(micro_doppler[:, frame] * 255).astype(np.uint8)
                 
-            micro_doppler_spectrum = np.append(micro_doppler_spectrum, micro_doppler, axis=1)
+            micro_doppler_spectrum[:, frame_index:frame_index + micro_doppler.shape[1]] = micro_doppler
+            frame_index += micro_doppler.shape[1]
             #print('micro-doppler dimensions: ' + str(micro_doppler_spectrum.shape))
 
             # (2.3) update the active status for next iteration
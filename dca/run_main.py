@@ -61,15 +61,10 @@ def perform_rangedoppler_processing():
  
     dir_name = data_directory.split("/")[-1]
     print(dir_name)
-    params = dir_name.split('_')
+    specs = DataHandling.parse_capture_name(dir_name)
 
-    num_samples = int(params[4].split('x')[0][1:])
-    num_chirps = int(params[4].split('x')[1][1:])
-    num_tx = int(params[3][3])
-    num_rx = int(params[3][4])
-    fps = int(params[5][3:])
-
-    processing_chain = ProcessingChain(num_samples=num_samples, num_chirps=num_chirps, num_tx=num_tx, num_rx=num_rx, fps=fps)
+    processing_chain = ProcessingChain(num_samples=specs['num_samples'], num_chirps=specs['num_chirps'], num_tx=specs['num_tx'], 
+                                       num_rx=specs['num_rx'], fps=specs['fps'])
     return processing_chain.range_doppler_process(data_directory)
 
 def perform_microdoppler_processing():
@@ -77,19 +72,15 @@ def perform_microdoppler_processing():
     data_directory = '/mnt/c/work/mmw_pc/dca/captured_data/micro_doppler_experiments/dca_apr19_2045_trx14_n122xp128_fps20_stand_and_drill'
     dir_name = data_directory.split("/")[-1]
     
-    params = dir_name.split('_')
-    print('params: ' + str(params))
-    num_samples = int(params[4].split('x')[0][1:])
-    num_chirps = int(params[4].split('x')[1][1:])
-    num_tx = int(params[3][3])
-    num_rx = int(params[3][4])
-    fps = int(params[5][3:])
+    specs = DataHandling.parse_capture_name(dir_name)
+    print('specs: ' + str(specs))
 
     # calculate max velocity (assuming 50% duty cycle)
     # if use_defaults == False:
     #max_velocity = max_velocity if use_defaults else (3e8/77e9) / 4 * (2 *fps * num_chirps) # vmax = lambda / 4 / T
     #print('max_velocity: ' + str(max_velocity))
-    processing_chain = ProcessingChain(num_samples=num_samples, num_chirps=num_chirps, num_tx=num_tx, num_rx=num_rx, fps=fps)
+    processing_chain = ProcessingChain(num_samples=specs['num_samples'], num_chirps=specs['num_chirps'], num_tx=specs['num_tx'], 
+                                       num_rx=specs['num_rx'], fps=specs['fps'])
     processing_chain.micro_doppler_stft(data_directory, max_velocity, y_label='frequency')
 
     # plot 
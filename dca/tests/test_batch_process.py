@@ -0,0 +1,91 @@
+import errno
+import mmap
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import batch_process
+
+MEMORY_LIMIT = 1024     # MB
+
+
+def allocate(num_bytes):
+    '''
+    Worker job: anonymous allocation (counted by the memory limit).
+    '''
+    return np.empty(num_bytes, dtype=np.uint8).nbytes
+
+
+def map_file(path):
+    '''
+    Worker job: read-only memory map of a whole file, as DataHandling does with the ADC files.
+    '''
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    return int(data[::mmap.PAGESIZE * 1024].sum())
+
+
+@pytest.mark.skipif(batch_process.resource is None, reason='memory limits need the resource module')
+def test_memory_limit_caps_heap_not_memory_mapped_files(tmp_path):
+    capture = tmp_path / 'adc.bin'
+    with open(str(capture), 'wb') as f:
+        f.truncate(2 * MEMORY_LIMIT * 1024 ** 2)   # sparse file larger than the limit
+
+    with ProcessPoolExecutor(max_workers=1, initializer=batch_process._limit_memory, initargs=(MEMORY_LIMIT,)) as pool:
+        assert pool.submit(map_file, str(capture)).result() == 0
+        with pytest.raises(MemoryError):
+            pool.submit(allocate, 2 * MEMORY_LIMIT * 1024 ** 2).result()
+
+
+def test_out_of_memory_errors():
+    assert batch_process._out_of_memory(MemoryError())
+    assert batch_process._out_of_memory(OSError(errno.ENOMEM, 'Cannot allocate memory'))
+    assert not batch_process._out_of_memory(OSError(errno.ENOENT, 'No such file or directory'))
+    assert not batch_process._out_of_memory(ValueError())
+
+
+def test_batch_process_reports_memory_failures(tmp_path, monkeypatch):
+    for name in ('dca_a', 'dca_b'):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'datacard_record_hdr_0ADC_0.bin').write_bytes(b'')
+
+    def process_capture(dir_name, task, params):
+        if dir_name.endswith('dca_a'):
+            raise OSError(errno.ENOMEM, 'Cannot allocate memory')
+        raise OSError(errno.ENOENT, 'No such file or directory')
+
+    # run the jobs on threads of the test process, without limiting its memory
+    monkeypatch.setattr(batch_process, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(batch_process, '_limit_memory', lambda memory_limit: None)
+    monkeypatch.setattr(batch_process, 'process_capture', process_capture)
+
+    state = batch_process.batch_process([str(tmp_path / 'dca_*')], tasks=['range_doppler'], memory_limit=800,
+                                        save_path=str(tmp_path / 'results'), window=3, interp_factor=1)
+    errors = {key.split('|')[0][-5:]: job['error'] for key, job in state.items()}
+
+    assert errors['dca_a'] == 'memory limit of 800 MB per worker exceeded'
+    assert errors['dca_b'].startswith('FileNotFoundError')
+
+
+@pytest.mark.parametrize('changed', [{'max_velocity': 10}, {'doppler_bins': 128}, {'velocity_window': 2},
+                                     {'doppler_backend': 'czt'}, {'window': 4}, {'interp_factor': 2},
+                                     {'save_arrays': True}])
+def test_batch_process_resumes_only_same_parameters(tmp_path, monkeypatch, changed):
+    (tmp_path / 'dca_a').mkdir()
+    (tmp_path / 'dca_a' / 'datacard_record_hdr_0ADC_0.bin').write_bytes(b'')
+
+    runs = []
+    monkeypatch.setattr(batch_process, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(batch_process, 'process_capture', lambda dir_name, task, params: runs.append(params) or 0.0)
+
+    params = dict(save_path=str(tmp_path / 'results'), window=3, interp_factor=1, batch_size=None, max_velocity=5,
+                  save_arrays=False, doppler_backend='fft', doppler_bins=None, velocity_window=None)
+    batch_process.batch_process([str(tmp_path / 'dca_*')], tasks=['micro_doppler'], **params)
+    assert len(runs) == 1
+
+    # resumed: the job is done with the same parameters, also with a different batch size
+    batch_process.batch_process([str(tmp_path / 'dca_*')], tasks=['micro_doppler'], **dict(params, batch_size=8))
+    assert len(runs) == 1
+
+    batch_process.batch_process([str(tmp_path / 'dca_*')], tasks=['micro_doppler'], **dict(params, **changed))
+    assert len(runs) == 2 and runs[-1] == dict(params, **changed)
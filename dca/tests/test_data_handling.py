@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from data_handling import DataHandling, IQ_INT16
+
+
+def make_capture(tmp_path, data_handling, num_frames, split_words, rng=None):
+    '''
+    Write a synthetic capture: num_frames frames of random payload, each chirp starting with the same HSI header, split
+    into ADC files at the given int16 word offsets. Returns the int16 stream.
+    '''
+    rng = np.random.default_rng(0) if rng is None else rng
+    chirp_data_size = data_handling.num_samples * data_handling.num_rx * 2 + data_handling.header_size
+    frames = rng.integers(-2 ** 15, 2 ** 15, size=(num_frames, data_handling.num_chirps, chirp_data_size), dtype=np.int16)
+    frames[:, :, :data_handling.header_size] = np.arange(data_handling.header_size, dtype=np.int16)
+    stream = frames.reshape(-1)
+
+    bounds = [0] + list(split_words) + [stream.size]
+    for index, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        stream[start:stop].tofile(str(tmp_path / 'datacard_record_hdr_0ADC_{}.bin'.format(index)))
+    return stream
+
+
+def make_capture_stream(data_handling, num_frames):
+    '''
+    int16 stream of num_frames synthetic frames, without writing any file.
+    '''
+    chirp_data_size = data_handling.num_samples * data_handling.num_rx * 2 + data_handling.header_size
+    rng = np.random.default_rng(1)
+    return rng.integers(-2 ** 15, 2 ** 15, size=num_frames * data_handling.num_chirps * chirp_data_size, dtype=np.int16)
+
+
+def reference_cube(data_handling, stream):
+    '''
+    Radarcube (axes: fast_time, slow_time, channels, frames) of a stream of complete frames, built independently of
+    unpack_frames.
+    '''
+    chirp_data_size = data_handling.num_samples * data_handling.num_rx * 2 + data_handling.header_size
+    frame_size = chirp_data_size * data_handling.num_chirps
+    payload = stream[:stream.size // frame_size * frame_size].reshape(-1, data_handling.num_chirps, chirp_data_size)
+    payload = payload[:, :, data_handling.header_size:].astype(np.float64)
+    cube = (payload[..., 0::2] + 1j * payload[..., 1::2]).reshape(-1, data_handling.num_chirps, data_handling.num_rx,
+                                                                  data_handling.num_samples)
+    return np.transpose(cube, (3, 1, 2, 0))
+
+
+@pytest.fixture
+def data_handling():
+    return DataHandling(num_samples=8, num_chirps=4, num_rx=2, header_size=4)
+
+
+def test_frame_stream_straddling_files(tmp_path, data_handling):
+    # frame_size = 144 words: the first split falls inside frame 1, the second one inside frame 3
+    stream = make_capture(tmp_path, data_handling, 6, [200, 440])
+    frames = np.concatenate([frames for _, frames in data_handling.raw_frame_stream(str(tmp_path))])
+
+    assert frames.shape[0] == data_handling.num_frames(str(tmp_path)) == 6
+    np.testing.assert_array_equal(frames.reshape(-1), stream)
+
+
+def test_frame_stream_file_ending_on_frame_boundary(tmp_path, data_handling):
+    stream = make_capture(tmp_path, data_handling, 4, [288])
+    blocks = list(data_handling.raw_frame_stream(str(tmp_path)))
+
+    assert [file_index for file_index, _ in blocks] == [0, 1]
+    np.testing.assert_array_equal(np.concatenate([frames for _, frames in blocks]).reshape(-1), stream)
+
+
+def test_frame_stream_odd_sized_file(tmp_path, data_handling):
+    stream = make_capture(tmp_path, data_handling, 3, [200])
+    with open(str(tmp_path / 'datacard_record_hdr_0ADC_1.bin'), 'ab') as f:
+        f.write(b'\x01')  # truncated capture: trailing byte of an incomplete sample
+
+    frames = np.concatenate([frames for _, frames in data_handling.raw_frame_stream(str(tmp_path))])
+    np.testing.assert_array_equal(frames.reshape(-1), stream)
+
+
+@pytest.mark.parametrize('dtype', [np.complex64, np.complex128])
+def test_unpack_frames(data_handling, dtype):
+    stream = make_capture_stream(data_handling, 3)
+    frames = stream.reshape(3, data_handling.num_chirps, -1)
+
+    out = data_handling.unpack_frames(frames, dtype=dtype)
+    assert out.dtype == dtype
+    np.testing.assert_array_equal(np.transpose(out, (3, 1, 2, 0)), reference_cube(data_handling, stream))
+
+    # a matching buffer is reused
+    assert data_handling.unpack_frames(frames, out=out, dtype=dtype) is out
+
+
+def test_unpack_frames_iq_int16(data_handling):
+    stream = make_capture_stream(data_handling, 2)
+    out = data_handling.unpack_frames(stream.reshape(2, data_handling.num_chirps, -1), dtype=IQ_INT16)
+    cube = np.transpose(out['i'] + 1j * out['q'].astype(np.float64), (3, 1, 2, 0))
+
+    np.testing.assert_array_equal(cube, reference_cube(data_handling, stream))
+
+
+def test_raw_radarcube_data_ending_on_frame_boundary(data_handling):
+    stream = make_capture_stream(data_handling, 3)
+
+    radarcube, next_frame_data = data_handling.raw_radarcube(stream)
+    np.testing.assert_array_equal(radarcube, reference_cube(data_handling, stream))
+    assert next_frame_data.size == 0
+
+    radarcube, next_frame_data = data_handling.raw_radarcube(stream[:-5])
+    assert radarcube.shape[3] == 2
+    np.testing.assert_array_equal(next_frame_data, stream[2 * stream.size // 3:-5])
+
+
+@pytest.mark.parametrize('batch_size', [1, 4, 5])
+def test_raw_frames_batches_across_files(tmp_path, data_handling, batch_size):
+    stream = make_capture(tmp_path, data_handling, 7, [200, 440, 441])
+    batches = list(data_handling.raw_frames(str(tmp_path), batch_size=batch_size))
+
+    assert [cube.shape[3] for cube in batches[:-1]] == [batch_size] * (len(batches) - 1)
+    np.testing.assert_array_equal(np.concatenate(batches, axis=3), reference_cube(data_handling, stream))
+
+
+def test_raw_data_cube_per_file(tmp_path, data_handling):
+    stream = make_capture(tmp_path, data_handling, 6, [200, 440])
+    cubes = list(data_handling.raw_data_cube(str(tmp_path)))
+
+    # the frame straddling two files belongs to the next file
+    assert [cube.shape[3] for cube in cubes] == [1, 2, 3]
+    np.testing.assert_array_equal(np.concatenate(cubes, axis=3), reference_cube(data_handling, stream))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from mmwave import dsp
+from processing_chain import ProcessingChain
+
+
+@pytest.fixture
+def range_accumulated():
+    '''
+    Range-accumulated cube (slow_time, channels, frames) of 16 chirps, 4 receivers and 3 frames.
+    '''
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(16, 4, 3)) + 1j * rng.normal(size=(16, 4, 3))
+
+
+@pytest.mark.parametrize('interp_factor', [1, 2])
+def test_doppler_czt_backend_matches_fft_backend(range_accumulated, interp_factor):
+    fft_chain = ProcessingChain(num_chirps=16, interp_factor=interp_factor)
+    czt_chain = ProcessingChain(num_chirps=16, interp_factor=interp_factor, doppler_backend='czt')
+    num_bins = 16 * interp_factor
+
+    # fftshifted zero-padded FFT of the windowed, clutter-removed chirps
+    expected = fft_chain.doppler_processing_custom(range_accumulated.copy(), window_type_2d=dsp.Window.bartlett, axis=0)
+    clutter_removed = range_accumulated - range_accumulated.mean(axis=0)
+    windowed = clutter_removed * dsp.utils.get_window(dsp.Window.bartlett, 16, ndim=3)
+    np.testing.assert_allclose(expected, np.fft.fftshift(np.fft.fft(windowed, n=num_bins, axis=0), axes=0), atol=1e-9)
+
+    out = czt_chain.doppler_processing_custom(range_accumulated, window_type_2d=dsp.Window.bartlett, axis=0)
+    np.testing.assert_allclose(out, expected, rtol=0, atol=1e-5 * np.abs(expected).max())
+
+    # velocity window: the bins of the zero-padded spectrum it covers
+    czt_chain = ProcessingChain(num_chirps=16, interp_factor=interp_factor, doppler_backend='czt',
+                                doppler_bins=num_bins // 2)
+    out = czt_chain.doppler_processing_custom(range_accumulated, window_type_2d=dsp.Window.bartlett, axis=0,
+                                              doppler_window=(-0.25, 0.25))
+    np.testing.assert_allclose(out, expected[num_bins // 4:3 * num_bins // 4], rtol=0,
+                               atol=1e-5 * np.abs(expected).max())
+
+
+def test_doppler_czt_engine_cache():
+    processing_chain = ProcessingChain(num_chirps=16, doppler_backend='czt', doppler_bins=24)
+
+    engine = processing_chain.doppler_czt_engine((-0.25, 0.25), dsp.Window.bartlett)
+    assert engine.num_bins == 24 and engine.doppler_window == (-0.25, 0.25)
+    assert processing_chain.doppler_czt_engine([-0.25, 0.25], dsp.Window.bartlett) is engine
+
+    # one engine per (doppler window, window type)
+    assert processing_chain.doppler_czt_engine((-0.25, 0.25), dsp.Window.hann) is not engine
+    assert processing_chain.doppler_czt_engine((-0.5, 0.5), dsp.Window.bartlett) is not engine
+    assert processing_chain.doppler_czt_engine((-0.25, 0.25)) is not engine
+    assert set(processing_chain.doppler_czt) == {((-0.25, 0.25), dsp.Window.bartlett), ((-0.25, 0.25), dsp.Window.hann),
+                                                 ((-0.5, 0.5), dsp.Window.bartlett), ((-0.25, 0.25), None)}